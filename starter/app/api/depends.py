@@ -58,5 +58,9 @@ def get_pod_registry(request: Request):
     return request.app.state.pod_registry
 
 
+def get_coordinator(request: Request):
+    return request.app.state.coordinator
+
+
 def get_yc_poller(request: Request):
     return request.app.state.yc_poller
@@ -20,3 +20,4 @@ E_POOL_NOT_FOUND = 2
 E_POOL_TOO_SMALL = 3
 E_POOL_NO_RESOURCES = 4
 E_POOL_LOCKED = 5
+E_POOL_OWNER_UNAVAILABLE = 6
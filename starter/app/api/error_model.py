@@ -9,6 +9,7 @@ API_ERROR_MESSAGES = {
     E_POOL_TOO_SMALL: "Target resource pool capacity is too small",
     E_POOL_NO_RESOURCES: "Unable to run fuzzer: not enough CPU/RAM in target resource pool",
     E_POOL_LOCKED: "Target resource pool is locked. Please, try again later, when it will be unlocked",
+    E_POOL_OWNER_UNAVAILABLE: "Service replica which owns target resource pool is unavailable. Please, try again later",
 }
 
 
@@ -1,19 +1,31 @@
 import asyncio
+import logging
+from contextlib import suppress
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, Path, Response
-from pydantic import BaseModel, ConstrainedInt, ConstrainedStr
+from fastapi import APIRouter, Depends, Path, Request, Response
+from fastapi.responses import RedirectResponse
+from pydantic import BaseModel, ConstrainedInt, ConstrainedStr, conlist
 from starlette.status import *
 
 from starter.app.kubernetes.client import KubernetesClient
-from starter.app.kubernetes.pods.displacement import try_displace_pods
+from starter.app.kubernetes.coordination import ShardCoordinator
+from starter.app.kubernetes.pods.displacement import (
+    try_displace_pods,
+    try_displace_pods_on_node,
+)
 from starter.app.kubernetes.pods.registry import FuzzerPod, FuzzerPodRegistry
-from starter.app.kubernetes.pools.registry import PoolRegistry
+from starter.app.kubernetes.pools.registry import PoolRegistry, Reservation
+from starter.app.kubernetes.pools.registry.admission_queue import (
+    AdmissionPriority,
+    admission_priority,
+)
 from starter.app.kubernetes.pools.registry.errors import (
     PoolCapacityExceededError,
     PoolLockedError,
     PoolNoResourcesLeftError,
+    PoolNoSuitableNodeError,
     PoolNotFoundError,
     PoolOverflowError,
 )
@@ -23,13 +35,14 @@ from starter.app.util.images import agent_image_name, sandbox_image_name
 from ..base import ResponseModelFailed, ResponseModelOk
 from ..depends import (
     Operation,
+    get_coordinator,
     get_k8s_client,
     get_pod_registry,
     get_pool_registry,
     get_settings,
 )
 from ..error_codes import *
-from ..error_model import error_model, error_msg
+from ..error_model import ErrorModel, error_model, error_msg
 from ..utils import (
     log_operation_debug_info_to,
     log_operation_error_to,
@@ -54,6 +67,54 @@ def log_operation_error(operation: str, reason: str, **kwargs):
     log_operation_error_to("api.fuzzers", operation, reason, **kwargs)
 
 
+########################################
+# Pool ownership
+########################################
+
+
+def redirect_to_pool_owner(
+    request: Request,
+    response: Response,
+    pool_id: str,
+    operation: str,
+    coordinator: ShardCoordinator,
+):
+    """
+    Launches are served by replica which owns pool, other replicas
+    redirect them to the owner. Method and body are kept by client
+    on 307 redirect. Returns None if pool is owned by this replica
+    """
+
+    if coordinator.owns_pool(pool_id):
+        return None
+
+    owner_url = coordinator.pool_owner_url(pool_id)
+    if owner_url is None:
+        rfail = ResponseModelFailed.construct(
+            error=error_model(E_POOL_OWNER_UNAVAILABLE)
+        )
+        log_operation_error(operation, rfail.error, pool_id=pool_id)
+        response.status_code = HTTP_503_SERVICE_UNAVAILABLE
+        return rfail
+
+    url = owner_url.rstrip("/") + request.url.path
+    if request.url.query:
+        url += "?" + request.url.query
+
+    return RedirectResponse(url, status_code=HTTP_307_TEMPORARY_REDIRECT)
+
+
+POOL_OWNER_RESPONSES = {
+    HTTP_307_TEMPORARY_REDIRECT: {
+        "description": "Pool is owned by other replica. Redirect to it",
+    },
+    HTTP_503_SERVICE_UNAVAILABLE: {
+        "model": ResponseModelFailed,
+        "description": error_msg(E_POOL_OWNER_UNAVAILABLE),
+    },
+}
+
+
 ########################################
 # Run fuzzer
 ########################################
@@ -68,6 +129,10 @@ class ResourceUsage(ConstrainedInt):
     gt = 0
 
 
+class AdmissionTimeout(ConstrainedInt):
+    ge = 0
+
+
 @dataclass
 class ComputeResources:
     cpu: int
@@ -131,43 +196,23 @@ class RunFuzzerRequestModel(BaseModel):
     tmpfs_size: ResourceUsage
     """ Fuzzer tmpfs size in MiB """
 
+    ##################################################
+    # Variables which control admission
+    ##################################################
 
-@router.post(
-    path="",
-    status_code=HTTP_201_CREATED,
-    responses={
-        HTTP_201_CREATED: {
-            "model": ResponseModelOk,
-            "description": "Successful response",
-        },
-        HTTP_404_NOT_FOUND: {
-            "model": ResponseModelFailed,
-            "description": error_msg(E_POOL_NOT_FOUND),
-        },
-        HTTP_409_CONFLICT: {
-            "model": ResponseModelFailed,
-            "description": error_msg(E_POOL_TOO_SMALL, E_POOL_NO_RESOURCES),
-        },
-    },
-)
-async def run_fuzzer(
-    response: Response,
-    launch: RunFuzzerRequestModel,
-    pool_id: LimitedString = Path(...),
-    operation: str = Depends(Operation("Run fuzzer")),
-    pool_registry: PoolRegistry = Depends(get_pool_registry),
-    pod_registry: FuzzerPodRegistry = Depends(get_pod_registry),
-    k8s_client: KubernetesClient = Depends(get_k8s_client),
-    settings: AppSettings = Depends(get_settings),
-):
-    def error_response(status_code: int, error_code: int):
-        kw = {"fuzzer_id": launch.fuzzer_id, "fuzzer_rev": launch.fuzzer_rev}
-        rfail = ResponseModelFailed.construct(error=error_model(error_code))
-        log_operation_error(operation, rfail.error, **kw)
-        response.status_code = status_code
-        return rfail
+    admission_timeout: Optional[AdmissionTimeout] = None
+    """ Max seconds to wait for pool resources. Fail at once if not set """
+
+
+@dataclass
+class LaunchResources:
+    sandbox: ComputeResources
+    agent: ComputeResources
+    total: ComputeResources
+    reservation: Optional[Reservation] = None
 
-    log_operation_debug_info(operation, launch)
+
+def get_launch_resources(launch: RunFuzzerRequestModel, settings: AppSettings):
 
     #
     # Total ram usage of the container
@@ -189,55 +234,239 @@ async def run_fuzzer(
         rs_sandbox.ram + rs_agent.ram,
     )
 
+    return LaunchResources(rs_sandbox, rs_agent, rs_total)
+
+
+def admission_timeout(launch: RunFuzzerRequestModel, settings: AppSettings):
+    timeout = launch.admission_timeout or 0
+    return min(timeout, settings.fuzzer_pod.admission_max_wait)
+
+
+def launch_priority(
+    pool_id: str,
+    launch: RunFuzzerRequestModel,
+    rs: LaunchResources,
+    pool_registry: PoolRegistry,
+    pod_registry: FuzzerPodRegistry,
+):
     #
-    # First, try to allocate resources for pod from resource pool
-    # If resources have been allocated, create pod
+    # Launches of the same mode are ordered by fair share
+    # of their tenant (user project) after the launch.
+    # Tenants which are over quota go after the others
     #
 
     try:
-        pool_registry.allocate_resources(pool_id, rs_total.cpu, rs_total.ram)
+        pool = pool_registry.find_pool(pool_id)
+    except PoolNotFoundError:
+        return admission_priority(launch.agent_mode)
+
+    share = pod_registry.tenant_share(
+        pool_id,
+        (launch.user_id, launch.project_id),
+        pool.cpu_limit,
+        pool.ram_limit,
+        rs.total.cpu,
+        rs.total.ram,
+    )
+
+    return admission_priority(launch.agent_mode, share)
+
+
+def allocate_launch_resources(
+    pool_id: str,
+    rs: LaunchResources,
+    pool_registry: PoolRegistry,
+    priority: AdmissionPriority,
+    ttl: float,
+) -> Optional[Tuple[int, int]]:
+
+    """
+    Allocates resources for pod on the best fitting node of resource pool
+    and reserves them until pod is created. Launches waiting in admission
+    queue with the same or higher priority go first.
+    Returns (status_code, error_code) pair on failure
+    """
+
+    try:
+        rs.reservation = pool_registry.allocate_resources(
+            pool_id, rs.total.cpu, rs.total.ram, priority, ttl  # fmt: skip
+        )
     except PoolNotFoundError:
-        return error_response(HTTP_404_NOT_FOUND, E_POOL_NOT_FOUND)
+        return HTTP_404_NOT_FOUND, E_POOL_NOT_FOUND
 
     except PoolLockedError:
-        return error_response(HTTP_409_CONFLICT, E_POOL_LOCKED)
+        return HTTP_409_CONFLICT, E_POOL_LOCKED
 
     except PoolCapacityExceededError:
-        return error_response(HTTP_409_CONFLICT, E_POOL_TOO_SMALL)
+        return HTTP_409_CONFLICT, E_POOL_TOO_SMALL
 
     except (PoolNoResourcesLeftError, PoolOverflowError):
+        return HTTP_409_CONFLICT, E_POOL_NO_RESOURCES
 
-        #
-        # Mode "firstrun" has the highest priority to run,
-        # because user wants to see first fuzzing results immediately.
-        # So, pods with lower priority should be stopped to free resources
-        #
+    return None
+
+
+async def wait_launch_resources(
+    pool_id: str,
+    rs: LaunchResources,
+    pool_registry: PoolRegistry,
+    priority: AdmissionPriority,
+    timeout: int,
+    ttl: float,
+) -> Optional[Tuple[int, int]]:
+
+    """
+    Waits in admission queue of resource pool until resources for pod
+    are freed by other pods. Resources are reserved when admitted.
+    Returns (status_code, error_code) pair on failure
+    """
+
+    try:
+        rs.reservation = await pool_registry.wait_resources(
+            pool_id, rs.total.cpu, rs.total.ram, priority, timeout, ttl
+        )
+    except PoolNotFoundError:
+        return HTTP_404_NOT_FOUND, E_POOL_NOT_FOUND
+
+    except PoolLockedError:
+        return HTTP_409_CONFLICT, E_POOL_LOCKED
+
+    except PoolCapacityExceededError:
+        return HTTP_409_CONFLICT, E_POOL_TOO_SMALL
+
+    except (PoolNoResourcesLeftError, PoolOverflowError):
+        return HTTP_409_CONFLICT, E_POOL_NO_RESOURCES
+
+    return None
 
-        if launch.agent_mode == "firstrun":
-            if not pod_registry.displacement_in_progress(pool_id):
-                free_cpu, free_ram = pool_registry.resources_left(pool_id)
-                cpu_required = rs_total.cpu - free_cpu
-                ram_required = rs_total.ram - free_ram
-
-                asyncio.get_running_loop().create_task(
-                    try_displace_pods(
-                        pool_id,
-                        pod_registry,
-                        k8s_client,
-                        cpu_required,
-                        ram_required,
-                    )
-                )
 
-        return error_response(HTTP_409_CONFLICT, E_POOL_NO_RESOURCES)
+def renew_launch_resources(
+    pool_id: str,
+    rs: LaunchResources,
+    pool_registry: PoolRegistry,
+    ttl: float,
+) -> Optional[Tuple[int, int]]:
+
+    """
+    Extends reservation of launch before its pod is created. Expired
+    reservation is replaced with a new one if resources are still left.
+    Returns (status_code, error_code) pair on failure
+    """
+
+    assert rs.reservation is not None
+
+    try:
+        rs.reservation = pool_registry.renew_reservation(pool_id, rs.reservation, ttl)
+    except PoolNotFoundError:
+        return HTTP_404_NOT_FOUND, E_POOL_NOT_FOUND
+
+    except PoolLockedError:
+        return HTTP_409_CONFLICT, E_POOL_LOCKED
+
+    except PoolCapacityExceededError:
+        return HTTP_409_CONFLICT, E_POOL_TOO_SMALL
+
+    except (PoolNoResourcesLeftError, PoolOverflowError):
+        return HTTP_409_CONFLICT, E_POOL_NO_RESOURCES
+
+    return None
+
+
+def start_pod_displacement(
+    pool_id: str,
+    cpu_needed: int,
+    ram_needed: int,
+    pool_registry: PoolRegistry,
+    pod_registry: FuzzerPodRegistry,
+    k8s_client: KubernetesClient,
+    settings: AppSettings,
+):
+    #
+    # Mode "firstrun" has the highest priority to run,
+    # because user wants to see first fuzzing results immediately.
+    # So, pods with lower priority should be stopped to free resources
+    #
+
+    if pod_registry.displacement_in_progress(pool_id):
+        return
+
+    # Tenants which are over quota are displaced first
+    pool = pool_registry.find_pool(pool_id)
+    over_quota = pod_registry.over_quota_tenants(
+        pool_id, pool.cpu_limit, pool.ram_limit
+    )
+
+    free_cpu, free_ram = pool_registry.resources_left(pool_id)
+    cpu_required = cpu_needed - free_cpu
+    ram_required = ram_needed - free_ram
+    loop = asyncio.get_running_loop()
+
+    #
+    # Pool has enough resources in total, but they are
+    # spread among nodes. Free enough resources on one node
+    #
+
+    if cpu_required <= 0 and ram_required <= 0:
+        loop.create_task(
+            try_displace_pods_on_node(
+                pool_id,
+                pod_registry,
+                k8s_client,
+                cpu_needed,
+                ram_needed,
+                pool_registry.nodes_free(pool_id),
+                settings.fuzzer_pod.min_work_time,
+                over_quota,
+            )
+        )
+        return
+
+    loop.create_task(
+        try_displace_pods(
+            pool_id,
+            pod_registry,
+            k8s_client,
+            cpu_required,
+            ram_required,
+            settings.fuzzer_pod.min_work_time,
+            over_quota,
+        )
+    )
+
+
+async def create_fuzzer_pod(
+    pool_id: str,
+    launch: RunFuzzerRequestModel,
+    rs: LaunchResources,
+    pool_registry: PoolRegistry,
+    pod_registry: FuzzerPodRegistry,
+    k8s_client: KubernetesClient,
+    settings: AppSettings,
+) -> Optional[Tuple[int, int]]:
+
+    """
+    Creates pod with resources reserved for launch.
+    Returns (status_code, error_code) pair on failure
+    """
 
     #
-    # Try to create pod using kubernetes API
-    # If operation failed, free allocated resources
+    # Resources are reserved since allocation until pod is created.
+    # If operation failed, reservation is released. If pod
+    # never reaches registry, reservation expires. Pool may be
+    # removed while launch waits, then its reservation is gone too
     #
 
     agent_image = agent_image_name(launch.fuzzer_engine, settings)
     sandbox_image = sandbox_image_name(launch.image_id, settings)
+    ttl = settings.fuzzer_pod.reservation_ttl
+
+    # Launch may have waited for its turn to create pod
+    error = renew_launch_resources(pool_id, rs, pool_registry, ttl)
+    if error is not None:
+        return error
+
+    reservation = rs.reservation
+    assert reservation is not None
 
     try:
         pod = await k8s_client.create_fuzzer_pod(
@@ -252,17 +481,31 @@ async def run_fuzzer(
             session_id=launch.session_id,
             agent_image=agent_image,
             sandbox_image=sandbox_image,
-            agent_cpu_usage=rs_agent.cpu,
-            agent_ram_usage=rs_agent.ram,
-            sandbox_cpu_usage=rs_sandbox.cpu,
-            sandbox_ram_usage=rs_sandbox.ram,
+            agent_cpu_usage=rs.agent.cpu,
+            agent_ram_usage=rs.agent.ram,
+            sandbox_cpu_usage=rs.sandbox.cpu,
+            sandbox_ram_usage=rs.sandbox.ram,
             tmpfs_size=launch.tmpfs_size,
+            node_name=reservation.node_name,
         )
 
     except:
-        pool_registry.free_resources(pool_id, rs_total.cpu, rs_total.ram)
+        with suppress(PoolNotFoundError):
+            pool_registry.release_reservation(pool_id, reservation)
         raise
 
+    try:
+        pool_registry.commit_reservation(pool_id, reservation)
+
+    # Pod has been created, even if its pool is removed now
+    except PoolNotFoundError:
+        pass
+
+    # Reservation has expired during creation and resources are taken
+    except PoolNoSuitableNodeError:
+        await k8s_client.delete_fuzzer_pod(pod.metadata.name)
+        return HTTP_409_CONFLICT, E_POOL_NO_RESOURCES
+
     pod_registry.add_pod(
         FuzzerPod(
             # V1Pod
@@ -270,9 +513,11 @@ async def run_fuzzer(
             phase=pod.status.phase,
             displaced=False,
             deleting=False,
-            cpu=rs_total.cpu,
-            ram=rs_total.ram,
+            cpu=rs.total.cpu,
+            ram=rs.total.ram,
+            node_name=reservation.node_name,
             start_time=None,
+            create_time=pod.metadata.creation_timestamp,
             # Suitcase
             user_id=launch.user_id,
             project_id=launch.project_id,
@@ -284,12 +529,113 @@ async def run_fuzzer(
             fuzzer_engine=launch.fuzzer_engine,
             session_id=launch.session_id,
             # Pre saved logs
-            agent_logs=None,
-            sandbox_logs=None,
+            agent_logs_ref=None,
+            sandbox_logs_ref=None,
             logs_saved=False,
         )
     )
 
+    return None
+
+
+@router.post(
+    path="",
+    status_code=HTTP_201_CREATED,
+    responses={
+        HTTP_201_CREATED: {
+            "model": ResponseModelOk,
+            "description": "Successful response",
+        },
+        HTTP_404_NOT_FOUND: {
+            "model": ResponseModelFailed,
+            "description": error_msg(E_POOL_NOT_FOUND),
+        },
+        HTTP_409_CONFLICT: {
+            "model": ResponseModelFailed,
+            "description": error_msg(E_POOL_TOO_SMALL, E_POOL_NO_RESOURCES),
+        },
+        **POOL_OWNER_RESPONSES,
+    },
+)
+async def run_fuzzer(
+    request: Request,
+    response: Response,
+    launch: RunFuzzerRequestModel,
+    pool_id: LimitedString = Path(...),
+    operation: str = Depends(Operation("Run fuzzer")),
+    pool_registry: PoolRegistry = Depends(get_pool_registry),
+    pod_registry: FuzzerPodRegistry = Depends(get_pod_registry),
+    k8s_client: KubernetesClient = Depends(get_k8s_client),
+    coordinator: ShardCoordinator = Depends(get_coordinator),
+    settings: AppSettings = Depends(get_settings),
+):
+    def error_response(status_code: int, error_code: int):
+        kw = {"fuzzer_id": launch.fuzzer_id, "fuzzer_rev": launch.fuzzer_rev}
+        rfail = ResponseModelFailed.construct(error=error_model(error_code))
+        log_operation_error(operation, rfail.error, **kw)
+        response.status_code = status_code
+        return rfail
+
+    redirect = redirect_to_pool_owner(
+        request, response, pool_id, operation, coordinator
+    )
+    if redirect is not None:
+        return redirect
+
+    log_operation_debug_info(operation, launch)
+    rs = get_launch_resources(launch, settings)
+
+    #
+    # First, try to allocate resources for pod from resource pool
+    # If resources have been allocated, create pod
+    #
+
+    ttl = settings.fuzzer_pod.reservation_ttl
+    priority = launch_priority(pool_id, launch, rs, pool_registry, pod_registry)
+    error = allocate_launch_resources(pool_id, rs, pool_registry, priority, ttl)
+
+    if error is not None:
+        status_code, error_code = error
+        if error_code == E_POOL_NO_RESOURCES and launch.agent_mode == "firstrun":
+            start_pod_displacement(
+                pool_id,
+                rs.total.cpu,
+                rs.total.ram,
+                pool_registry,
+                pod_registry,
+                k8s_client,
+                settings,
+            )
+
+        #
+        # Launch may wait until other pods free resources (long poll).
+        # Response is sent when pod is created or when wait is over
+        #
+
+        timeout = admission_timeout(launch, settings)
+        if error_code == E_POOL_NO_RESOURCES and timeout > 0:
+            error = await wait_launch_resources(
+                pool_id, rs, pool_registry, priority, timeout, ttl
+            )
+
+        if error is not None:
+            status_code, error_code = error
+            return error_response(status_code, error_code)
+
+    error = await create_fuzzer_pod(
+        pool_id,
+        launch,
+        rs,
+        pool_registry,
+        pod_registry,
+        k8s_client,
+        settings,
+    )
+
+    if error is not None:
+        status_code, error_code = error
+        return error_response(status_code, error_code)
+
     log_operation_success(
         operation=operation,
         pool_id=pool_id,
@@ -301,6 +647,197 @@ async def run_fuzzer(
     return ResponseModelOk()
 
 
+########################################
+# Run fuzzers (batch)
+########################################
+
+
+C_MAX_BATCH_SIZE = 500
+
+
+class RunFuzzerBatchItemResultModel(BaseModel):
+    status: str
+    error: Optional[ErrorModel]
+
+
+class ResponseRunFuzzerBatchOk(ResponseModelOk):
+    result: List[RunFuzzerBatchItemResultModel]
+
+
+@router.post(
+    path="/batch",
+    status_code=HTTP_200_OK,
+    responses={
+        HTTP_200_OK: {
+            "model": ResponseRunFuzzerBatchOk,
+            "description": "Successful response. Contains result for each launch",
+        },
+        HTTP_404_NOT_FOUND: {
+            "model": ResponseModelFailed,
+            "description": error_msg(E_POOL_NOT_FOUND),
+        },
+        **POOL_OWNER_RESPONSES,
+    },
+)
+async def run_fuzzer_batch(
+    request: Request,
+    response: Response,
+    launches: conlist(RunFuzzerRequestModel, min_items=1, max_items=C_MAX_BATCH_SIZE),
+    pool_id: LimitedString = Path(...),
+    operation: str = Depends(Operation("Run fuzzer batch")),
+    pool_registry: PoolRegistry = Depends(get_pool_registry),
+    pod_registry: FuzzerPodRegistry = Depends(get_pod_registry),
+    k8s_client: KubernetesClient = Depends(get_k8s_client),
+    coordinator: ShardCoordinator = Depends(get_coordinator),
+    settings: AppSettings = Depends(get_settings),
+):
+    results: List[Optional[RunFuzzerBatchItemResultModel]]
+    results = [None] * len(launches)
+
+    def item_ok(i: int):
+        results[i] = RunFuzzerBatchItemResultModel.construct(status="OK")
+
+    def item_error(i: int, error_code: int):
+        launch = launches[i]
+        kw = {"fuzzer_id": launch.fuzzer_id, "fuzzer_rev": launch.fuzzer_rev}
+        error = error_model(error_code)
+        log_operation_error(operation, error, **kw)
+
+        results[i] = RunFuzzerBatchItemResultModel.construct(
+            status="FAILED",
+            error=error,
+        )
+
+    redirect = redirect_to_pool_owner(
+        request, response, pool_id, operation, coordinator
+    )
+    if redirect is not None:
+        return redirect
+
+    log_operation_debug_info(operation, launches)
+
+    if not pool_registry.has_pool(pool_id):
+        kw = {"pool_id": pool_id}
+        rfail = ResponseModelFailed.construct(error=error_model(E_POOL_NOT_FOUND))
+        log_operation_error(operation, rfail.error, **kw)
+        response.status_code = HTTP_404_NOT_FOUND
+        return rfail
+
+    #
+    # Allocate resources for all pods at once. Allocation is done
+    # in memory without any awaits, so it's consistent for the whole batch.
+    # Firstrun launches which did not fit are handled by one displacement
+    #
+
+    allocated: List[Tuple[int, LaunchResources]] = []
+    waiting: List[Tuple[int, LaunchResources, AdmissionPriority]] = []
+    ttl = settings.fuzzer_pod.reservation_ttl
+    displacement_cpu = 0
+    displacement_ram = 0
+
+    for i, launch in enumerate(launches):
+        rs = get_launch_resources(launch, settings)
+        priority = launch_priority(pool_id, launch, rs, pool_registry, pod_registry)
+        error = allocate_launch_resources(pool_id, rs, pool_registry, priority, ttl)
+
+        if error is None:
+            allocated.append((i, rs))
+            continue
+
+        _, error_code = error
+        if error_code == E_POOL_NO_RESOURCES and launch.agent_mode == "firstrun":
+            displacement_cpu += rs.total.cpu
+            displacement_ram += rs.total.ram
+
+        if error_code == E_POOL_NO_RESOURCES and admission_timeout(launch, settings):
+            waiting.append((i, rs, priority))
+            continue
+
+        item_error(i, error_code)
+
+    if displacement_cpu > 0 or displacement_ram > 0:
+        start_pod_displacement(
+            pool_id,
+            displacement_cpu,
+            displacement_ram,
+            pool_registry,
+            pod_registry,
+            k8s_client,
+            settings,
+        )
+
+    #
+    # Create pods concurrently with bounded fan-out
+    #
+
+    semaphore = asyncio.Semaphore(settings.fuzzer_pod.launch_concurrency)
+
+    async def create_pod(i: int, rs: LaunchResources):
+        launch = launches[i]
+        async with semaphore:
+            try:
+                error = await create_fuzzer_pod(
+                    pool_id,
+                    launch,
+                    rs,
+                    pool_registry,
+                    pod_registry,
+                    k8s_client,
+                    settings,
+                )
+            except Exception as e:
+                msg = "Failed to create fuzzer pod <id='%s', rev='%s'>. Reason - %s"
+                args = launch.fuzzer_id, launch.fuzzer_rev, e
+                logging.getLogger("api.fuzzers").error(msg, *args)
+                item_error(i, E_INTERNAL_ERROR)
+                return
+
+        if error is not None:
+            _, error_code = error
+            item_error(i, error_code)
+            return
+
+        item_ok(i)
+
+    async def wait_and_create_pod(
+        i: int, rs: LaunchResources, priority: AdmissionPriority
+    ):
+        error = await wait_launch_resources(
+            pool_id,
+            rs,
+            pool_registry,
+            priority,
+            admission_timeout(launches[i], settings),
+            ttl,
+        )
+
+        if error is not None:
+            _, error_code = error
+            item_error(i, error_code)
+            return
+
+        await create_pod(i, rs)
+
+    #
+    # Launches which did not fit wait in admission queue
+    # in order of batch. Response is sent when all are done
+    #
+
+    await asyncio.gather(
+        *[create_pod(i, rs) for i, rs in allocated],
+        *[wait_and_create_pod(i, rs, priority) for i, rs, priority in waiting],
+    )
+
+    log_operation_success(
+        operation=operation,
+        pool_id=pool_id,
+        launched=sum(1 for res in results if res.status == "OK"),
+        total=len(launches),
+    )
+
+    return ResponseRunFuzzerBatchOk.construct(result=results)
+
+
 ########################################
 # Stop fuzzer pods in pool
 ########################################
@@ -1,5 +1,11 @@
+from datetime import timedelta
+
 from starter.app.database.abstract import IDatabase
+from starter.app.kubernetes.coordination import ShardCoordinator
+from starter.app.log_store import ILogStore
+from starter.app.log_store.abstract import day_prefix
 from starter.app.settings import AppSettings
+from starter.app.util.datetime import date_now
 
 from ..bg_task import BackgroundTask
 
@@ -7,13 +13,53 @@ from ..bg_task import BackgroundTask
 class FuzzerSavedLaunchCleaner(BackgroundTask):
 
     _db: IDatabase
+    _log_store: ILogStore
+    _coordinator: ShardCoordinator
+    _batch_size: int
+    _retention_period: int
+    _expiry_migrated: bool
 
-    def __init__(self, settings: AppSettings, db: IDatabase) -> None:
+    def __init__(
+        self,
+        settings: AppSettings,
+        db: IDatabase,
+        log_store: ILogStore,
+        coordinator: ShardCoordinator,
+    ) -> None:
         name = self.__class__.__name__
         wait_interval = settings.fuzzer_pod.launch_info_cleanup_interval
         super().__init__(name, wait_interval)
+        self._batch_size = settings.fuzzer_pod.launch_info_cleanup_batch_size
+        self._retention_period = settings.fuzzer_pod.launch_info_retention_period
+        self._log_store = log_store
+        self._coordinator = coordinator
         self._db = db
+        self._expiry_migrated = False
 
     async def _task_coro(self):
-        await self._db.launches.remove_expired()
-        self._logger.debug("Fuzzer saved launch cleanup is done")
+
+        # Database and log store are shared by replicas
+        if not self._coordinator.is_leader:
+            return
+
+        #
+        # Launches saved by older versions get numeric expiry once
+        # per run, in background, so startup does not wait for it
+        #
+
+        if not self._expiry_migrated:
+            updated = await self._db.launches.migrate_expiry(self._batch_size)
+            self._expiry_migrated = True
+
+            if updated > 0:
+                msg = "Set numeric expiry for %d saved launches"
+                self._logger.info(msg, updated)
+
+        removed = await self._db.launches.remove_expired(self._batch_size)
+        msg = "Fuzzer saved launch cleanup is done. Removed: %d"
+        self._logger.debug(msg, removed)
+
+        # Logs are saved after launch start, so they
+        # are kept one more day than launch itself
+        retention = timedelta(seconds=self._retention_period, days=1)
+        await self._log_store.remove_saved_before(day_prefix(date_now() - retention))
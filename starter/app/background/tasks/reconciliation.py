@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from starter.app.external_api.external_api import ExternalAPI
+from starter.app.external_api.models import PMGRPool
+from starter.app.kubernetes.pods.events.event_listener import PodEventListener
+from starter.app.kubernetes.pods.registry import FuzzerPodRegistry
+from starter.app.kubernetes.pods.registry.instance import parse_k8s_pod
+from starter.app.kubernetes.pools.registry import PoolRegistry
+from starter.app.metrics import registry_drift_corrections, registry_resource_drift
+from starter.app.settings import AppSettings
+from starter.app.util.datetime import date_now
+
+from ..bg_task import BackgroundTask
+
+if TYPE_CHECKING:
+    from kubernetes_asyncio.client import V1Pod
+
+
+class RegistryReconciler(BackgroundTask):
+
+    """
+    Event streams of kubernetes and pool manager may lose events,
+    so registries slowly drift from actual state. Task relists pools
+    and fuzzer pods, then corrects only entries which differ
+    """
+
+    _pod_listener: PodEventListener
+    _pod_registry: FuzzerPodRegistry
+    _pool_registry: PoolRegistry
+    _external_api: ExternalAPI
+    _min_pod_age: timedelta
+
+    def __init__(
+        self,
+        settings: AppSettings,
+        pod_listener: PodEventListener,
+        pod_registry: FuzzerPodRegistry,
+        pool_registry: PoolRegistry,
+        external_api: ExternalAPI,
+    ) -> None:
+        name = self.__class__.__name__
+        wait_interval = settings.fuzzer_pod.reconcile_interval
+        super().__init__(name, wait_interval)
+        self._pod_listener = pod_listener
+        self._pod_registry = pod_registry
+        self._pool_registry = pool_registry
+        self._external_api = external_api
+
+        # Pods younger than reservation are still being created
+        self._min_pod_age = timedelta(seconds=settings.fuzzer_pod.reservation_ttl)
+
+    def _correct(self, kind: str, amount: int = 1):
+        if amount > 0:
+            registry_drift_corrections.labels(kind=kind).inc(amount)
+
+    def _reconcile_pool_nodes(self, pool: PMGRPool):
+
+        rs_pool = self._pool_registry.find_pool(pool.id)
+        actual = {n.name: (n.cpu, n.ram) for n in pool.rs_avail.nodes}
+        known = {n.name: (n.cpu, n.ram) for n in rs_pool.nodes}
+
+        for node_name, capacity in known.items():
+            if actual.get(node_name) != capacity:
+                rs_pool.remove_node(node_name)
+                self._correct("node")
+
+        for node_name, (cpu, ram) in actual.items():
+            if known.get(node_name) != (cpu, ram):
+                rs_pool.add_node(node_name, cpu, ram)
+                self._correct("node")
+
+    def _reconcile_pools(self, pools: List[PMGRPool]):
+
+        actual = {pool.id: pool for pool in pools}
+
+        for rs_pool in self._pool_registry.list_pools():
+            if rs_pool.id in actual:
+                continue
+
+            # Pods of removed pool are still accounted in it
+            if self._pod_registry.list_pool_pods(rs_pool.id):
+                if not rs_pool.locked:
+                    rs_pool.lock()
+                    self._correct("pool_lock")
+                continue
+
+            self._pool_registry.remove_pool(rs_pool.id)
+            self._correct("pool_removed")
+
+        for pool in pools:
+
+            locked = pool.operation is not None
+            if not self._pool_registry.has_pool(pool.id):
+                self._pool_registry.create_pool(pool.id, locked)
+                self._correct("pool_added")
+
+            rs_pool = self._pool_registry.find_pool(pool.id)
+            if rs_pool.locked != locked:
+                if locked:
+                    rs_pool.lock()
+                else:
+                    rs_pool.unlock()
+                self._correct("pool_lock")
+
+            self._reconcile_pool_nodes(pool)
+
+    def _add_unknown_pods(self, v1_pods: List[V1Pod]):
+
+        min_create_time = date_now() - self._min_pod_age
+
+        for v1_pod in v1_pods:
+
+            if self._pod_registry.has_pod(v1_pod.metadata.name):
+                continue
+
+            # Pod may be created right now. It's added by its launch
+            create_time = v1_pod.metadata.creation_timestamp
+            if create_time is None or create_time > min_create_time:
+                continue
+
+            try:
+                pod = parse_k8s_pod(v1_pod)
+            except RuntimeError:
+                self._logger.exception("Failed to parse unknown pod")
+                continue
+
+            if not self._pool_registry.has_pool(pod.pool_id):
+                continue
+
+            self._pod_registry.add_pod(pod)
+            self._correct("pod_unknown")
+
+            msg = "Found unknown pod '%s' in pool '%s'"
+            self._logger.warning(msg, pod.name, pod.pool_id)
+
+    def _reconcile_usage(self):
+
+        usage: Dict[str, List[Tuple[str, int, int]]] = {}
+        for pod in self._pod_registry.list_pods():
+            pod_usage = pod.node_name, pod.cpu, pod.ram
+            usage.setdefault(pod.pool_id, []).append(pod_usage)
+
+        for rs_pool in self._pool_registry.list_pools():
+
+            cpu_drift, ram_drift = rs_pool.reconcile_usage(usage.get(rs_pool.id, []))
+            registry_resource_drift.labels(rs_pool.id, "cpu").set(cpu_drift)
+            registry_resource_drift.labels(rs_pool.id, "ram").set(ram_drift)
+
+            if cpu_drift != 0 or ram_drift != 0:
+                self._correct("resources")
+                msg = "Corrected usage of pool '%s': <cpu_drift=%dm, ram_drift=%dMi>"
+                self._logger.warning(msg, rs_pool.id, cpu_drift, ram_drift)
+
+    async def _task_coro(self):
+
+        #
+        # Diff of pools is applied without awaits in between,
+        # so pool event handler never sees it half done
+        #
+
+        pools = [pool async for pool in self._external_api.pool_mgr.list_pools()]
+        self._reconcile_pools(pools)
+
+        #
+        # Pod events are not handled while pods are being compared,
+        # otherwise pod may be both added by event and by relist
+        #
+
+        async with self._pod_listener.pause():
+            pod_count = self._pod_registry.pod_count
+            v1_pods = await self._pod_listener.relist()
+            self._correct("pod_lost", pod_count - self._pod_registry.pod_count)
+            self._add_unknown_pods(v1_pods)
+            self._reconcile_usage()
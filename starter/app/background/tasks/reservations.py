@@ -0,0 +1,21 @@
+from starter.app.kubernetes.pools.registry import PoolRegistry
+from starter.app.settings import AppSettings
+
+from ..bg_task import BackgroundTask
+
+
+class ExpiredReservationCleaner(BackgroundTask):
+
+    _pool_registry: PoolRegistry
+
+    def __init__(self, settings: AppSettings, pool_registry: PoolRegistry) -> None:
+        name = self.__class__.__name__
+        wait_interval = settings.fuzzer_pod.reservation_cleanup_interval
+        super().__init__(name, wait_interval)
+        self._pool_registry = pool_registry
+
+    async def _task_coro(self):
+        expired = self._pool_registry.expire_reservations()
+        if expired > 0:
+            msg = "Freed resources of %d expired reservations"
+            self._logger.warning(msg, expired)
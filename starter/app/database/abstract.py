@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from abc import ABCMeta, abstractmethod
-from typing import TYPE_CHECKING, Dict
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional
 
 from starter.app.database.orm import ORMLaunch
 from starter.app.util.developer import testing_only
@@ -13,15 +13,21 @@ if TYPE_CHECKING:
 class IUnsentMessages(metaclass=ABCMeta):
 
     """
-    Used for saving/loading MQ unsent messages from database.
+    Used as outbox of MQ messages. Message is appended when
+    it's produced and deleted when it has been accepted by broker.
+    Each message is a dict with 'queue', 'name', 'body' and 'order'
     """
 
     @abstractmethod
-    async def save_unsent_messages(self, messages: Dict[str, list]):
+    async def append_messages(self, messages: List[dict]) -> List[Optional[str]]:
         pass
 
     @abstractmethod
-    async def load_unsent_messages(self) -> Dict[str, list]:
+    async def delete_messages(self, ids: List[str]) -> None:
+        pass
+
+    @abstractmethod
+    def load_unsent_messages(self, batch_size: int) -> AsyncIterator[dict]:
         pass
 
 
@@ -36,7 +42,15 @@ class ILaunches(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    async def remove_expired(self):
+    async def save_many(self, launches: List[ORMLaunch]) -> int:
+        pass
+
+    @abstractmethod
+    async def remove_expired(self, batch_size: int) -> int:
+        pass
+
+    @abstractmethod
+    async def migrate_expiry(self, batch_size: int) -> int:
         pass
 
 
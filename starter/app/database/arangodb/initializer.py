@@ -136,9 +136,27 @@ class ArangoDBInitializer(ArangoDBBaseInitializer):
             ]
         )
 
+    async def _create_launch_indexes(self):
+
+        #
+        # Saved launches are removed by ArangoDB when 'expire_at'
+        # (seconds since epoch) is reached. TTL index is also used
+        # by saved launch cleaner to find expired launches
+        #
+
+        col = self._db[self._collections.launches]
+        await col.add_ttl_index(["expire_at"], expiry_time=0, name="expire_at_ttl")
+
+    async def _create_outbox_indexes(self):
+        # MQ messages are loaded from outbox in order of producing
+        col = self._db[self._collections.unsent_messages]
+        await col.add_persistent_index(["order"], name="order")
+
     def get_init_tasks(self):
         yield from super().get_init_tasks()
         yield "Create collections", self._create_all_collections()
+        yield "Create launch indexes", self._create_launch_indexes()
+        yield "Create outbox indexes", self._create_outbox_indexes()
 
     @property
     def collections(self):
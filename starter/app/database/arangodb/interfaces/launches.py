@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, List
+
+from aioarangodb.exceptions import ArangoError
 
 from starter.app.database.abstract import ILaunches
 from starter.app.database.orm import ORMLaunch
+from starter.app.util.datetime import date_now
 
 from .base import DBBase
-from .util import dbkey_to_id, maybe_unknown_error
+from .util import maybe_unknown_error
 
 if TYPE_CHECKING:
     from aioarangodb.collection import StandardCollection
@@ -26,19 +29,84 @@ class DBLaunches(DBBase, ILaunches):
     @maybe_unknown_error
     async def save(self, launch: ORMLaunch) -> ORMLaunch:
         res = await self._col_launches.insert(launch.dict(exclude={"id"}))
-        return ORMLaunch.parse_obj(dbkey_to_id({**res, **launch.dict()}))
+        return launch.copy(update={"id": res["_key"]})
+
+    @maybe_unknown_error
+    async def save_many(self, launches: List[ORMLaunch]) -> int:
+
+        """Saves launches with one request. Returns count of saved launches"""
+
+        docs = [launch.dict(exclude={"id"}) for launch in launches]
+        results = await self._col_launches.insert_many(docs)
+        return sum(1 for res in results if not isinstance(res, ArangoError))
 
     @maybe_unknown_error
-    async def remove_expired(self):
+    async def remove_expired(self, batch_size: int) -> int:
+
+        #
+        # Expired launches are found with TTL index on 'expire_at'.
+        # Condition 'expire_at > 0' allows to use sparse index.
+        # Launches may be removed concurrently by TTL thread
+        #
 
         # fmt: off
-        query, variables  ="""
+        query, variables = """
             FOR launch in @@collection
-                FILTER DATE_ISO8601(DATE_NOW()) > launch.exp_date
-                REMOVE launch IN @@collection
+                FILTER launch.expire_at > 0 AND launch.expire_at <= @now
+                LIMIT @batch_size
+                REMOVE launch IN @@collection OPTIONS { ignoreErrors: true }
+                COLLECT WITH COUNT INTO removed
+                RETURN removed
         """, {
-            "@collection": self._col_launches.name
+            "@collection": self._col_launches.name,
+            "batch_size": batch_size,
+            "now": int(date_now().timestamp()),
         }
         # fmt: on
 
-        await self._db.aql.execute(query, bind_vars=variables)
+        total = 0
+        while True:
+            cursor = await self._db.aql.execute(query, bind_vars=variables)
+            removed = await cursor.next()
+            total += removed
+
+            if removed < batch_size:
+                break
+
+        return total
+
+    @maybe_unknown_error
+    async def migrate_expiry(self, batch_size: int) -> int:
+
+        #
+        # Launches saved by older versions have only 'exp_date' string.
+        # Convert it to numeric 'expire_at' to make TTL index work for them.
+        # Such launches are not indexed, so they are updated batch by batch
+        #
+
+        # fmt: off
+        query, variables = """
+            FOR launch IN @@collection
+                FILTER launch.expire_at == null
+                LIMIT @batch_size
+                UPDATE launch WITH {
+                    expire_at: FLOOR(DATE_TIMESTAMP(launch.exp_date) / 1000)
+                } IN @@collection
+                COLLECT WITH COUNT INTO updated
+                RETURN updated
+        """, {
+            "@collection": self._col_launches.name,
+            "batch_size": batch_size,
+        }
+        # fmt: on
+
+        total = 0
+        while True:
+            cursor = await self._db.aql.execute(query, bind_vars=variables)
+            updated = await cursor.next()
+            total += updated
+
+            if updated < batch_size:
+                break
+
+        return total
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Dict
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional
+
+from aioarangodb.exceptions import ArangoError
+from aiohttp.client_exceptions import ClientConnectionError
 
 from starter.app.database.abstract import IUnsentMessages
+from starter.app.database.errors import DatabaseError
 
 from .base import DBBase
-from .util import maybe_unknown_error
+from .util import dbkey_to_id, maybe_unknown_error
 
 if TYPE_CHECKING:
     from aioarangodb.collection import StandardCollection
@@ -24,62 +28,58 @@ class DBUnsentMessages(DBBase, IUnsentMessages):
         super().__init__(db, collections)
 
     @maybe_unknown_error
-    async def save_unsent_messages(self, unsent_messages: Dict[str, list]):
-
-        await self._col_messages.truncate()
-        for queue_name, messages in unsent_messages.items():
-
-            docs = []
-            for i, message in enumerate(messages):
-                assert "name" in message
-                assert "body" in message
-                docs.append(
-                    {
-                        "name": message["name"],
-                        "body": message["body"],
-                        "queue": queue_name,
-                        "order": i,
-                    }
-                )
-
-            if docs:
-                await self._col_messages.insert_many(docs)
+    async def append_messages(self, messages: List[dict]) -> List[Optional[str]]:
+
+        """Appends messages with one request. Returns ids (None if failed)"""
+
+        for message in messages:
+            assert "queue" in message
+            assert "name" in message
+            assert "body" in message
+            assert "order" in message
+
+        results = await self._col_messages.insert_many(messages)
+        return [
+            None
+            if isinstance(res, ArangoError)
+            else res["_key"]
+            for res in results  # fmt: skip
+        ]
 
     @maybe_unknown_error
-    async def load_unsent_messages(self) -> Dict[str, list]:
+    async def delete_messages(self, ids: List[str]):
+        docs = [{"_key": id} for id in ids]
+        await self._col_messages.delete_many(docs, silent=True)
+
+    async def load_unsent_messages(self, batch_size: int) -> AsyncIterator[dict]:
+
+        #
+        # Messages are streamed by cursor in order of producing,
+        # so the whole outbox is never loaded into memory
+        #
 
         # fmt: off
         query, variables = """
             FOR msg in @@collection
                 SORT msg.order
-                COLLECT queue = msg.queue INTO groupedByQueue
-                RETURN groupedByQueue[*].msg
+                RETURN msg
         """, {
             "@collection": self._col_messages.name,
         }
         # fmt: on
 
-        unsent_messages: Dict[str, list] = {}
-        cursor: Cursor = await self._db.aql.execute(query, bind_vars=variables)
-        grouped_by_queue = [doc async for doc in cursor]
-
-        for grouped_messages in grouped_by_queue:
-            for message in grouped_messages:
-
-                mq_message = {
-                    "name": message["name"],
-                    "body": message["body"],
-                }
-
-                queue = message["queue"]
-
-                try:
-                    messages = unsent_messages[queue]
-                    messages.append(mq_message)
-
-                except KeyError:
-                    messages = list()
-                    messages.append(mq_message)
-                    unsent_messages[queue] = messages
-
-        return unsent_messages
+        try:
+            cursor: Cursor = await self._db.aql.execute(
+                query,
+                bind_vars=variables,
+                batch_size=batch_size,
+                stream=True,
+            )
+
+            async for doc in cursor:
+                yield dbkey_to_id(doc)
+
+        # Wrapping is done here because
+        # decorator does not support generators
+        except (ArangoError, ClientConnectionError) as e:
+            raise DatabaseError(e) from e
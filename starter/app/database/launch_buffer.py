@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from contextlib import suppress
+from typing import TYPE_CHECKING, Deque, Optional
+
+from .errors import DatabaseError
+
+if TYPE_CHECKING:
+    from starter.app.settings import AppSettings
+
+    from .abstract import ILaunches
+    from .orm import ORMLaunch
+
+
+class LaunchSaveBuffer:
+
+    """
+    Write-behind buffer for pod launches. Launches are collected
+    in memory and saved with one request per batch. Batch is flushed
+    when it's full or when flush interval has passed. If database
+    is slow, `save` waits until there is free space in buffer
+    """
+
+    _launches: ILaunches
+    _logger: logging.Logger
+    _buffer: Deque[ORMLaunch]
+    _free_slots: asyncio.Semaphore
+    _wakeup_event: asyncio.Event
+    _flush_task: Optional[asyncio.Task]
+    _flush_interval: int
+    _batch_size: int
+    _failed: bool
+    _is_closed: bool
+
+    def _init(self, launches: ILaunches, settings: AppSettings):
+
+        self._launches = launches
+        self._logger = logging.getLogger("db.launches")
+        self._batch_size = settings.fuzzer_pod.launch_save_batch_size
+        self._flush_interval = settings.fuzzer_pod.launch_save_interval
+        max_pending = settings.fuzzer_pod.launch_save_max_pending
+
+        assert self._batch_size > 0, "Batch size must be greater than zero"
+        assert max_pending >= self._batch_size, "Buffer is less than batch"
+
+        self._free_slots = asyncio.Semaphore(max_pending)
+        self._wakeup_event = asyncio.Event()
+        self._buffer = deque()
+        self._failed = False
+
+        loop = asyncio.get_running_loop()
+        self._flush_task = loop.create_task(self._flush_loop())
+        self._is_closed = False
+
+    @staticmethod
+    async def create(launches: ILaunches, settings: AppSettings):
+        _self = LaunchSaveBuffer()
+        _self._init(launches, settings)
+        return _self
+
+    async def save(self, launch: ORMLaunch):
+
+        """Enqueues launch for saving. Waits if buffer is full"""
+
+        assert not self._is_closed, "Buffer has been closed"
+
+        await self._free_slots.acquire()
+        self._buffer.append(launch)
+
+        # After failure database is not retried before flush interval
+        if len(self._buffer) >= self._batch_size and not self._failed:
+            self._wakeup_event.set()
+
+    async def _flush_batch(self):
+
+        count = min(len(self._buffer), self._batch_size)
+        batch = [self._buffer[i] for i in range(count)]
+
+        try:
+            saved = await self._launches.save_many(batch)
+
+        except DatabaseError as e:
+            msg = "Failed to save %d launches. Reason - %s"
+            self._logger.error(msg, len(batch), e)
+            return False
+
+        if saved != len(batch):
+            msg = "Saved %d of %d launches. Others are dropped"
+            self._logger.error(msg, saved, len(batch))
+
+        for _ in range(count):
+            self._buffer.popleft()
+            self._free_slots.release()
+
+        return True
+
+    async def _flush(self, full_only: bool = False):
+
+        min_size = self._batch_size if full_only else 1
+
+        while len(self._buffer) >= min_size:
+            if not await self._flush_batch():
+                self._failed = True
+                return False
+
+        self._failed = False
+        return True
+
+    async def _flush_loop(self):
+
+        #
+        # Batches failed to save are kept in buffer and
+        # retried after flush interval. Meanwhile, buffer
+        # becomes full and producers are slowed down
+        #
+
+        while not self._is_closed:
+
+            full_only = False
+
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    self._wakeup_event.wait(),
+                    self._flush_interval,
+                )
+                # Woken up by full batch: flush full batches only
+                full_only = not self._is_closed
+
+            self._wakeup_event.clear()
+
+            try:
+                await self._flush(full_only)
+            except:
+                self._logger.exception("Unhandled exception")
+
+            # Batches filled during failed flush wait for interval too
+            if self._failed and not self._is_closed:
+                self._wakeup_event.clear()
+
+    async def close(self):
+
+        """Stops periodic flushing and saves remaining launches"""
+
+        assert not self._is_closed, "Closed twice"
+        self._is_closed = True
+
+        # Let current flush complete to not save batch twice
+        count = len(self._buffer)
+        self._wakeup_event.set()
+        await self._flush_task
+
+        if not await self._flush():
+            msg = "Failed to save launches on shutdown. Lost: %d"
+            self._logger.error(msg, len(self._buffer))
+        elif count > 0:
+            self._logger.info("Saved %d buffered launches", count)
+
+    def __del__(self):
+        if not getattr(self, "_is_closed", True):
+            self._logger.error("Launch buffer has not been closed")
+
+    @property
+    def pending_count(self):
+        return len(self._buffer)
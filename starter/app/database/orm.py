@@ -9,6 +9,7 @@ class ORMLaunch(BaseModel):
 
     id: Optional[str]
     exp_date: str
+    expire_at: int
 
     fuzzer_id: str
     fuzzer_rev: str
@@ -22,8 +23,9 @@ class ORMLaunch(BaseModel):
     start_time: str
     finish_time: str
     exit_reason: str
-    agent_logs: Optional[str]
-    sandbox_logs: Optional[str]
+    agent_logs_ref: Optional[str]
+    sandbox_logs_ref: Optional[str]
+    logs_encoding: Optional[str]
 
 
 class Paginator:
@@ -6,14 +6,13 @@ from typing import Any, Callable, Optional, Type
 from aiohttp import ClientError, ClientResponse, ClientSession
 from pydantic import BaseModel, ValidationError
 
-from starter.app.api.error_model import ErrorModel
 from starter.app.external_api.errors import (
     EAPIClientError,
     EAPIResponseParseError,
     EAPIServerError,
     ExternalAPIError,
 )
-from starter.app.external_api.models import ListResultModel
+from starter.app.external_api.models import ErrorModel, ListResultModel
 from starter.app.util.speedup import json
 
 
@@ -4,19 +4,27 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import secrets
+import string
 from contextlib import AsyncExitStack
-from typing import TYPE_CHECKING, AsyncIterator, Optional
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional, Set
 
-from kubernetes_asyncio.client import ApiClient
+from aiohttp import ClientError
+from kubernetes_asyncio.client import ApiClient, ApiException
 from kubernetes_asyncio.client.api.core_v1_api import CoreV1Api as BaseCoreV1Api
 
+from starter.app.spec.agent.compiled import CompiledAgentSpecTemplate
 from starter.app.spec.agent.template import AgentSpecTemplate
-from starter.app.util.labels import bondifuzz_key
+from starter.app.util.labels import bondifuzz_key, parse_bondifuzz_labels
 from starter.app.util.resources import CpuResources, RamResources
+from starter.app.util.speedup import json
 
 from ..settings import AppSettings
 from ..util.developer import testing_only
+from .coordination.hash_ring import REPLICA_LABEL, SHARD_LABEL, pool_shard
+from .informer import FUZZER_POD_LABEL, PodInformer
 
 if TYPE_CHECKING:
 
@@ -30,6 +38,20 @@ if TYPE_CHECKING:
 
     V1PodIterator = AsyncIterator[V1Pod]
 
+# Label patch is the same for all displaced pods
+DISPLACE_PATCH = {
+    "metadata": {
+        "labels": {
+            bondifuzz_key("displaced_at"): "",
+        }
+    }
+}
+
+# Names of pods used in one label selector
+DELETE_CHUNK_SIZE = 100
+
+POD_NAME_ALPHABET = string.ascii_lowercase + string.digits
+
 
 ########################################
 # Kubernetes API wrapper
@@ -74,7 +96,11 @@ class KubernetesClient:
     _logger: logging.Logger
     _namespace: str
     _is_closed: bool
-    _agent_template: AgentSpecTemplate
+    _agent_template: CompiledAgentSpecTemplate
+    _pod_informer: PodInformer
+    _bulk_concurrency: int
+    _shard_count: int
+    _replica_id: str
 
     @staticmethod
     async def _create_client():
@@ -89,7 +115,10 @@ class KubernetesClient:
 
         self._logger = logging.getLogger("k8s.client")
         self._namespace = settings.fuzzer_pod.namespace
-        self._agent_template = AgentSpecTemplate("agent.yaml")
+        self._bulk_concurrency = settings.fuzzer_pod.bulk_concurrency
+        self._shard_count = settings.sharding.shard_count
+        self._replica_id = settings.sharding.replica_id
+        self._agent_template = AgentSpecTemplate("agent.yaml").compile()
         self._exit_stack = None
         self._is_closed = True
 
@@ -100,6 +129,8 @@ class KubernetesClient:
         self._client = client
         self._v1 = v1
 
+        self._pod_informer = PodInformer(v1, self._namespace)
+
     async def create(settings: AppSettings) -> KubernetesClient:
         _self = KubernetesClient()
         await _self._init(settings)
@@ -123,13 +154,24 @@ class KubernetesClient:
         sandbox_cpu_usage: int,
         sandbox_ram_usage: int,
         tmpfs_size: int,
+        node_name: Optional[str] = None,
     ) -> V1Pod:
 
         #
         # Set pod values
         #
 
+        #
+        # Pod name is generated here instead of k8s,
+        # so pods can be selected by name with label selector
+        #
+
+        suffix = "".join(secrets.choice(POD_NAME_ALPHABET) for _ in range(10))
+        pod_name = self._agent_template.name_prefix + suffix
+
         spec = self._agent_template.copy()
+        spec.set_name(pod_name)
+        spec.set_label(bondifuzz_key("pod_name"), pod_name)
         spec.set_label(bondifuzz_key("agent_mode"), agent_mode)
         spec.set_label(bondifuzz_key("session_id"), session_id)
         spec.set_label(bondifuzz_key("user_id"), user_id)
@@ -139,6 +181,8 @@ class KubernetesClient:
         spec.set_label(bondifuzz_key("fuzzer_rev"), fuzzer_rev)
         spec.set_label(bondifuzz_key("fuzzer_lang"), fuzzer_lang)
         spec.set_label(bondifuzz_key("fuzzer_engine"), fuzzer_engine)
+        spec.set_label(SHARD_LABEL, str(pool_shard(pool_id, self._shard_count)))
+        spec.set_label(REPLICA_LABEL, self._replica_id)
         spec.set_tmpfs_size(RamResources.to_string(tmpfs_size))
 
         spec.set_node_selector(
@@ -153,6 +197,10 @@ class KubernetesClient:
             effect="NoSchedule",
         )
 
+        # Pod is placed on the node its resources were allocated on
+        if node_name is not None:
+            spec.set_node_affinity(node_name)
+
         #
         # Set agent container values
         #
@@ -191,10 +239,13 @@ class KubernetesClient:
         # Create pod from generated spec
         #
 
-        return await self._v1.create_namespaced_pod(
+        pod: V1Pod = await self._v1.create_namespaced_pod(
             self._namespace, spec.as_dict()  # fmt: skip
         )
 
+        self._pod_informer.remember(pod)
+        return pod
+
     async def read_pod_log(self, pod_name: str, container_name: str):
 
         """
@@ -212,6 +263,75 @@ class KubernetesClient:
             pod_name, self._namespace, container=container_name
         )
 
+    async def read_fuzzer_pod(self, pod_name: str) -> Optional[V1Pod]:
+
+        """
+        Description:
+            Reads pod from API server (not from local cache)
+
+        Args:
+            pod_name (str): name of the pod
+
+        Returns:
+            Optional[V1Pod]: Pod or None if it does not exist
+        """
+
+        try:
+            return await self._v1.read_namespaced_pod(pod_name, self._namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+
+    async def stream_pod_log(
+        self,
+        pod_name: str,
+        container_name: str,
+        tail_lines: Optional[int] = None,
+        limit_bytes: Optional[int] = None,
+        chunk_size: int = 64 * 1024,
+    ) -> AsyncIterator[bytes]:
+
+        """
+        Description:
+            Reads pod's log chunk by chunk without buffering it.
+
+        Args:
+            pod_name (str): name of the pod
+            container_name (str): name of the container
+            tail_lines (Optional[int]): read only last lines of log
+            limit_bytes (Optional[int]): read not more than given bytes
+
+        Returns:
+            AsyncIterator[bytes]: Chunks of log
+        """
+
+        kw = {}
+        if tail_lines is not None:
+            kw["tail_lines"] = tail_lines
+        if limit_bytes is not None:
+            kw["limit_bytes"] = limit_bytes
+
+        # Raw aiohttp response is returned
+        resp = await self._v1.read_namespaced_pod_log(
+            pod_name,
+            self._namespace,
+            container=container_name,
+            _preload_content=False,
+            **kw,
+        )
+
+        try:
+            if not 200 <= resp.status <= 299:
+                reason = (await resp.read()).decode(errors="replace")
+                raise ApiException(status=resp.status, reason=reason)
+
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                yield chunk
+
+        finally:
+            resp.release()
+
     async def delete_fuzzer_pod(self, name: str) -> bool:
 
         """
@@ -240,15 +360,147 @@ class KubernetesClient:
             None
         """
 
-        obj = {
-            "metadata": {
-                "labels": {
-                    bondifuzz_key("displaced_at"): "",
-                }
-            }
-        }
+        await self._v1.patch_namespaced_pod(name, self._namespace, DISPLACE_PATCH)
+
+    async def _run_bounded(self, func, names: List[str]) -> List[str]:
+
+        #
+        # Calls API for each pod with bounded concurrency
+        # Returns names of pods, for which call has failed.
+        # Pods which do not exist anymore are not failed
+        #
+
+        semaphore = asyncio.Semaphore(self._bulk_concurrency)
+        failed = []
+
+        async def call(name: str):
+            async with semaphore:
+                try:
+                    await func(name, self._namespace)
+                except ApiException as e:
+                    if e.status != 404:
+                        msg = "API call for pod '%s' failed. Reason - %s"
+                        self._logger.error(msg, name, e)
+                        failed.append(name)
+
+        await asyncio.gather(*[call(name) for name in names])
+        return failed
+
+    async def displace_fuzzer_pods(self, names: List[str]) -> List[str]:
+
+        """
+        Description:
+            Add displacement label to many pods with bounded concurrency
 
-        await self._v1.patch_namespaced_pod(name, self._namespace, obj)
+        Args:
+            names (List[str]): names of the pods
+
+        Returns:
+            List[str]: names of pods which failed to be displaced
+        """
+
+        async def displace(name: str, namespace: str):
+            await self._v1.patch_namespaced_pod(name, namespace, DISPLACE_PATCH)
+
+        # Skip pods which are already gone or labeled
+        if self._pod_informer.has_synced:
+            label = bondifuzz_key("displaced_at")
+            informer = self._pod_informer
+            names = [
+                name
+                for name in informer.existing(names)
+                if label not in informer.get(name).metadata.labels
+            ]
+
+        return await self._run_bounded(displace, names)
+
+    async def delete_fuzzer_pods_by_name(self, names: List[str]) -> List[str]:
+
+        """
+        Description:
+            Delete many pods with one request per chunk of names.
+            Pods are selected by label with pod name. Pods without
+            such label (created by older versions) are deleted one by one
+
+        Args:
+            names (List[str]): names of the pods
+
+        Returns:
+            List[str]: names of pods which failed to be deleted
+        """
+
+        # Skip pods which are already gone
+        if self._pod_informer.has_synced:
+            names = self._pod_informer.existing(names)
+
+        deleted: Set[str] = set()
+        label = bondifuzz_key("pod_name")
+
+        for i in range(0, len(names), DELETE_CHUNK_SIZE):
+            chunk = names[i : i + DELETE_CHUNK_SIZE]
+            selector = "{} in ({})".format(label, ",".join(chunk))
+
+            #
+            # Client declares response as V1Status, but API returns
+            # list of deleted pods. So, raw response is parsed here
+            #
+
+            # Pods of failed chunk are deleted one by one below
+            try:
+                resp = await self._v1.delete_collection_namespaced_pod(
+                    self._namespace,
+                    label_selector=selector,
+                    _preload_content=False,
+                )
+
+                try:
+                    data = await resp.read()
+                finally:
+                    resp.release()
+
+            except (ApiException, ClientError) as e:
+                msg = "Failed to delete chunk of pods. Reason - %s"
+                self._logger.error(msg, e)
+                continue
+
+            if not 200 <= resp.status <= 299:
+                reason = data.decode(errors="replace")
+                msg = "Failed to delete chunk of pods. Reason - %s"
+                self._logger.error(msg, reason)
+                continue
+
+            items = json.loads(data).get("items") or []
+            deleted.update(pod["metadata"]["name"] for pod in items)
+
+        remaining = [name for name in names if name not in deleted]
+        return await self._run_bounded(self._v1.delete_namespaced_pod, remaining)
+
+    async def label_unsharded_pods(self) -> int:
+
+        """
+        Description:
+            Adds shard label to fuzzer pods created by older versions
+
+        Returns:
+            int: count of labeled pods
+        """
+
+        selector = f"{FUZZER_POD_LABEL},!{SHARD_LABEL}"
+        pods = self._v1.list_namespaced_pod_iter(
+            self._namespace, label_selector=selector
+        )
+
+        shards = {}
+        async for pod in pods:
+            labels = parse_bondifuzz_labels(pod.metadata.labels)
+            shards[pod.metadata.name] = pool_shard(labels["pool_id"], self._shard_count)
+
+        async def label(name: str, namespace: str):
+            patch = {"metadata": {"labels": {SHARD_LABEL: str(shards[name])}}}
+            await self._v1.patch_namespaced_pod(name, namespace, patch)
+
+        failed = await self._run_bounded(label, list(shards))
+        return len(shards) - len(failed)
 
     @testing_only
     async def delete_all_fuzzer_pods(self):
@@ -270,6 +522,24 @@ class KubernetesClient:
     ):
         assert fuzzer_id is not None or pool_id is not None
 
+        #
+        # Pods created by this service are added to local cache
+        # right after creation. So, if there are no such pods
+        # in cache, there is nothing to delete. Pods of pools
+        # owned by other replicas are not cached here
+        #
+
+        if self._pod_informer.has_synced and self._pod_informer.covers(pool_id):
+
+            labels = {}
+            if pool_id is not None:
+                labels["pool_id"] = pool_id
+            if fuzzer_id is not None:
+                labels["fuzzer_id"] = fuzzer_id
+
+            if not self._pod_informer.find_by_labels(**labels):
+                return
+
         # helper func, creates k8s selector
         def make_selector(key: str, val: str):
             return f"{bondifuzz_key(key)}={val}"
@@ -283,9 +553,18 @@ class KubernetesClient:
         kw = {"label_selector": ",".join(label_selectors)}
         await self._v1.delete_collection_namespaced_pod(self._namespace, **kw)
 
-    def list_fuzzer_pods(self):
-        kw = {"label_selector": bondifuzz_key("pool_id")}
-        return self._v1.list_namespaced_pod_iter(self._namespace, **kw)
+    async def list_fuzzer_pods(self) -> List[V1Pod]:
+
+        """Returns fuzzer pods from local cache. Cache is synced if needed"""
+
+        if not self._pod_informer.has_synced:
+            await self._pod_informer.sync()
+
+        return self._pod_informer.list_pods()
+
+    @property
+    def pod_informer(self):
+        return self._pod_informer
 
     async def close(self):
 
@@ -0,0 +1,13 @@
+from .coordinator import ShardCoordinator
+from .hash_ring import REPLICA_LABEL, SHARD_LABEL, HashRing, ShardSet, pool_shard
+from .lease import LeaseLock
+
+__all__ = [
+    "REPLICA_LABEL",
+    "SHARD_LABEL",
+    "HashRing",
+    "LeaseLock",
+    "ShardCoordinator",
+    "ShardSet",
+    "pool_shard",
+]
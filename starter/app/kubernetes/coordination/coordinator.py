@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack, suppress
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional
+
+from kubernetes_asyncio.client import ApiClient, ApiException, CoordinationV1Api
+
+from starter.app.metrics import (
+    lease_errors,
+    replica_is_leader,
+    replica_members,
+    replica_owned_shards,
+    shard_rebalances,
+)
+from starter.app.settings import AppSettings
+from starter.app.util.datetime import date_now
+from starter.app.util.labels import bondifuzz_key
+
+from .hash_ring import HashRing, ShardSet, pool_shard
+from .lease import LeaseLock, lease_expired
+
+if TYPE_CHECKING:
+
+    # fmt: off
+    # isort: off
+    from kubernetes_asyncio.client import V1Lease
+    from kubernetes_asyncio.client.models.v1_lease_list import V1LeaseList
+    # isort: on
+    # fmt: on
+
+    from starter.app.kubernetes.client import KubernetesClient
+
+# Member leases of replicas are selected by this label
+MEMBER_LABEL = bondifuzz_key("starter_member")
+
+# Base URL of replica stored in its member lease
+REPLICA_URL_ANNOTATION = bondifuzz_key("replica_url")
+
+ReshardHandler = Callable[[ShardSet], Awaitable[None]]
+
+
+class ShardCoordinator:
+
+    """
+    Splits pools between starter replicas. Each replica renews its own
+    member lease, replicas with live leases form consistent-hash ring,
+    which maps shards of pools to replicas. One of replicas also holds
+    leader lease and does cluster-wide work. Leases of other replicas
+    are checked with local clock, so lease duration must be much longer
+    than clock skew. If sharding is disabled, the only replica owns all
+    pools and is the leader
+    """
+
+    _api: CoordinationV1Api
+    _client: ApiClient
+    _exit_stack: Optional[AsyncExitStack]
+    _logger: logging.Logger
+    _k8s_client: KubernetesClient
+    _member_lease: LeaseLock
+    _leader_lease: LeaseLock
+    _members: Dict[str, Optional[str]]
+    _ring: HashRing
+    _shards: Optional[ShardSet]
+    _handlers: List[ReshardHandler]
+    _task: Optional[asyncio.Task]
+    _renewed_at: float
+    _is_leader: bool
+
+    @staticmethod
+    async def _create_client():
+
+        exit_stack = AsyncExitStack()
+        client = await exit_stack.enter_async_context(ApiClient())
+        api = CoordinationV1Api(client)
+
+        return exit_stack, client, api
+
+    async def _init(self, settings: AppSettings, k8s_client: KubernetesClient):
+
+        sharding = settings.sharding
+        self._logger = logging.getLogger("k8s.coordinator")
+        self._namespace = settings.fuzzer_pod.namespace
+        self._enabled = sharding.enabled
+        self._replica_id = sharding.replica_id
+        self._replica_url = sharding.replica_url
+        self._lease_prefix = sharding.lease_prefix
+        self._lease_duration = sharding.lease_duration
+        self._renew_interval = sharding.renew_interval
+        self._shard_count = sharding.shard_count
+        self._virtual_nodes = sharding.virtual_nodes
+        self._k8s_client = k8s_client
+        self._handlers = []
+        self._task = None
+        self._exit_stack = None
+        self._is_closed = False
+
+        self._members = {self._replica_id: self._replica_url}
+        self._ring = HashRing(self._members, self._virtual_nodes)
+        self._is_leader = not self._enabled
+        self._renewed_at = time.monotonic()
+        self._shards = None
+
+        if not self._enabled:
+            return
+
+        exit_stack, client, api = await self._create_client()
+        self._exit_stack = exit_stack
+        self._client = client
+        self._api = api
+
+        self._member_lease = LeaseLock(
+            api,
+            self._namespace,
+            name=f"{self._lease_prefix}-member-{self._replica_id}",
+            identity=self._replica_id,
+            duration=self._lease_duration,
+            labels={MEMBER_LABEL: self._lease_prefix},
+            annotations={REPLICA_URL_ANNOTATION: self._replica_url},
+        )
+
+        self._leader_lease = LeaseLock(
+            api,
+            self._namespace,
+            name=f"{self._lease_prefix}-leader",
+            identity=self._replica_id,
+            duration=self._lease_duration,
+        )
+
+        # Shards are known before pods are loaded
+        self._shards = ShardSet(self._shard_count, frozenset())
+        await self._renew()
+
+    @staticmethod
+    async def create(settings: AppSettings, k8s_client: KubernetesClient):
+        _self = ShardCoordinator()
+        await _self._init(settings, k8s_client)
+        return _self
+
+    async def _list_members(self) -> Dict[str, Optional[str]]:
+
+        leases: V1LeaseList = await self._api.list_namespaced_lease(
+            self._namespace,
+            label_selector=f"{MEMBER_LABEL}={self._lease_prefix}",
+        )
+
+        now = date_now()
+        members: Dict[str, Optional[str]] = {}
+        lease: V1Lease
+
+        for lease in leases.items:
+            if not lease_expired(lease, now):
+                annotations = lease.metadata.annotations or {}
+                url = annotations.get(REPLICA_URL_ANNOTATION)
+                members[lease.spec.holder_identity] = url
+
+        return members
+
+    async def _set_members(self, members: Dict[str, Optional[str]]):
+
+        ring = HashRing(members, self._virtual_nodes)
+        owned = ring.shards_of(self._replica_id, self._shard_count)
+        replica_members.set(len(members))
+
+        if owned == self._shards.owned:
+            self._members = members
+            self._ring = ring
+            return
+
+        msg = "Owned shards changed: %d -> %d. Live replicas: %s"
+        self._logger.info(msg, len(self._shards.owned), len(owned), sorted(members))
+
+        #
+        # Pools are switched only when all handlers have taken them over.
+        # If any of handlers failed, owned shards still differ
+        # on next renew, so handlers are called again
+        #
+
+        shards = ShardSet(self._shard_count, owned)
+        for handler in self._handlers:
+            await handler(shards)
+
+        self._members = members
+        self._ring = ring
+        self._shards = shards
+
+        replica_owned_shards.set(len(owned))
+        shard_rebalances.inc()
+
+    async def _on_leadership(self):
+
+        #
+        # Pods created before sharding have no shard label,
+        # so they are not seen by any replica. Leader adds it
+        #
+
+        try:
+            labeled = await self._k8s_client.label_unsharded_pods()
+        except ApiException as e:
+            self._logger.error("Failed to label unsharded pods. Reason - %s", e)
+            return
+
+        if labeled > 0:
+            self._logger.info("Added shard label to %d pods", labeled)
+
+    async def _renew(self):
+
+        if await self._member_lease.try_acquire():
+            self._renewed_at = time.monotonic()
+        else:
+            msg = "Lease '%s' is held by other replica with the same id"
+            self._logger.error(msg, self._member_lease.name)
+
+        was_leader = self._is_leader
+        self._is_leader = await self._leader_lease.try_acquire()
+        replica_is_leader.set(int(self._is_leader))
+
+        if self._is_leader != was_leader:
+            msg = "Replica '%s' is %s"
+            state = "the leader now" if self._is_leader else "not the leader anymore"
+            self._logger.info(msg, self._replica_id, state)
+
+        if self._is_leader and not was_leader:
+            await self._on_leadership()
+
+        members = await self._list_members()
+        if not self._lease_expired():
+            members[self._replica_id] = self._replica_url
+
+        await self._set_members(members)
+
+    def _lease_expired(self):
+        return time.monotonic() - self._renewed_at > self._lease_duration
+
+    async def _renew_loop(self):
+
+        while True:
+            try:
+                await asyncio.sleep(self._renew_interval)
+                await self._renew()
+            except asyncio.CancelledError:
+                break
+            except Exception:
+                self._logger.exception("Failed to renew leases")
+                lease_errors.inc()
+
+                #
+                # Other replicas take over pools of replica whose lease
+                # has expired. Replica must give them up on its side too
+                #
+
+                if self._lease_expired():
+                    self._is_leader = False
+                    replica_is_leader.set(0)
+
+                    try:
+                        await self._set_members({})
+                    except Exception:
+                        self._logger.exception("Failed to give up pools")
+
+    def add_reshard_handler(self, handler: ReshardHandler):
+        """Handler is called when owned shards change"""
+        self._handlers.append(handler)
+
+    def owns_pool(self, pool_id: str):
+        return self._shards is None or self._shards.covers(pool_id)
+
+    def pool_owner_url(self, pool_id: str) -> Optional[str]:
+
+        """URL of replica which owns pool or None if it's unknown"""
+
+        if self.owns_pool(pool_id):
+            return self._replica_url
+
+        owner = self._ring.owner(str(pool_shard(pool_id, self._shard_count)))
+        return self._members.get(owner)
+
+    @property
+    def shards(self) -> Optional[ShardSet]:
+        return self._shards
+
+    @property
+    def is_leader(self):
+        return self._is_leader
+
+    async def start(self):
+
+        assert self._task is None, "Already started"
+
+        if self._enabled:
+            loop = asyncio.get_running_loop()
+            self._task = loop.create_task(self._renew_loop())
+
+    async def stop(self):
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+
+        self._task = None
+
+    async def close(self):
+
+        assert not self._is_closed, "Closed twice"
+
+        await self.stop()
+
+        #
+        # Other replicas take over pools and leadership at once,
+        # without waiting until leases of this replica expire
+        #
+
+        if self._enabled:
+            try:
+                await self._member_lease.delete()
+                await self._leader_lease.release()
+            except ApiException as e:
+                self._logger.error("Failed to release leases. Reason - %s", e)
+
+        if self._exit_stack:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+
+        self._is_closed = True
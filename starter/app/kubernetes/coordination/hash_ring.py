@@ -0,0 +1,78 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from hashlib import md5
+from typing import FrozenSet, Iterable, List, Optional
+
+from starter.app.util.labels import bondifuzz_key
+
+# Shard of pool, which pod belongs to
+SHARD_LABEL = bondifuzz_key("shard")
+
+# Replica which has created pod
+REPLICA_LABEL = bondifuzz_key("replica")
+
+
+def _hash(key: str) -> int:
+    # Built-in hash() is salted per process, so it's not used
+    return int.from_bytes(md5(key.encode()).digest()[:8], "big")
+
+
+def pool_shard(pool_id: str, shard_count: int) -> int:
+    return _hash(pool_id) % shard_count
+
+
+class HashRing:
+
+    """
+    Consistent-hash ring of replicas. Each replica is placed on ring
+    in several points (virtual nodes), key belongs to the replica of
+    the first point after hash of key. When replica joins or leaves,
+    only keys of its points move to other replicas
+    """
+
+    _hashes: List[int]
+    _members: List[str]
+
+    def __init__(self, members: Iterable[str], virtual_nodes: int):
+
+        points = sorted(
+            (_hash(f"{member}#{i}"), member)
+            for member in set(members)
+            for i in range(virtual_nodes)
+        )
+
+        self._hashes = [h for h, _ in points]
+        self._members = [member for _, member in points]
+
+    def owner(self, key: str) -> Optional[str]:
+
+        if not self._hashes:
+            return None
+
+        i = bisect_right(self._hashes, _hash(key)) % len(self._hashes)
+        return self._members[i]
+
+    def shards_of(self, member: str, shard_count: int) -> FrozenSet[int]:
+        shards = range(shard_count)
+        return frozenset(s for s in shards if self.owner(str(s)) == member)
+
+
+@dataclass(frozen=True)
+class ShardSet:
+
+    """Shards of pools owned by replica"""
+
+    count: int
+    owned: FrozenSet[int]
+
+    def covers(self, pool_id: str):
+        return pool_shard(pool_id, self.count) in self.owned
+
+    def label_selector(self):
+
+        # Shard label never has this value, so no pods are selected
+        if not self.owned:
+            return f"{SHARD_LABEL}=none"
+
+        shards = ",".join(str(s) for s in sorted(self.owned))
+        return f"{SHARD_LABEL} in ({shards})"
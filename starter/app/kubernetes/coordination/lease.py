@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Optional
+
+from kubernetes_asyncio.client import ApiException
+
+from starter.app.util.datetime import date_now, rfc3339_micro
+
+if TYPE_CHECKING:
+
+    # fmt: off
+    # isort: off
+    from kubernetes_asyncio.client import CoordinationV1Api, V1Lease
+    from kubernetes_asyncio.client.models.v1_lease_spec import V1LeaseSpec
+    # isort: on
+    # fmt: on
+
+
+def lease_expired(lease: V1Lease, now: datetime):
+
+    spec: V1LeaseSpec = lease.spec
+    if not spec.holder_identity or spec.renew_time is None:
+        return True
+
+    duration = timedelta(seconds=spec.lease_duration_seconds or 0)
+    return spec.renew_time + duration < now
+
+
+class LeaseLock:
+
+    """
+    Kubernetes lease held by one replica at a time. Holder renews
+    lease periodically, other replicas take it over when it expires.
+    Updates are made with resource version of the read lease, so
+    only one of replicas taking over lease concurrently succeeds
+    """
+
+    _api: CoordinationV1Api
+    _namespace: str
+    _name: str
+    _identity: str
+    _duration: int
+    _labels: Dict[str, str]
+    _annotations: Dict[str, str]
+
+    def __init__(
+        self,
+        api: CoordinationV1Api,
+        namespace: str,
+        name: str,
+        identity: str,
+        duration: int,
+        labels: Optional[Dict[str, str]] = None,
+        annotations: Optional[Dict[str, str]] = None,
+    ):
+        self._api = api
+        self._namespace = namespace
+        self._name = name
+        self._identity = identity
+        self._duration = duration
+        self._labels = labels or {}
+        self._annotations = annotations or {}
+
+    def _body(
+        self,
+        holder: Optional[str],
+        acquire_time: Optional[datetime],
+        renew_time: Optional[datetime],
+        transitions: int,
+        resource_version: Optional[str] = None,
+    ):
+        # Lease times are MicroTime, which requires fractional seconds
+        def micro_time(date: Optional[datetime]):
+            return rfc3339_micro(date) if date is not None else None
+
+        return {
+            "apiVersion": "coordination.k8s.io/v1",
+            "kind": "Lease",
+            "metadata": {
+                "name": self._name,
+                "labels": self._labels,
+                "annotations": self._annotations,
+                "resourceVersion": resource_version,
+            },
+            "spec": {
+                "holderIdentity": holder,
+                "leaseDurationSeconds": self._duration,
+                "acquireTime": micro_time(acquire_time),
+                "renewTime": micro_time(renew_time),
+                "leaseTransitions": transitions,
+            },
+        }
+
+    async def _read(self) -> Optional[V1Lease]:
+        try:
+            return await self._api.read_namespaced_lease(self._name, self._namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+
+    async def _write(self, body: dict, create: bool):
+
+        try:
+            if create:
+                await self._api.create_namespaced_lease(self._namespace, body)
+            else:
+                await self._api.replace_namespaced_lease(
+                    self._name, self._namespace, body
+                )
+
+        except ApiException as e:
+            # Lease has been created or updated by other replica
+            if e.status == 409:
+                return False
+            raise
+
+        return True
+
+    async def try_acquire(self) -> bool:
+
+        """Acquires or renews lease. Returns whether lease is held"""
+
+        now = date_now()
+        lease = await self._read()
+
+        if lease is None:
+            body = self._body(self._identity, now, now, 0)
+            return await self._write(body, create=True)
+
+        spec: V1LeaseSpec = lease.spec
+        holder = spec.holder_identity
+        if holder != self._identity and not lease_expired(lease, now):
+            return False
+
+        acquire_time = spec.acquire_time
+        transitions = spec.lease_transitions or 0
+
+        if holder != self._identity:
+            acquire_time = now
+            transitions += 1
+
+        resource_version = lease.metadata.resource_version
+        body = self._body(
+            self._identity, acquire_time, now, transitions, resource_version
+        )
+        return await self._write(body, create=False)
+
+    async def release(self):
+
+        """Lets other replicas acquire lease without waiting for expiry"""
+
+        lease = await self._read()
+        if lease is None or lease.spec.holder_identity != self._identity:
+            return
+
+        resource_version = lease.metadata.resource_version
+        transitions = lease.spec.lease_transitions or 0
+        body = self._body(None, None, None, transitions, resource_version)
+        await self._write(body, create=False)
+
+    async def delete(self):
+        try:
+            await self._api.delete_namespaced_lease(self._name, self._namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+
+    @property
+    def name(self):
+        return self._name
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from starter.app.util.labels import bondifuzz_key
+
+from .coordination.hash_ring import ShardSet
+
+if TYPE_CHECKING:
+
+    # fmt: off
+    # isort: off
+    from kubernetes_asyncio.client import V1Pod
+    from kubernetes_asyncio.client.api.core_v1_api import CoreV1Api
+    from kubernetes_asyncio.client.models.v1_list_meta import V1ListMeta
+    from kubernetes_asyncio.client.models.v1_object_meta import V1ObjectMeta
+    from kubernetes_asyncio.client.models.v1_pod_list import V1PodList
+    # isort: on
+    # fmt: on
+
+# Only pods with this label are cached
+FUZZER_POD_LABEL = bondifuzz_key("pool_id")
+
+# Labels which can be used in local lookups
+INDEXED_LABELS = ("pool_id", "fuzzer_id")
+
+
+class PodInformer:
+
+    """
+    Local cache of fuzzer pods. Cache is filled by one list
+    request and then kept up to date by watch events, so it's
+    consistent with the resource version of the last event.
+    Pods are indexed by labels to serve reads without API calls.
+    If pools are sharded between replicas, only pods of owned
+    shards are listed and cached
+    """
+
+    _v1: CoreV1Api
+    _logger: logging.Logger
+    _namespace: str
+    _pods: Dict[str, V1Pod]
+    _indexes: Dict[str, Dict[str, Set[str]]]
+    _resource_version: Optional[str]
+    _shards: Optional[ShardSet]
+
+    def __init__(self, v1: CoreV1Api, namespace: str):
+        self._logger = logging.getLogger("k8s.informer")
+        self._namespace = namespace
+        self._resource_version = None
+        self._shards = None
+        self._v1 = v1
+        self._reset()
+
+    def _reset(self):
+        self._pods = {}
+        self._indexes = {bondifuzz_key(l): {} for l in INDEXED_LABELS}
+
+    @staticmethod
+    def _labels(pod: V1Pod) -> Dict[str, str]:
+        meta: V1ObjectMeta = pod.metadata
+        return meta.labels or {}
+
+    def _index(self, pod: V1Pod):
+        labels = self._labels(pod)
+        for label, index in self._indexes.items():
+            value = labels.get(label)
+            if value is not None:
+                index.setdefault(value, set()).add(pod.metadata.name)
+
+    def _unindex(self, pod: V1Pod):
+
+        labels = self._labels(pod)
+        for label, index in self._indexes.items():
+
+            value = labels.get(label)
+            names = index.get(value)
+            if names is None:
+                continue
+
+            names.discard(pod.metadata.name)
+            if not names:
+                del index[value]
+
+    def _put(self, pod: V1Pod):
+
+        old = self._pods.get(pod.metadata.name)
+        if old is not None:
+            self._unindex(old)
+
+        self._pods[pod.metadata.name] = pod
+        self._index(pod)
+
+    def _remove(self, name: str):
+        pod = self._pods.pop(name, None)
+        if pod is not None:
+            self._unindex(pod)
+
+    async def _list(self) -> Tuple[List[V1Pod], str]:
+
+        #
+        # Resource version of the first page is the
+        # version of consistent snapshot of all pages
+        #
+
+        pods: List[V1Pod] = []
+        resource_version = None
+        continuation_token = None
+
+        while True:
+
+            response: V1PodList = await self._v1.list_namespaced_pod(
+                self._namespace,
+                limit=100,
+                label_selector=self.label_selector,
+                _continue=continuation_token,
+            )
+
+            meta: V1ListMeta = response.metadata
+            if resource_version is None:
+                resource_version = meta.resource_version
+
+            pods.extend(response.items)
+            continuation_token = meta._continue
+
+            if not continuation_token:
+                break
+
+        return pods, resource_version
+
+    async def sync(self) -> List[V1Pod]:
+
+        """Replaces cache with pods listed from API server"""
+
+        pods, resource_version = await self._list()
+
+        self._reset()
+        for pod in pods:
+            self._put(pod)
+
+        self._resource_version = resource_version
+        self._logger.debug("Synced %d pods at version %s", len(pods), resource_version)
+
+        return pods
+
+    def apply(self, event_type: str, pod: V1Pod):
+
+        """Updates cache with watch event"""
+
+        meta: V1ObjectMeta = pod.metadata
+        self._resource_version = meta.resource_version
+
+        if FUZZER_POD_LABEL not in self._labels(pod):
+            return
+
+        if event_type == "DELETED":
+            self._remove(meta.name)
+        else:
+            self._put(pod)
+
+    def remember(self, pod: V1Pod):
+
+        """
+        Adds pod created by this service before watch event comes,
+        so lookups made right after creation can see it
+        """
+
+        pool_id = self._labels(pod).get(FUZZER_POD_LABEL)
+        if pod.metadata.name not in self._pods and self.covers(pool_id):
+            self._put(pod)
+
+    def set_resource_version(self, resource_version: str):
+        self._resource_version = resource_version
+
+    def set_shards(self, shards: Optional[ShardSet]):
+        """Selects pods of given shards. Cache must be synced again"""
+        self._shards = shards
+        self.invalidate()
+
+    def covers(self, pool_id: Optional[str]):
+
+        """
+        Checks whether pods of pool are cached. If pool is not
+        given, checks whether pods of all pools are cached
+        """
+
+        if self._shards is None:
+            return True
+
+        return pool_id is not None and self._shards.covers(pool_id)
+
+    @property
+    def label_selector(self):
+        if self._shards is None:
+            return FUZZER_POD_LABEL
+        return f"{FUZZER_POD_LABEL},{self._shards.label_selector()}"
+
+    def invalidate(self):
+        """Cache must be synced again (e.g. watch has expired)"""
+        self._resource_version = None
+
+    @property
+    def has_synced(self):
+        return self._resource_version is not None
+
+    @property
+    def resource_version(self):
+        return self._resource_version
+
+    def get(self, name: str) -> Optional[V1Pod]:
+        return self._pods.get(name)
+
+    def list_pods(self) -> List[V1Pod]:
+        return list(self._pods.values())
+
+    def find_by_labels(self, **labels: str) -> Set[str]:
+
+        """Returns names of pods which have all given indexed labels"""
+
+        assert labels, "At least one label required"
+
+        result: Optional[Set[str]] = None
+        for label, value in labels.items():
+            index = self._indexes[bondifuzz_key(label)]
+            names = index.get(value, set())
+            result = names if result is None else result & names
+
+        return set(result)
+
+    def existing(self, names: Iterable[str]) -> List[str]:
+        return [name for name in names if name in self._pods]
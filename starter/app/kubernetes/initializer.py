@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 from contextlib import AsyncExitStack
@@ -7,30 +8,69 @@ from random import randint
 from typing import TYPE_CHECKING, Optional
 
 from kubernetes_asyncio import config, watch
-from kubernetes_asyncio.client import ApiClient
+from kubernetes_asyncio.client import (
+    ApiClient,
+    V1ResourceAttributes,
+    V1SelfSubjectAccessReview,
+    V1SelfSubjectAccessReviewSpec,
+)
+from kubernetes_asyncio.client.api.authorization_v1_api import AuthorizationV1Api
 from kubernetes_asyncio.client.api.core_v1_api import CoreV1Api
 from kubernetes_asyncio.config.config_exception import ConfigException
 
 from starter.app.util.images import test_run_image_name
 
-from ..settings import AppSettings
+from ..settings import AppSettings, PodInitCheckMode
 from .errors import KubernetesInitError, wrap_k8s_errors
 
 if TYPE_CHECKING:
     from kubernetes_asyncio.client import V1Pod
     from kubernetes_asyncio.client.models.v1_object_meta import V1ObjectMeta
     from kubernetes_asyncio.client.models.v1_pod_status import V1PodStatus
+    from kubernetes_asyncio.client.models.v1_subject_access_review_status import (
+        V1SubjectAccessReviewStatus,
+    )
+
+
+#
+# Operations on pods performed by starter: (verb, subresource)
+#
+
+POD_PERMISSIONS = [
+    ("create", None),
+    ("get", None),
+    ("list", None),
+    ("watch", None),
+    ("patch", None),
+    ("delete", None),
+    ("deletecollection", None),
+    ("get", "log"),
+]
+
+#
+# Operations on leases performed by starter if sharding is enabled
+#
+
+LEASE_PERMISSIONS = [
+    ("create", None),
+    ("get", None),
+    ("list", None),
+    ("update", None),
+    ("delete", None),
+]
 
 
 class KubernetesInitializer:
 
     _v1: CoreV1Api
+    _auth_v1: AuthorizationV1Api
     _client: ApiClient
     _exit_stack: Optional[AsyncExitStack]
     _logger: logging.Logger
     _init_label: str
     _namespace: str
     _image: str
+    _check_mode: PodInitCheckMode
 
     @staticmethod
     async def _create_client():
@@ -47,8 +87,9 @@ class KubernetesInitializer:
         exit_stack = AsyncExitStack()
         client = await exit_stack.enter_async_context(ApiClient())
         v1 = CoreV1Api(client)
+        auth_v1 = AuthorizationV1Api(client)
 
-        return exit_stack, client, v1
+        return exit_stack, client, v1, auth_v1
 
     async def _init(self, settings: AppSettings):
 
@@ -56,13 +97,16 @@ class KubernetesInitializer:
         self._logger = logging.getLogger("k8s.init")
         self._namespace = settings.fuzzer_pod.namespace
         self._image = test_run_image_name(settings)
+        self._check_mode = settings.fuzzer_pod.init_check_mode
+        self._sharding_enabled = settings.sharding.enabled
         self._exit_stack = None
         self._is_closed = True
 
-        exit_stack, client, v1 = await self._create_client()
+        exit_stack, client, v1, auth_v1 = await self._create_client()
         self._is_closed = False
 
         self._exit_stack = exit_stack
+        self._auth_v1 = auth_v1
         self._client = client
         self._v1 = v1
 
@@ -149,7 +193,78 @@ class KubernetesInitializer:
         kw = {"label_selector": f"app={self._init_label}"}
         await self._v1.delete_collection_namespaced_pod(self._namespace, **kw)
 
+    async def _is_operation_allowed(
+        self,
+        verb: str,
+        subresource: Optional[str],
+        resource: str = "pods",
+        group: Optional[str] = None,
+    ):
+
+        body = V1SelfSubjectAccessReview(
+            spec=V1SelfSubjectAccessReviewSpec(
+                resource_attributes=V1ResourceAttributes(
+                    namespace=self._namespace,
+                    group=group,
+                    resource=resource,
+                    subresource=subresource,
+                    verb=verb,
+                )
+            )
+        )
+
+        res = await self._auth_v1.create_self_subject_access_review(body)
+        status: V1SubjectAccessReviewStatus = res.status
+        return status.allowed
+
+    async def _check_permissions(
+        self,
+        permissions: list,
+        resource: str,
+        group: Optional[str] = None,
+    ):
+
+        #
+        # Ask API server whether operations are allowed.
+        # Reviews are independent, so run them in parallel
+        #
+
+        results = await asyncio.gather(
+            *[
+                self._is_operation_allowed(verb, subresource, resource, group)
+                for verb, subresource in permissions
+            ]
+        )
+
+        denied = []
+        for (verb, subresource), allowed in zip(permissions, results):
+            if not allowed:
+                name = f"{resource}/{subresource}" if subresource else resource
+                denied.append(f"{verb} {name}")
+
+        if denied:
+            msg = "Operations are not permitted in namespace '%s': %s"
+            raise KubernetesInitError(msg % (self._namespace, denied))
+
+    @wrap_k8s_errors
+    async def _check_pod_permissions(self):
+        await self._check_permissions(POD_PERMISSIONS, "pods")
+
+    @wrap_k8s_errors
+    async def _check_lease_permissions(self):
+        await self._check_permissions(
+            LEASE_PERMISSIONS, "leases", group="coordination.k8s.io"
+        )
+
     def get_init_tasks(self):
+
+        if self._sharding_enabled:
+            yield "Lease permissions review", self._check_lease_permissions()
+
+        if self._check_mode == PodInitCheckMode.fast:
+            yield "Pod permissions review", self._check_pod_permissions()
+            return
+
         pod_name = "starter-test-" + str(randint(0, 100000000))
         yield "Pod create permission", self._check_pod_create_permission(pod_name)
         yield "Pod read permission", self._check_pod_read_permission(pod_name)
@@ -1,68 +1,72 @@
-import asyncio
-from collections import defaultdict
-from typing import List
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, List, Tuple
 
 from starter.app.kubernetes.client import KubernetesClient
-from starter.app.kubernetes.pods.registry import FuzzerPod
-from starter.app.kubernetes.pods.registry.pod_registry import FuzzerPodRegistry
+from starter.app.kubernetes.pods.registry.fair_share import Tenant
+from starter.app.kubernetes.pods.registry.pod_registry import (
+    FuzzerPod,
+    FuzzerPodRegistry,
+)
+from starter.app.util.datetime import date_now
 
 
-def _filter_suitable_pods(pods: List[FuzzerPod], pool_id: str):
-    def filter_func(pod: FuzzerPod):
-        return (
-            pod.pool_id == pool_id
-            and pod.agent_mode == "fuzzing"
-            and pod.phase == "Running"
-        )
-
-    return list(filter(filter_func, pods))
-
-
-def _select_suitable_pods_for_displacement(pods: List[FuzzerPod]):
-
-    instances = defaultdict(int)
-    for pod in pods:
-        instances[(pod.fuzzer_id, pod.fuzzer_rev)] += 1
-
-    def key(pod: FuzzerPod):
-        return instances[(pod.fuzzer_id, pod.fuzzer_rev)], pod.start_time
-
-    return sorted(pods, key=key)
-
-
-def select_pods_for_displacement(pods: List[FuzzerPod], pool_id: str):
+def select_pods_for_displacement(
+    pod_registry: FuzzerPodRegistry,
+    pool_id: str,
+    over_quota: Iterable[Tenant] = (),
+):
 
     """
-    Select a pod for displacement:
-        1. Filter pods which are
+    Select pods for displacement. Pods are taken from per-pool
+    displacement queue, which is updated incrementally by registry:
+        1. Queue contains pods which are
             - Are ready and running now
             - Running in pool with `pool_id`
             - Fuzzer mode is *fuzzing*
-        2. Calculate pod count for each <`fuzzer_id`, `fuzzer_rev`> pair
-        3. Sort filtered pods by:
-            - Pod count
+            - Not displaced yet
+        2. Pods of tenants in `over_quota` are yielded first,
+           the most loaded tenant first
+        3. Pods of each group are yielded in order of:
+            - Pod count of <`fuzzer_id`, `fuzzer_rev`> pair
             - Pod start date
-        4. Return first item of the sorted list
+        4. Caller takes only as many pods as it needs
     """
 
-    suitable_pods = _filter_suitable_pods(pods, pool_id)
-    return _select_suitable_pods_for_displacement(suitable_pods)
+    return pod_registry.displacement_candidates(pool_id, over_quota)
 
 
 async def _displace_pods(
-    pods: List[str],
+    pods: List[FuzzerPod],
     pod_regitry: FuzzerPodRegistry,
     k8s_client: KubernetesClient,
+    min_work_time: int,
 ):
-    async def displace_pod(pod_name: str):
-        pod_regitry.displace_pod(pod_name)
-        await k8s_client.displace_fuzzer_pod(pod_name)
+    #
+    # Pods which have been working long enough are deleted
+    # right away with a few bulk requests. The others are labeled
+    # and deleted by event handler after their min work time
+    #
+
+    deadline = date_now() - timedelta(seconds=min_work_time)
+    to_delete, to_label = [], []
 
-    tasks = []
     for pod in pods:
-        tasks.append(displace_pod(pod))
+        pod_regitry.displace_pod(pod.name)
+        if pod.start_time is not None and pod.start_time < deadline:
+            to_delete.append(pod.name)
+        else:
+            to_label.append(pod.name)
+
+    failed = []
+    if to_delete:
+        failed += await k8s_client.delete_fuzzer_pods_by_name(to_delete)
+    if to_label:
+        failed += await k8s_client.displace_fuzzer_pods(to_label)
 
-    await asyncio.gather(*tasks)
+    if failed:
+        msg = "Failed to displace %d of %d pods"
+        logging.getLogger("k8s.displacement").error(msg, len(failed), len(pods))
 
 
 async def try_displace_pods(
@@ -71,13 +75,14 @@ async def try_displace_pods(
     k8s_client: KubernetesClient,
     cpu_required: int,
     ram_required: int,
+    min_work_time: int,
+    over_quota: Iterable[Tenant] = (),
 ):
     pods_to_displace = []
-    pods = pod_regitry.list_pods()
     displacement_needed = False
 
-    for pod in select_pods_for_displacement(pods, pool_id):
-        pods_to_displace.append(pod.name)
+    for pod in select_pods_for_displacement(pod_regitry, pool_id, over_quota):
+        pods_to_displace.append(pod)
         cpu_required -= pod.cpu
         ram_required -= pod.ram
 
@@ -90,4 +95,49 @@ async def try_displace_pods(
             pods_to_displace,
             pod_regitry,
             k8s_client,
+            min_work_time,
+        )
+
+
+async def try_displace_pods_on_node(
+    pool_id: str,
+    pod_regitry: FuzzerPodRegistry,
+    k8s_client: KubernetesClient,
+    cpu_needed: int,
+    ram_needed: int,
+    nodes_free: Dict[str, Tuple[int, int]],
+    min_work_time: int,
+    over_quota: Iterable[Tenant] = (),
+):
+    #
+    # Candidates are grouped by node they are running on.
+    # Only pods of the first node, which can fit
+    # the requested resources, are displaced
+    #
+
+    node_pods: Dict[str, List[FuzzerPod]] = {}
+    node_free = {name: list(free) for name, free in nodes_free.items()}
+    pods_to_displace = None
+
+    for pod in select_pods_for_displacement(pod_regitry, pool_id, over_quota):
+
+        free = node_free.get(pod.node_name)
+        if free is None:
+            continue
+
+        pods = node_pods.setdefault(pod.node_name, [])
+        pods.append(pod)
+        free[0] += pod.cpu
+        free[1] += pod.ram
+
+        if free[0] >= cpu_needed and free[1] >= ram_needed:
+            pods_to_displace = pods
+            break
+
+    if pods_to_displace:
+        await _displace_pods(
+            pods_to_displace,
+            pod_regitry,
+            k8s_client,
+            min_work_time,
         )
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from contextlib import suppress
+from heapq import heappop, heappush
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from starter.app.metrics import pods_deleted_by_timer, pods_pending_deletion
+
+DeletePods = Callable[[List[str]], Awaitable[None]]
+
+
+class DelayedDeletionScheduler:
+
+    """
+    Deletes pods after delay. Timers are kept in one heap and
+    served by one task. Scheduling pod twice keeps the earliest
+    deadline. Deadlines are rounded up to tick, so deletions due
+    within one tick are issued in one batch, but never too early
+    """
+
+    _delete_pods: DeletePods
+    _logger: logging.Logger
+    _heap: List[Tuple[float, str]]
+    _deadlines: Dict[str, float]
+    _wakeup_event: asyncio.Event
+    _task: Optional[asyncio.Task]
+    _tick: float
+
+    def __init__(self, delete_pods: DeletePods, tick: float = 1.0):
+        self._logger = logging.getLogger("k8s.deletion")
+        self._delete_pods = delete_pods
+        self._wakeup_event = asyncio.Event()
+        self._deadlines = {}
+        self._heap = []
+        self._task = None
+        self._tick = tick
+
+    def _update_metrics(self):
+        pods_pending_deletion.set(len(self._deadlines))
+
+    def schedule(self, pod_name: str, delay: float) -> bool:
+
+        """
+        Schedules pod deletion after `delay` seconds.
+        Returns False if pod has been already scheduled earlier
+        """
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max(delay, 0)
+        deadline = max(math.ceil(deadline / self._tick) * self._tick, deadline)
+
+        current = self._deadlines.get(pod_name)
+        if current is not None and current <= deadline:
+            return False
+
+        # Entry with previous deadline becomes stale
+        self._deadlines[pod_name] = deadline
+        heappush(self._heap, (deadline, pod_name))
+        self._update_metrics()
+
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+
+        self._wakeup_event.set()
+        return True
+
+    def cancel(self, pod_name: str) -> bool:
+
+        """Cancels pod deletion. Returns False if it was not scheduled"""
+
+        if self._deadlines.pop(pod_name, None) is None:
+            return False
+
+        self._update_metrics()
+        return True
+
+    def is_scheduled(self, pod_name: str):
+        return pod_name in self._deadlines
+
+    @property
+    def pending_count(self):
+        return len(self._deadlines)
+
+    def _pop_due(self, now: float) -> List[str]:
+
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, pod_name = heappop(self._heap)
+            if self._deadlines.get(pod_name) == deadline:
+                del self._deadlines[pod_name]
+                due.append(pod_name)
+
+        return due
+
+    def _next_deadline(self) -> Optional[float]:
+
+        # Drop cancelled and rescheduled entries
+        while self._heap:
+            deadline, pod_name = self._heap[0]
+            if self._deadlines.get(pod_name) == deadline:
+                return deadline
+            heappop(self._heap)
+
+        return None
+
+    async def _run(self):
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+
+            self._wakeup_event.clear()
+            deadline = self._next_deadline()
+
+            if deadline is None:
+                await self._wakeup_event.wait()
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout > 0:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup_event.wait(), timeout)
+                continue
+
+            pod_names = self._pop_due(loop.time())
+            self._update_metrics()
+
+            if not pod_names:
+                continue
+
+            self._logger.debug("Deleting %d pods after delay", len(pod_names))
+            pods_deleted_by_timer.inc(len(pod_names))
+
+            try:
+                await self._delete_pods(pod_names)
+            except Exception:
+                self._logger.exception("Unhandled error in delayed deletion")
+
+    async def close(self):
+
+        """
+        Cancels all pending deletions. Displaced pods are
+        handled once on next start and scheduled again
+        """
+
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        self._deadlines.clear()
+        self._heap.clear()
+        self._update_metrics()
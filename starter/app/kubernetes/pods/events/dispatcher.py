@@ -0,0 +1,96 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict
+
+
+class KeyedEventDispatcher:
+
+    """
+    Runs event handlers concurrently, keeping events with the
+    same key (pod name) strictly ordered. Events with different keys
+    are handled in parallel, but not more than `max_concurrency` at once
+    """
+
+    _handler: Callable[[Any], Awaitable[None]]
+    _queues: Dict[str, Deque[Any]]
+    _workers: Dict[str, asyncio.Task]
+    _semaphore: asyncio.Semaphore
+    _pending: asyncio.Semaphore
+    _idle: asyncio.Event
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[None]],
+        max_concurrency: int,
+        max_pending: int,
+    ):
+        assert max_concurrency > 0, "max_concurrency must be greater than zero"
+        assert max_pending > 0, "max_pending must be greater than zero"
+
+        self._handler = handler
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending = asyncio.Semaphore(max_pending)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = {}
+        self._queues = {}
+
+    async def _worker(self, key: str):
+
+        queue = self._queues[key]
+
+        try:
+            while queue:
+                event = queue.popleft()
+                try:
+                    async with self._semaphore:
+                        await self._handler(event)
+                finally:
+                    self._pending.release()
+
+        finally:
+            del self._queues[key]
+            del self._workers[key]
+            if not self._workers:
+                self._idle.set()
+
+    async def dispatch(self, key: str, event: Any):
+
+        """
+        Enqueues event for handling. Waits if there
+        are too many events, which are not handled yet
+        """
+
+        await self._pending.acquire()
+
+        try:
+            queue = self._queues[key]
+        except KeyError:
+            queue = self._queues[key] = deque()
+
+        queue.append(event)
+
+        if key not in self._workers:
+            loop = asyncio.get_running_loop()
+            self._workers[key] = loop.create_task(self._worker(key))
+            self._idle.clear()
+
+    async def join(self):
+
+        """Waits until all enqueued events are handled"""
+
+        await self._idle.wait()
+
+    async def close(self):
+
+        """Cancels handling of all enqueued events"""
+
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    @property
+    def pending_count(self):
+        return sum(len(queue) for queue in self._queues.values())
@@ -4,20 +4,39 @@ import asyncio
 import logging
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, List, Optional, Set
 
 from kubernetes_asyncio.client import ApiException
 
 from starter.app.database.orm import ORMLaunch
+from starter.app.kubernetes.coordination import REPLICA_LABEL
 from starter.app.kubernetes.pods.registry.errors import PodNotFoundError
+from starter.app.kubernetes.pods.registry.instance import parse_k8s_pod
 from starter.app.kubernetes.pods.registry.pod_registry import (
     FuzzerPod,
     FuzzerPodRegistry,
 )
 from starter.app.kubernetes.pools.registry import PoolRegistry
+from starter.app.kubernetes.pools.registry.errors import (
+    PoolNodeNotFoundError,
+    PoolNoSuitableNodeError,
+    PoolNotFoundError,
+)
+from starter.app.log_store import ILogStore, LogStoreError
+from starter.app.log_store.abstract import day_prefix
+from starter.app.metrics import (
+    failed_pods_evicted,
+    failed_pods_oom_killed,
+    failed_pods_other,
+    failed_pods_timeout,
+    pod_terminate_to_notified,
+)
 from starter.app.settings import AppSettings, PodOutputSaveMode
+from starter.app.util.compression import LOGS_ENCODING_GZIP, compress_stream
 from starter.app.util.datetime import date_future, date_now, rfc3339
 
+from .deletion_scheduler import DelayedDeletionScheduler
+
 if TYPE_CHECKING:
 
     from mqtransport import MQApp
@@ -29,11 +48,12 @@ if TYPE_CHECKING:
     from kubernetes_asyncio.client.models.v1_container_state_terminated import V1ContainerStateTerminated
     from kubernetes_asyncio.client.models.v1_container_status import V1ContainerStatus
     from kubernetes_asyncio.client.models.v1_object_meta import V1ObjectMeta
+    from kubernetes_asyncio.client.models.v1_pod_spec import V1PodSpec
     from kubernetes_asyncio.client.models.v1_pod_status import V1PodStatus
     # isort: on
     # fmt: on
 
-    from starter.app.database.abstract import IDatabase
+    from starter.app.database.launch_buffer import LaunchSaveBuffer
     from starter.app.kubernetes.client import KubernetesClient
     from starter.app.message_queue import MQAppState
 
@@ -50,6 +70,34 @@ class NotTerminatedError(Exception):
     pass
 
 
+FAILURE_COUNTERS = {
+    "OOMKilled": failed_pods_oom_killed,
+    "Evicted": failed_pods_evicted,
+    "DeadlineExceeded": failed_pods_timeout,
+}
+
+
+def pod_failure_reason(pod: V1Pod) -> Optional[str]:
+
+    """
+    Returns known reason of pod failure or None. Eviction and
+    deadline are reported for pod, OOM kill - for container
+    """
+
+    status: V1PodStatus = pod.status
+    if status.reason in FAILURE_COUNTERS:
+        return status.reason
+
+    statuses: List[V1ContainerStatus] = status.container_statuses or []
+    for container_status in statuses:
+        state: V1ContainerState = container_status.state
+        terminated = state.terminated if state else None
+        if terminated and terminated.reason in FAILURE_COUNTERS:
+            return terminated.reason
+
+    return None
+
+
 class FuzzerPodStateChecker:
 
     _agent_state: V1ContainerState
@@ -101,15 +149,18 @@ class FuzzerPodStateChecker:
 class PodEventHandler:
 
     _mq: MQApp
-    _db: IDatabase
+    _launch_buffer: LaunchSaveBuffer
+    _log_store: ILogStore
     _k8s: KubernetesClient
+    _deletion_scheduler: DelayedDeletionScheduler
     _output_save_mode: PodOutputSaveMode
     _saved_info_exp_seconds: int
 
     def __init__(
         self,
         mq_app: MQApp,
-        db: IDatabase,
+        launch_buffer: LaunchSaveBuffer,
+        log_store: ILogStore,
         pool_registry: PoolRegistry,
         pod_registry: FuzzerPodRegistry,
         k8s_client: KubernetesClient,
@@ -119,18 +170,50 @@ class PodEventHandler:
         self._output_save_mode = settings.fuzzer_pod.output_save_mode
         self._saved_info_exp_seconds = settings.fuzzer_pod.launch_info_retention_period
         self._pod_min_work_time = settings.fuzzer_pod.min_work_time
+        self._log_tail_lines = settings.fuzzer_pod.log_tail_lines
+        self._log_limit_bytes = settings.fuzzer_pod.log_limit_bytes
+        self._replica_id = settings.sharding.replica_id
         self._pool_registry = pool_registry
         self._pod_registry = pod_registry
         self._k8s = k8s_client
+        self._launch_buffer = launch_buffer
+        self._log_store = log_store
         self._mq = mq_app
-        self._db = db
 
-    async def _read_log(self, pod_name: str, container_name: str):
+        self._deletion_scheduler = DelayedDeletionScheduler(
+            self._delete_pods_safe,
+        )
 
-        logs = None
+    async def close(self):
+        await self._deletion_scheduler.close()
+
+    async def _save_log(self, pod: FuzzerPod, container_name: str):
+
+        #
+        # Logs are compressed and streamed to log store
+        # chunk by chunk. Only the tail of log is read
+        #
+
+        pod_name = pod.name
+        key = "{}/{}/{}/{}.log.gz".format(
+            day_prefix(date_now()), pod.fuzzer_id, pod_name, container_name
+        )
+
+        chunks = self._k8s.stream_pod_log(
+            pod_name,
+            container_name,
+            tail_lines=self._log_tail_lines,
+            limit_bytes=self._log_limit_bytes,
+        )
+
+        logs_ref = None
 
         try:
-            logs = await self._k8s.read_pod_log(pod_name, container_name)
+            logs_ref = await self._log_store.save(key, compress_stream(chunks))
+
+        except LogStoreError as e:
+            msg = "Failed to save logs of <pod='%s', container='%s'. Reason - %s"
+            self._logger.error(msg, pod_name, container_name, e)
 
         except ApiException as e:
             if e.status == 400:
@@ -143,14 +226,18 @@ class PodEventHandler:
                 msg = "Failed to retrieve logs of <pod='%s', container='%s'. Reason - %s"  # fmt: skip
                 self._logger.error(msg, pod_name, container_name, e)
 
-        return logs
+        return logs_ref
 
     async def _notify_fuzzer_pod_finished(self, pod: FuzzerPod, success: bool):
 
+        #
+        # Notifications are grouped and sent in batches.
+        # Order of notifications is preserved
+        #
+
         state: MQAppState = self._mq.state
-        producer = state.producers.sch_pod_finished
 
-        await producer.produce(
+        await state.pod_finished.produce(
             # Suitcase
             user_id=pod.user_id,
             project_id=pod.project_id,
@@ -178,7 +265,7 @@ class PodEventHandler:
         exp_seconds = self._saved_info_exp_seconds
         exp_date = date_future(term_info.start_time, exp_seconds)
 
-        await self._db.launches.save(
+        await self._launch_buffer.save(
             ORMLaunch(
                 # Suitcase
                 fuzzer_id=pod.fuzzer_id,
@@ -193,17 +280,110 @@ class PodEventHandler:
                 start_time=rfc3339(term_info.start_time),
                 finish_time=rfc3339(term_info.finish_time),
                 exit_reason=term_info.reason,
-                agent_logs=pod.agent_logs,
-                sandbox_logs=pod.sandbox_logs,
+                agent_logs_ref=pod.agent_logs_ref,
+                sandbox_logs_ref=pod.sandbox_logs_ref,
+                logs_encoding=LOGS_ENCODING_GZIP,
                 exp_date=rfc3339(exp_date),
+                expire_at=int(exp_date.timestamp()),
             )
         )
 
     def _remove_pod_from_registry_and_free_resources(self, pod: FuzzerPod):
-        self._pool_registry.free_resources(pod.pool_id, pod.cpu, pod.ram)
+        self._pool_registry.free_resources(
+            pod.pool_id, pod.cpu, pod.ram, pod.node_name  # fmt: skip
+        )
         self._pod_registry.remove_pod(pod.name)
+        self._deletion_scheduler.cancel(pod.name)
+
+    def _can_adopt(self, v1_meta: V1ObjectMeta):
+        # Pods created here are added to registry by their launch
+        labels = v1_meta.labels or {}
+        created_here = labels.get(REPLICA_LABEL) == self._replica_id
+        return not created_here and v1_meta.deletion_timestamp is None
+
+    def _adopt_pod(self, v1_pod: V1Pod) -> Optional[FuzzerPod]:
+
+        #
+        # Pod has been created by other replica, e.g. before
+        # its pool moved here. Pod and its resources are taken over
+        #
+
+        try:
+            pod = parse_k8s_pod(v1_pod)
+        except RuntimeError:
+            self._logger.exception("Failed to adopt pod")
+            return None
+
+        if not self._pool_registry.has_pool(pod.pool_id):
+            return None
+
+        try:
+            self._pool_registry.allocate_node_resources(
+                pod.pool_id, pod.node_name, pod.cpu, pod.ram
+            )
+        except PoolNodeNotFoundError:
+            pod.node_name = None
+            self._pool_registry.allocate_node_resources(
+                pod.pool_id, pod.node_name, pod.cpu, pod.ram
+            )
+
+        self._pod_registry.add_pod(pod)
+
+        msg = "Fuzzer %s is adopted (created by other replica)"
+        self._logger.info(msg, self._pod_info_str(pod))
+
+        return pod
+
+    def _forget_pod(self, pod: FuzzerPod):
+
+        #
+        # Pool of pod is owned by other replica now, which
+        # handles the pod. Nothing is saved and notified here
+        #
+
+        self._remove_pod_from_registry_and_free_resources(pod)
+
+        msg = "Fuzzer %s is forgotten (pool is owned by other replica)"
+        self._logger.info(msg, self._pod_info_str(pod))
+
+    def _move_pod_resources(self, pod: FuzzerPod, node_name: str):
+
+        #
+        # Pods are pinned to node chosen by pool, but pods which
+        # were not accounted on any node may be placed anywhere.
+        # If node has no room, usage is corrected by reconciliation
+        #
+
+        try:
+            self._pool_registry.move_resources(
+                pod.pool_id, pod.cpu, pod.ram, pod.node_name, node_name
+            )
+        except (
+            PoolNotFoundError,
+            PoolNodeNotFoundError,
+            PoolNoSuitableNodeError,
+        ) as e:
+            msg = "Failed to move resources of fuzzer %s. Reason - %s"
+            self._logger.warning(msg, self._pod_info_str(pod), str(e))
+            return
+
+        pod.node_name = node_name
+
+    @staticmethod
+    def _count_pod_failure(pod: FuzzerPod, v1_pod: Optional[V1Pod]):
+        reason = pod_failure_reason(v1_pod) if v1_pod else None
+        counter = FAILURE_COUNTERS.get(reason, failed_pods_other)
+        counter.labels(pod.pool_id).inc()
+
+    async def _handle_fuzzer_pod_deletion(
+        self,
+        pod: FuzzerPod,
+        success: bool,
+        v1_pod: Optional[V1Pod] = None,
+    ):
+        if not success:
+            self._count_pod_failure(pod, v1_pod)
 
-    async def _handle_fuzzer_pod_deletion(self, pod: FuzzerPod, success: bool):
         self._remove_pod_from_registry_and_free_resources(pod)
         await self._notify_fuzzer_pod_finished(pod, success)
 
@@ -214,6 +394,15 @@ class PodEventHandler:
             msg = "Failed to delete pod '%s'. Reason - %s"
             self._logger.error(msg, pod_name, str(e))
 
+    async def _delete_pods_safe(self, pod_names: List[str]):
+
+        # Due pods are deleted with one request per chunk of names
+        failed = await self._k8s.delete_fuzzer_pods_by_name(pod_names)
+
+        if failed:
+            msg = "Failed to delete %d of %d pods after delay"
+            self._logger.error(msg, len(failed), len(pod_names))
+
     @staticmethod
     def _pod_info_str(pod: FuzzerPod):
         return "<id='%s', rev='%s', mode='%s', pod='%s'>" % (
@@ -236,57 +425,107 @@ class PodEventHandler:
             return
 
         # Candidate hasn't been working long enough -> can be deleted only after delay
-        async def delete_pod_after_delay(delay_seconds: int):
-            await asyncio.sleep(delay_seconds)
-            await self._delete_pod_safe(pod.name)
-
         # XXX: Sometimes pod.start_date can be greater than date_now()
         # So, delay can be longer than expected. This is not a bug
         delay = min_work_time - (now - pod.start_time)
 
-        msg = "Fuzzer %s will be deleted after %s seconds"
-        self._logger.debug(msg, self._pod_info_str(pod), delay.seconds)
-
-        loop = asyncio.get_running_loop()
-        loop.create_task(delete_pod_after_delay(delay.seconds))
+        # Repeated events of the same pod do not create new timers
+        if self._deletion_scheduler.schedule(pod.name, delay.total_seconds()):
+            msg = "Fuzzer %s will be deleted after %s seconds"
+            self._logger.debug(msg, self._pod_info_str(pod), delay.seconds)
 
     async def _save_pod_logs(self, pod: FuzzerPod):
 
         if pod.logs_saved:
             return
 
-        agent_logs, sandbox_logs = await asyncio.gather(
-            self._read_log(pod.name, "agent"),
-            self._read_log(pod.name, "sandbox"),
+        agent_logs_ref, sandbox_logs_ref = await asyncio.gather(
+            self._save_log(pod, "agent"),
+            self._save_log(pod, "sandbox"),
         )
 
-        pod.agent_logs = agent_logs
-        pod.sandbox_logs = sandbox_logs
+        pod.agent_logs_ref = agent_logs_ref
+        pod.sandbox_logs_ref = sandbox_logs_ref
         pod.logs_saved = True
 
+    def known_pods(self) -> Set[str]:
+        return {pod.name for pod in self._pod_registry.list_pods()}
+
+    async def handle_relist(self, known_pods: Set[str], v1_pods: List[V1Pod]):
+
+        """
+        Refreshes state of pods in registry using result of pod listing.
+        Pods in `known_pods` which are missing in the list are treated as lost,
+        unless their pools are owned by other replica. Listed pods created
+        by other replicas are adopted
+        """
+
+        listed_pods = set()
+        for v1_pod in v1_pods:
+
+            v1_meta: V1ObjectMeta = v1_pod.metadata
+            if not self._pod_registry.has_pod(v1_meta.name):
+                if not self._can_adopt(v1_meta) or not self._adopt_pod(v1_pod):
+                    continue
+
+            listed_pods.add(v1_meta.name)
+            await self.handle("MODIFIED", v1_pod)
+
+        for pod_name in known_pods - listed_pods:
+
+            try:
+                pod = self._pod_registry.find_pod(pod_name)
+            except PodNotFoundError:
+                continue
+
+            if not self._k8s.pod_informer.covers(pod.pool_id):
+                self._forget_pod(pod)
+                continue
+
+            msg = "Fuzzer %s is lost (missing in pod list)"
+            self._logger.info(msg, self._pod_info_str(pod))
+            await self._handle_fuzzer_pod_deletion(pod, success=False)
+
     async def handle(self, event_type: str, v1_pod: V1Pod):
 
         #
         # Find pod in registry and refresh its state
-        # If pod is not in registry, ignore this pod event
+        # If pod is not in registry, ignore this pod event,
+        # unless pod has been created by other replica
         #
 
         v1_status: V1PodStatus = v1_pod.status
         v1_meta: V1ObjectMeta = v1_pod.metadata
+        v1_spec: V1PodSpec = v1_pod.spec
         pod_name: str = v1_meta.name
 
         try:
             pod = self._pod_registry.find_pod(pod_name)
         except PodNotFoundError:
-            return
+            if event_type == "DELETED" or not self._can_adopt(v1_meta):
+                return
+
+            # Event object may be slim, pod is read in full to be parsed
+            v1_pod = await self._k8s.read_fuzzer_pod(pod_name)
+            pod = self._adopt_pod(v1_pod) if v1_pod else None
+            if pod is None:
+                return
+
+            v1_status = v1_pod.status
+            v1_meta = v1_pod.metadata
+            v1_spec = v1_pod.spec
+
+        if v1_spec.node_name and v1_spec.node_name != pod.node_name:
+            self._move_pod_resources(pod, v1_spec.node_name)
 
         if pod.start_time is None:
             if v1_status.start_time is not None:
                 msg = "Fuzzer %s is now running"
                 self._logger.info(msg, self._pod_info_str(pod))
-                pod.start_time = v1_status.start_time
+                start_time = v1_status.start_time
+                self._pod_registry.update_pod_start_time(pod.name, start_time)
 
-        pod.phase = v1_status.phase
+        self._pod_registry.update_pod_phase(pod.name, v1_status.phase)
 
         #
         # Handle case when pod is being deleted (e.g. 'kubectl delete pod' command)
@@ -299,6 +538,7 @@ class PodEventHandler:
             msg = "Fuzzer %s is terminating (graceful shutdown)"
             self._logger.info(msg, self._pod_info_str(pod))
             await self._save_pod_logs(pod)
+            self._deletion_scheduler.cancel(pod.name)
             pod.deleting = True
 
         #
@@ -319,13 +559,13 @@ class PodEventHandler:
         if event_type == "DELETED" and pod.phase == "Pending":
             msg = "Fuzzer %s could not start and is now deleted"
             self._logger.info(msg, self._pod_info_str(pod))
-            await self._handle_fuzzer_pod_deletion(pod, success=False)
+            await self._handle_fuzzer_pod_deletion(pod, False, v1_pod)
             return
 
         if event_type == "DELETED" and pod.phase == "Running":
             msg = "Fuzzer %s is lost (k8s node is no more available)"
             self._logger.info(msg, self._pod_info_str(pod))
-            await self._handle_fuzzer_pod_deletion(pod, success=False)
+            await self._handle_fuzzer_pod_deletion(pod, False, v1_pod)
             return
 
         if pod.phase in ["Pending", "Unknown"]:
@@ -346,7 +586,15 @@ class PodEventHandler:
                 self._logger.info(msg, self._pod_info_str(pod))
 
                 term_info = checker.agent_termination_info()
-                await self._handle_fuzzer_pod_deletion(pod, term_info.exit_code == 0)
+                success = term_info.exit_code == 0
+                await self._handle_fuzzer_pod_deletion(pod, success, v1_pod)
+
+                if term_info.finish_time is not None:
+                    elapsed = date_now() - term_info.finish_time
+                    pod_terminate_to_notified.labels(pod.pool_id).observe(
+                        elapsed.total_seconds()
+                    )
+
                 await self._save_pod_launch_to_db(pod, term_info)
 
                 msg = "Fuzzer %s deleted. Handling... OK"
@@ -356,12 +604,12 @@ class PodEventHandler:
                 reason = "Agent container is not terminated"
                 msg = "Fuzzer %s deleted. Handling... Failed. Reason - %s"
                 self._logger.error(msg, self._pod_info_str(pod), reason)
-                await self._handle_fuzzer_pod_deletion(pod, success=False)
+                await self._handle_fuzzer_pod_deletion(pod, False, v1_pod)
 
             except Exception as e:
                 msg = "Fuzzer %s deleted. Handling... Failed. Reason - %s"
                 self._logger.error(msg, self._pod_info_str(pod), str(e))
-                await self._handle_fuzzer_pod_deletion(pod, success=False)
+                await self._handle_fuzzer_pod_deletion(pod, False, v1_pod)
 
             return
 
@@ -2,17 +2,31 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from contextlib import AsyncExitStack, asynccontextmanager
-from typing import Optional
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
+from typing import TYPE_CHECKING, List, Optional
 
 from kubernetes_asyncio import watch
-from kubernetes_asyncio.client import ApiClient
+from kubernetes_asyncio.client import ApiClient, ApiException
 from kubernetes_asyncio.client.api.core_v1_api import CoreV1Api
 
-from starter.app.settings import AppSettings
+from starter.app.metrics import k8s_listener_errors, pod_event_errors
+from starter.app.settings import AppSettings, PodWatchParseMode
 from starter.app.util.delay import delay
 
+from .dispatcher import KeyedEventDispatcher
 from .event_handler import PodEventHandler
+from .slim_watch import SlimPodWatch
+
+if TYPE_CHECKING:
+    from kubernetes_asyncio.client import V1Pod
+
+    from starter.app.kubernetes.coordination import ShardSet
+    from starter.app.kubernetes.informer import PodInformer
+
+
+class WatchExpiredError(Exception):
+
+    """Raised when resource version of watch is too old (410 Gone)"""
 
 
 class PodEventListener:
@@ -20,10 +34,15 @@ class PodEventListener:
     _v1: CoreV1Api
     _client: ApiClient
     _handler: PodEventHandler
+    _informer: PodInformer
+    _dispatcher: KeyedEventDispatcher
     _exit_stack: Optional[AsyncExitStack]
     _lock: asyncio.Lock
     _task: asyncio.Task
+    _snapshot_handled: bool
     _namespace: str
+    _shutdown_timeout: int
+    _parse_mode: PodWatchParseMode
 
     @staticmethod
     async def _create_client():
@@ -34,15 +53,31 @@ class PodEventListener:
 
         return exit_stack, client, v1
 
-    async def _init(self, handler: PodEventHandler, settings: AppSettings):
+    async def _init(
+        self,
+        handler: PodEventHandler,
+        informer: PodInformer,
+        settings: AppSettings,
+    ):
 
         self._task = None
         self._is_closed = True
+        self._snapshot_handled = False
         self._exit_stack = None
         self._lock = asyncio.Lock()
         self._logger = logging.getLogger("k8s.listener")
         self._namespace = settings.fuzzer_pod.namespace
+        self._parse_mode = settings.fuzzer_pod.watch_parse_mode
+        self._shutdown_timeout = settings.environment.shutdown_timeout
         self._handler = handler
+        self._informer = informer
+
+        concurrency = settings.fuzzer_pod.event_concurrency
+        self._dispatcher = KeyedEventDispatcher(
+            handler=self._event_handler,
+            max_concurrency=concurrency,
+            max_pending=concurrency * 32,
+        )
 
         exit_stack, client, v1 = await self._create_client()
         self._is_closed = False
@@ -54,10 +89,11 @@ class PodEventListener:
     @staticmethod
     async def create(
         handler: PodEventHandler,
+        informer: PodInformer,
         settings: AppSettings,
     ):
         _self = PodEventListener()
-        await _self._init(handler, settings)
+        await _self._init(handler, informer, settings)
         return _self
 
     async def _event_handler(self, event: dict):
@@ -66,20 +102,118 @@ class PodEventListener:
         except Exception:
             msg = "Unhandled error in k8s event handler"
             self._logger.exception(msg)
+            pod_event_errors.inc()
             await delay()
 
+    async def relist(self) -> List[V1Pod]:
+
+        """
+        Lists pods and refreshes state of pods known to registry.
+        Listener must be paused, so no events are handled meanwhile
+        """
+
+        await self._dispatcher.join()
+        known_pods = self._handler.known_pods()
+        pods = await self._informer.sync()
+
+        try:
+            await self._handler.handle_relist(known_pods, pods)
+        except Exception:
+            self._logger.exception("Unhandled error in k8s relist handler")
+            pod_event_errors.inc()
+
+        self._snapshot_handled = True
+        return pods
+
+    async def _handle_snapshot(self):
+
+        #
+        # Registry is loaded from the same snapshot as cache, so pods
+        # are not listed again on start. But pods could finish or be
+        # displaced while service was down. Their state is handled once
+        #
+
+        async with self._lock:
+            known_pods = self._handler.known_pods()
+            pods = self._informer.list_pods()
+
+            try:
+                await self._handler.handle_relist(known_pods, pods)
+            except Exception:
+                self._logger.exception("Unhandled error in k8s relist handler")
+                pod_event_errors.inc()
+
+        self._snapshot_handled = True
+
+    async def _relist(self):
+
+        #
+        # Called when watch has expired or cache has not been synced.
+        # Only pods which are known to registry are handled
+        #
+
+        self._logger.info("Listing pods to resume watch...")
+
+        async with self._lock:
+            await self.relist()
+
+        msg = "Listing pods to resume watch... OK. Resource version: %s"
+        self._logger.info(msg, self._informer.resource_version)
+
+    def _create_watch(self):
+        if self._parse_mode == PodWatchParseMode.slim:
+            return SlimPodWatch()
+        return watch.Watch()
+
     async def _event_watch(self):
 
+        #
+        # Only fuzzer pods of owned shards are watched. Other
+        # pods of namespace are filtered out on API server side
+        #
+
         kwargs = {
             "namespace": self._namespace,
+            "label_selector": self._informer.label_selector,
             "timeout_seconds": 300,
+            "allow_watch_bookmarks": True,
+            "resource_version": self._informer.resource_version,
         }
 
-        w = watch.Watch()
+        w = self._create_watch()
         async with w.stream(self._v1.list_namespaced_pod, **kwargs) as stream:
             async for event in stream:
+
+                event_type = event["type"]
+                raw_object: dict = event["raw_object"]
+
+                if event_type == "ERROR":
+                    if raw_object.get("code") == 410:
+                        raise WatchExpiredError(raw_object.get("message"))
+
+                    msg = "Watch error event received: %s"
+                    self._logger.error(msg, raw_object.get("message"))
+                    return
+
+                #
+                # Events of the same pod are handled one by one,
+                # events of different pods are handled concurrently
+                #
+
+                # Resume watch from this point on reconnect
+                metadata: dict = raw_object["metadata"]
+                if event_type == "BOOKMARK":
+                    self._informer.set_resource_version(metadata["resourceVersion"])
+                    continue
+
+                #
+                # Cache is updated before handling, so handlers
+                # and API calls see the state of this event
+                #
+
                 async with self._lock:
-                    await self._event_handler(event)
+                    self._informer.apply(event_type, event["object"])
+                    await self._dispatcher.dispatch(metadata["name"], event)
 
     async def _event_loop(self):
 
@@ -87,13 +221,31 @@ class PodEventListener:
 
         while True:
             try:
+                if not self._informer.has_synced:
+                    await self._relist()
+                elif not self._snapshot_handled:
+                    await self._handle_snapshot()
+
                 await self._event_watch()
             except asyncio.CancelledError:
                 break
             except asyncio.TimeoutError:
                 continue
+            except WatchExpiredError:
+                self._logger.info("Watch has expired. Relisting pods")
+                self._informer.invalidate()
+            except ApiException as e:
+                if e.status == 410:
+                    self._logger.info("Watch has expired. Relisting pods")
+                    self._informer.invalidate()
+                    continue
+
+                self._logger.exception("Unhandled error in k8s event listener")
+                k8s_listener_errors.inc()
+                await delay()
             except Exception:
                 self._logger.exception("Unhandled error in k8s event listener")
+                k8s_listener_errors.inc()
                 await delay()
 
     async def start(self):
@@ -111,10 +263,56 @@ class PodEventListener:
             self._task.cancel()
             self._task = None
 
+        #
+        # Let handlers finish their work (save launches, notify scheduler)
+        # Cancel the rest of them if they didn't manage to do it in time
+        #
+
+        with suppress(asyncio.TimeoutError):
+            timeout = self._shutdown_timeout
+            await asyncio.wait_for(self._dispatcher.join(), timeout)
+
+        await self._dispatcher.close()
+
+    async def reshard(self, shards: ShardSet):
+
+        """
+        Switches listener to pods of given shards. Pods of pools
+        which are not owned anymore are forgotten, pods of new
+        pools are taken over. Watch is resumed with new selector
+        """
+
+        async with self.pause():
+
+            if self._task is not None:
+                self._task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await self._task
+
+            # On failure pods are relisted by event loop
+            self._informer.set_shards(shards)
+
+            try:
+                await self.relist()
+            finally:
+                if self._task is not None:
+                    loop = asyncio.get_running_loop()
+                    self._task = loop.create_task(self._event_loop())
+
+        msg = "Listener switched to %d shards. Resource version: %s"
+        self._logger.info(msg, len(shards.owned), self._informer.resource_version)
+
     @asynccontextmanager
     async def pause(self):
+
+        """
+        Stops dispatching of new events and waits until all
+        dispatched events are handled. Registry is consistent then
+        """
+
         try:
             await self._lock.acquire()
+            await self._dispatcher.join()
             yield
         finally:
             self._lock.release()
@@ -126,6 +324,8 @@ class PodEventListener:
         if self._task:
             await self.stop()
 
+        await self._handler.close()
+
         if self._exit_stack:
             await self._exit_stack.aclose()
             self._exit_stack = None
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from kubernetes_asyncio import watch
+
+from starter.app.util.datetime import from_rfc3339
+from starter.app.util.speedup.json import loads
+
+#
+# Slim pod model keeps only fields used by event handler and informer.
+# Attribute names repeat ones of V1Pod, so both can be handled the same way
+#
+
+
+@dataclass
+class SlimContainerStateTerminated:
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    exit_code: int
+    reason: Optional[str]
+
+
+@dataclass
+class SlimContainerState:
+    terminated: Optional[SlimContainerStateTerminated]
+
+
+@dataclass
+class SlimContainerStatus:
+    name: str
+    state: SlimContainerState
+
+
+@dataclass
+class SlimPodMeta:
+    name: str
+    resource_version: Optional[str]
+    deletion_timestamp: Optional[datetime]
+    labels: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class SlimPodSpec:
+    node_name: Optional[str]
+
+
+@dataclass
+class SlimPodStatus:
+    phase: Optional[str]
+    reason: Optional[str]
+    start_time: Optional[datetime]
+    container_statuses: List[SlimContainerStatus]
+
+
+@dataclass
+class SlimPod:
+    metadata: SlimPodMeta
+    spec: SlimPodSpec
+    status: SlimPodStatus
+
+
+def _parse_time(value: Optional[str]):
+    return from_rfc3339(value) if value else None
+
+
+def _parse_container_status(raw: dict):
+
+    terminated = None
+    raw_terminated = (raw.get("state") or {}).get("terminated")
+
+    if raw_terminated is not None:
+        terminated = SlimContainerStateTerminated(
+            started_at=_parse_time(raw_terminated.get("startedAt")),
+            finished_at=_parse_time(raw_terminated.get("finishedAt")),
+            exit_code=raw_terminated.get("exitCode"),
+            reason=raw_terminated.get("reason"),
+        )
+
+    return SlimContainerStatus(
+        name=raw["name"],
+        state=SlimContainerState(terminated),
+    )
+
+
+def parse_slim_pod(raw: dict) -> SlimPod:
+
+    """Builds slim pod from raw pod object of watch event"""
+
+    meta: dict = raw["metadata"]
+    spec: dict = raw.get("spec") or {}
+    status: dict = raw.get("status") or {}
+    statuses: list = status.get("containerStatuses") or []
+
+    return SlimPod(
+        metadata=SlimPodMeta(
+            name=meta["name"],
+            resource_version=meta.get("resourceVersion"),
+            deletion_timestamp=_parse_time(meta.get("deletionTimestamp")),
+            labels=meta.get("labels") or {},
+        ),
+        spec=SlimPodSpec(
+            node_name=spec.get("nodeName"),
+        ),
+        status=SlimPodStatus(
+            phase=status.get("phase"),
+            reason=status.get("reason"),
+            start_time=_parse_time(status.get("startTime")),
+            container_statuses=[_parse_container_status(s) for s in statuses],
+        ),
+    )
+
+
+class SlimPodWatch(watch.Watch):
+
+    """
+    Pod watch which skips deserialization into V1Pod models.
+    Events are decoded with fast JSON loader and 'object'
+    of each event is a slim pod holding only needed fields
+    """
+
+    def __init__(self):
+        # API client of base class is used only for deserialization
+        self._raw_return_type = None
+        self._api_client = None
+        self.resource_version = None
+        self._stop = False
+        self.resp = None
+
+    async def close(self):
+        if self.resp is not None:
+            self.resp.release()
+            self.resp = None
+
+    def unmarshal_event(self, data: str, response_type):
+
+        try:
+            event = loads(data)
+        except ValueError:
+            return data
+
+        if "object" not in event or "type" not in event:
+            msg = "Malformed watch event: 'object' and/or 'type' field is missing"
+            raise Exception(msg)
+
+        raw_object = event["object"]
+        event["raw_object"] = raw_object
+
+        if event["type"] in ("ERROR", "BOOKMARK"):
+            return event
+
+        pod = parse_slim_pod(raw_object)
+        self.resource_version = pod.metadata.resource_version
+        event["object"] = pod
+
+        return event
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from heapq import heapify, heappop, heappush
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Tuple
+
+if TYPE_CHECKING:
+    from .pod_registry import FuzzerPod
+
+FuzzerKey = Tuple[str, str]
+PodKey = Tuple[Any, ...]
+
+
+def _pod_key(pod: FuzzerPod) -> PodKey:
+    # Pods without start time go last
+    return pod.start_time is None, pod.start_time or 0, pod.name
+
+
+class DisplacementQueue:
+
+    """
+    Candidates for displacement in one pool. Pods are ordered by:
+        - Instance count of <`fuzzer_id`, `fuzzer_rev`> pair
+        - Pod start date
+
+    Pods of each fuzzer are kept sorted by start date, so iteration
+    merges these lists lazily and costs O(F + K*log(F)) for the first K pods,
+    where F is count of fuzzers in pool
+    """
+
+    _fuzzers: Dict[FuzzerKey, List[PodKey]]
+    _pods: Dict[str, FuzzerPod]
+
+    def __init__(self):
+        self._fuzzers = {}
+        self._pods = {}
+
+    def add(self, pod: FuzzerPod):
+
+        assert pod.name not in self._pods, "Pod already added"
+
+        key = pod.fuzzer_id, pod.fuzzer_rev
+        pod_keys = self._fuzzers.get(key)
+
+        if pod_keys is None:
+            pod_keys = self._fuzzers[key] = []
+
+        insort(pod_keys, _pod_key(pod))
+        self._pods[pod.name] = pod
+
+    def remove(self, pod: FuzzerPod):
+
+        del self._pods[pod.name]
+
+        key = pod.fuzzer_id, pod.fuzzer_rev
+        pod_keys = self._fuzzers[key]
+
+        pod_key = _pod_key(pod)
+        pod_keys.pop(bisect_left(pod_keys, pod_key))
+
+        if not pod_keys:
+            del self._fuzzers[key]
+
+    def count_instances(self, fuzzer_id: str, fuzzer_rev: str):
+        return len(self._fuzzers.get((fuzzer_id, fuzzer_rev), ()))
+
+    def order_key(self, pod: FuzzerPod):
+        """Key of pod in iteration order. Used to merge queues"""
+        return self.count_instances(pod.fuzzer_id, pod.fuzzer_rev), _pod_key(pod)
+
+    def __iter__(self) -> Iterator[FuzzerPod]:
+
+        #
+        # Heap item: (instance count, pod key, fuzzer, position)
+        # Registry must not be modified during iteration
+        #
+
+        heap = []
+        for fuzzer, pod_keys in self._fuzzers.items():
+            heap.append((len(pod_keys), pod_keys[0], fuzzer, 0))
+
+        heapify(heap)
+
+        while heap:
+            count, pod_key, fuzzer, pos = heappop(heap)
+            yield self._pods[pod_key[-1]]
+
+            pod_keys = self._fuzzers[fuzzer]
+            if pos + 1 < len(pod_keys):
+                heappush(heap, (count, pod_keys[pos + 1], fuzzer, pos + 1))
+
+    def __contains__(self, pod_name: str):
+        return pod_name in self._pods
+
+    def __len__(self):
+        return len(self._pods)
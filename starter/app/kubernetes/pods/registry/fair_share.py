@@ -0,0 +1,110 @@
+from typing import Dict, List, Optional, Tuple
+
+# Tenant is a project of user: <user_id, project_id>
+Tenant = Tuple[str, str]
+
+
+class TenantUsage:
+
+    """
+    Resources used by tenants in each pool. Tenants active in pool
+    divide its capacity in proportion to their weights. Weight is
+    looked up by project id, then by user id, and is 1 by default.
+    Share of tenant is its dominant (cpu or ram) usage relative to
+    the part of pool it's entitled to. Share above 1 is over quota
+    """
+
+    _pools: Dict[str, Dict[Tenant, List[int]]]
+    _weights: Dict[str, float]
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        self._weights = dict(weights or {})
+        self._pools = {}
+
+    def weight(self, tenant: Tenant) -> float:
+        user_id, project_id = tenant
+        return self._weights.get(project_id, self._weights.get(user_id, 1.0))
+
+    def add(self, pool_id: str, tenant: Tenant, cpu: int, ram: int):
+        tenants = self._pools.setdefault(pool_id, {})
+        usage = tenants.setdefault(tenant, [0, 0])
+        usage[0] += cpu
+        usage[1] += ram
+
+    def remove(self, pool_id: str, tenant: Tenant, cpu: int, ram: int):
+
+        tenants = self._pools[pool_id]
+        usage = tenants[tenant]
+        usage[0] -= cpu
+        usage[1] -= ram
+
+        if usage[0] <= 0 and usage[1] <= 0:
+            del tenants[tenant]
+
+        if not tenants:
+            del self._pools[pool_id]
+
+    def usage(self, pool_id: str, tenant: Tenant) -> Tuple[int, int]:
+        cpu, ram = self._pools.get(pool_id, {}).get(tenant, (0, 0))
+        return cpu, ram
+
+    def _total_weight(self, pool_id: str, extra: Optional[Tenant] = None):
+        tenants = set(self._pools.get(pool_id, ()))
+        if extra is not None:
+            tenants.add(extra)
+        return sum(self.weight(t) for t in tenants)
+
+    def _share(
+        self,
+        tenant: Tenant,
+        cpu_used: int,
+        ram_used: int,
+        cpu_limit: int,
+        ram_limit: int,
+        total_weight: float,
+    ):
+        cpu_part = cpu_used / cpu_limit if cpu_limit > 0 else 0
+        ram_part = ram_used / ram_limit if ram_limit > 0 else 0
+        entitled = self.weight(tenant) / total_weight
+        return max(cpu_part, ram_part) / entitled
+
+    def share(
+        self,
+        pool_id: str,
+        tenant: Tenant,
+        cpu_limit: int,
+        ram_limit: int,
+        cpu: int = 0,
+        ram: int = 0,
+    ) -> float:
+
+        """Share of tenant in pool after it gets `cpu` and `ram` more"""
+
+        cpu_used, ram_used = self.usage(pool_id, tenant)
+        total_weight = self._total_weight(pool_id, tenant)
+
+        return self._share(
+            tenant,
+            cpu_used + cpu,
+            ram_used + ram,
+            cpu_limit,
+            ram_limit,
+            total_weight,
+        )
+
+    def over_quota(self, pool_id: str, cpu_limit: int, ram_limit: int):
+
+        """Returns tenants which are over quota, the most loaded first"""
+
+        shares: List[Tuple[float, Tenant]] = []
+        total_weight = self._total_weight(pool_id)
+
+        for tenant, (cpu_used, ram_used) in self._pools.get(pool_id, {}).items():
+            share = self._share(
+                tenant, cpu_used, ram_used, cpu_limit, ram_limit, total_weight
+            )
+            if share > 1:
+                shares.append((share, tenant))
+
+        shares.sort(reverse=True)
+        return [tenant for _, tenant in shares]
@@ -26,6 +26,8 @@ if TYPE_CHECKING:
     # isort: on
     # fmt: on
 
+    from starter.app.settings import AppSettings
+
 
 def get_pod_resources(pod: V1Pod):
 
@@ -68,10 +70,12 @@ def parse_k8s_pod(pod: V1Pod):
             name=pod_name,
             phase=status.phase,
             start_time=status.start_time,
+            create_time=meta.creation_timestamp,
             displaced="displaced_at" in labels,
             deleting=False,
             cpu=cpu_usage,
             ram=ram_usage,
+            node_name=pod.spec.node_name,
             # Suitcase
             user_id=labels["user_id"],
             project_id=labels["project_id"],
@@ -83,8 +87,8 @@ def parse_k8s_pod(pod: V1Pod):
             fuzzer_engine=labels["fuzzer_engine"],
             session_id=labels["session_id"],
             # Pre-saved logs
-            agent_logs=None,
-            sandbox_logs=None,
+            agent_logs_ref=None,
+            sandbox_logs_ref=None,
             logs_saved=False,
         )
 
@@ -95,15 +99,15 @@ def parse_k8s_pod(pod: V1Pod):
     return pod
 
 
-async def pod_registry_init(k8s_client: KubernetesClient):
+async def pod_registry_init(k8s_client: KubernetesClient, settings: AppSettings):
 
-    registry = FuzzerPodRegistry()
-    async for pod in k8s_client.list_fuzzer_pods():
+    registry = FuzzerPodRegistry(settings.fuzzer_pod.tenant_weights)
+    for pod in await k8s_client.list_fuzzer_pods():
         registry.add_pod(parse_k8s_pod(pod))
 
     getLogger("registry.pods").info(
         "Loaded %d pods to registry",
-        len(registry.list_pods()),
+        registry.pod_count,
     )
 
     return registry
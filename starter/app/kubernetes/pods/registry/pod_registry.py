@@ -1,9 +1,23 @@
 from collections import defaultdict
 from dataclasses import asdict, dataclass
 from datetime import datetime
-from typing import DefaultDict, Dict, Optional
+from heapq import merge
+from itertools import chain
+from typing import DefaultDict, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from starter.app.metrics import (
+    failed_pods,
+    pending_pods,
+    pod_launch_to_running,
+    running_pods,
+    succeeded_pods,
+    unknown_pods,
+)
+from starter.app.util.datetime import date_now
+
+from .displacement_queue import DisplacementQueue
 from .errors import PodAlreadyExistsError, PodNotFoundError
+from .fair_share import Tenant, TenantUsage
 
 
 @dataclass
@@ -13,10 +27,12 @@ class FuzzerPod:
     name: str
     phase: str
     start_time: Optional[datetime]
+    create_time: Optional[datetime]
     displaced: bool
     deleting: bool
     cpu: int
     ram: int
+    node_name: Optional[str]
 
     # Suitcase
     user_id: str
@@ -29,30 +45,158 @@ class FuzzerPod:
     fuzzer_engine: str
     session_id: str
 
-    # Pre-saved logs
-    agent_logs: Optional[str]
-    sandbox_logs: Optional[str]
+    # Pre-saved logs (references in log store)
+    agent_logs_ref: Optional[str]
+    sandbox_logs_ref: Optional[str]
     logs_saved: bool
 
+    @property
+    def tenant(self) -> Tenant:
+        return self.user_id, self.project_id
+
     def as_dict(self):
         return asdict(self)
 
 
+class FuzzerPodGroup:
+
+    """
+    Pods sharing the same <pool_id, agent_mode, phase>.
+    Tracks instance count of each <fuzzer_id, fuzzer_rev> in group
+    """
+
+    _pods: Dict[str, FuzzerPod]
+    _instances: DefaultDict[Tuple[str, str], int]
+
+    def __init__(self):
+        self._instances = defaultdict(int)
+        self._pods = {}
+
+    def add(self, pod: FuzzerPod):
+        self._pods[pod.name] = pod
+        self._instances[(pod.fuzzer_id, pod.fuzzer_rev)] += 1
+
+    def remove(self, pod: FuzzerPod):
+
+        del self._pods[pod.name]
+
+        key = (pod.fuzzer_id, pod.fuzzer_rev)
+        self._instances[key] -= 1
+
+        if self._instances[key] == 0:
+            del self._instances[key]
+
+    def count_instances(self, fuzzer_id: str, fuzzer_rev: str):
+        return self._instances.get((fuzzer_id, fuzzer_rev), 0)
+
+    @property
+    def pods(self) -> List[FuzzerPod]:
+        return list(self._pods.values())
+
+    def __len__(self):
+        return len(self._pods)
+
+
+PHASE_GAUGES = {
+    "Pending": pending_pods,
+    "Running": running_pods,
+    "Succeeded": succeeded_pods,
+    "Failed": failed_pods,
+    "Unknown": unknown_pods,
+}
+
+
 class FuzzerPodRegistry:
 
     _pods: Dict[str, FuzzerPod]
     _dsp_pools: DefaultDict[str, int]
+    _pool_pods: Dict[str, Dict[str, FuzzerPod]]
+    _groups: Dict[Tuple[str, str, str], FuzzerPodGroup]
+    _dsp_queues: Dict[str, Dict[Tenant, DisplacementQueue]]
+    _usage: TenantUsage
 
-    def __init__(self) -> None:
+    def __init__(self, tenant_weights: Optional[Dict[str, float]] = None) -> None:
+        self._usage = TenantUsage(tenant_weights)
         self._dsp_pools = defaultdict(int)
+        self._dsp_queues = {}
+        self._pool_pods = {}
+        self._groups = {}
         self._pods = {}
 
+    @staticmethod
+    def _group_key(pod: FuzzerPod):
+        return pod.pool_id, pod.agent_mode, pod.phase
+
+    @staticmethod
+    def _can_be_displaced(pod: FuzzerPod):
+        return (
+            pod.agent_mode == "fuzzing" and pod.phase == "Running" and not pod.displaced
+        )
+
+    @staticmethod
+    def _count_phase(pod: FuzzerPod, amount: int):
+        gauge = PHASE_GAUGES.get(pod.phase)
+        if gauge is not None:
+            gauge.labels(pod.pool_id).inc(amount)
+
+    def _index_pod(self, pod: FuzzerPod):
+
+        try:
+            self._pool_pods[pod.pool_id][pod.name] = pod
+        except KeyError:
+            self._pool_pods[pod.pool_id] = {pod.name: pod}
+
+        key = self._group_key(pod)
+        group = self._groups.get(key)
+
+        if group is None:
+            group = self._groups[key] = FuzzerPodGroup()
+
+        group.add(pod)
+
+        if self._can_be_displaced(pod):
+            queues = self._dsp_queues.setdefault(pod.pool_id, {})
+            queue = queues.get(pod.tenant)
+            if queue is None:
+                queue = queues[pod.tenant] = DisplacementQueue()
+
+            queue.add(pod)
+
+    def _unindex_pod(self, pod: FuzzerPod):
+
+        pool_pods = self._pool_pods[pod.pool_id]
+        del pool_pods[pod.name]
+
+        if not pool_pods:
+            del self._pool_pods[pod.pool_id]
+
+        key = self._group_key(pod)
+        group = self._groups[key]
+        group.remove(pod)
+
+        if not group:
+            del self._groups[key]
+
+        if self._can_be_displaced(pod):
+            queues = self._dsp_queues[pod.pool_id]
+            queue = queues[pod.tenant]
+            queue.remove(pod)
+
+            if not queue:
+                del queues[pod.tenant]
+
+            if not queues:
+                del self._dsp_queues[pod.pool_id]
+
     def add_pod(self, pod: FuzzerPod):
 
         if pod.name in self._pods:
             raise PodAlreadyExistsError(pod.name)
 
         self._pods[pod.name] = pod
+        self._index_pod(pod)
+        self._count_phase(pod, 1)
+        self._usage.add(pod.pool_id, pod.tenant, pod.cpu, pod.ram)
 
         if pod.displaced:
             self._dsp_pools[pod.pool_id] += 1
@@ -64,6 +208,10 @@ class FuzzerPodRegistry:
             msg = f"Pod '{pod_name}' not found"
             raise PodNotFoundError(msg) from e
 
+        self._unindex_pod(pod)
+        self._count_phase(pod, -1)
+        self._usage.remove(pod.pool_id, pod.tenant, pod.cpu, pod.ram)
+
         if pod.displaced:
             self._dsp_pools[pod.pool_id] -= 1
 
@@ -77,16 +225,107 @@ class FuzzerPodRegistry:
 
         return res
 
+    def update_pod_phase(self, pod_name: str, phase: str):
+
+        pod = self.find_pod(pod_name)
+        if pod.phase == phase:
+            return
+
+        self._unindex_pod(pod)
+        self._count_phase(pod, -1)
+        pod.phase = phase
+        self._count_phase(pod, 1)
+        self._index_pod(pod)
+
+        if phase == "Running" and pod.create_time is not None:
+            elapsed = date_now() - pod.create_time
+            pod_launch_to_running.labels(pod.pool_id).observe(elapsed.total_seconds())
+
+    def update_pod_start_time(self, pod_name: str, start_time: datetime):
+        pod = self.find_pod(pod_name)
+        self._unindex_pod(pod)
+        pod.start_time = start_time
+        self._index_pod(pod)
+
     def displace_pod(self, pod_name: str):
+
         pod = self.find_pod(pod_name)
+        if pod.displaced:
+            return
+
+        self._unindex_pod(pod)
         self._dsp_pools[pod.pool_id] += 1
         pod.displaced = True
+        self._index_pod(pod)
+
+    @staticmethod
+    def _merge_queues(queues: Iterable[DisplacementQueue]) -> Iterator[FuzzerPod]:
+
+        # Fuzzer belongs to one tenant, so order
+        # keys of different queues are comparable
+        def keyed(queue: DisplacementQueue):
+            return ((queue.order_key(pod), pod) for pod in queue)
+
+        return (pod for _, pod in merge(*[keyed(q) for q in queues]))
+
+    def displacement_candidates(
+        self, pool_id: str, first: Iterable[Tenant] = ()
+    ) -> Iterator[FuzzerPod]:
+
+        """
+        Yields running fuzzing pods of the pool in displacement order.
+        Pods of tenants in `first` go before the others, tenant by tenant.
+        Registry must not be modified until iteration is finished
+        """
+
+        queues = self._dsp_queues.get(pool_id, {})
+        first = [t for t in dict.fromkeys(first) if t in queues]
+        rest = [q for t, q in queues.items() if t not in first]
+
+        return chain(
+            *[iter(queues[t]) for t in first],
+            self._merge_queues(rest),
+        )
+
+    def tenant_share(
+        self,
+        pool_id: str,
+        tenant: Tenant,
+        cpu_limit: int,
+        ram_limit: int,
+        cpu: int = 0,
+        ram: int = 0,
+    ):
+        """Fair share of tenant in pool. Above 1 means over quota"""
+        return self._usage.share(pool_id, tenant, cpu_limit, ram_limit, cpu, ram)
+
+    def over_quota_tenants(
+        self, pool_id: str, cpu_limit: int, ram_limit: int
+    ) -> List[Tenant]:
+        return self._usage.over_quota(pool_id, cpu_limit, ram_limit)
 
     def list_pods(self):
         return list(self._pods.values())
 
+    def list_pool_pods(self, pool_id: str) -> List[FuzzerPod]:
+        return list(self._pool_pods.get(pool_id, {}).values())
+
+    def find_group(self, pool_id: str, agent_mode: str, phase: str):
+
+        """
+        Returns pods with given pool, agent mode and phase.
+        Result is empty group if there are no such pods
+        """
+
+        key = pool_id, agent_mode, phase
+        return self._groups.get(key) or FuzzerPodGroup()
+
     def has_pod(self, pod_name: str):
         return self._pods.get(pod_name) is not None
 
     def displacement_in_progress(self, pool_id: str):
         return self._dsp_pools[pool_id] > 0
+
+    @property
+    def pod_count(self):
+        return len(self._pods)
@@ -34,6 +34,12 @@ class PoolEventHandler:
         self._registry = pool_registry
         self._k8s_client = k8s_client
 
+    async def _delete_pool_pods(self, pool_id: str):
+
+        # Every replica gets pool events, but only owner deletes pods
+        if self._k8s_client.pod_informer.covers(pool_id):
+            await self._k8s_client.delete_fuzzer_pods(pool_id=pool_id)
+
     async def handle(self, event_type: str, raw_data: str):
 
         if event_type == "ping":
@@ -80,9 +86,7 @@ class PoolEventHandler:
                 pool_event.pool_id,
             )
 
-            await self._k8s_client.delete_fuzzer_pods(
-                pool_id=pool_event.pool_id,
-            )
+            await self._delete_pool_pods(pool_event.pool_id)
 
             self._logger.debug(
                 "Pool <id='%s'> update started",
@@ -99,9 +103,7 @@ class PoolEventHandler:
                 pool_event.pool_id,
             )
 
-            await self._k8s_client.delete_fuzzer_pods(
-                pool_id=pool_event.pool_id,
-            )
+            await self._delete_pool_pods(pool_event.pool_id)
 
             self._logger.debug(
                 "Pool <id='%s'> update finished",
@@ -118,9 +120,7 @@ class PoolEventHandler:
                 pool_event.pool_id,
             )
 
-            await self._k8s_client.delete_fuzzer_pods(
-                pool_id=pool_event.pool_id,
-            )
+            await self._delete_pool_pods(pool_event.pool_id)
 
             self._logger.debug(
                 "Pool <id='%s'> deletion started",
@@ -1,8 +1,9 @@
 from .instance import pool_registry_init
 from .pool_registry import PoolRegistry
-from .resource_pool import ResourcePool
+from .resource_pool import Reservation, ResourcePool
 
 __all__ = [
+    "Reservation",
     "ResourcePool",
     "PoolRegistry",
     "pool_registry_init",
@@ -0,0 +1,84 @@
+import asyncio
+from dataclasses import dataclass, field
+from heapq import heappop, heappush
+from typing import List, Optional, Tuple
+
+# Lower value is admitted first
+ADMISSION_PRIORITIES = {
+    "firstrun": 0,
+    "merge": 1,
+    "fuzzing": 2,
+}
+
+# <agent mode priority, fair share of tenant>
+AdmissionPriority = Tuple[int, float]
+
+
+def admission_priority(agent_mode: str, share: float = 0.0) -> AdmissionPriority:
+    mode_priority = ADMISSION_PRIORITIES.get(agent_mode, len(ADMISSION_PRIORITIES))
+    return mode_priority, share
+
+
+@dataclass(order=True)
+class AdmissionWaiter:
+    priority: AdmissionPriority
+    seq: int
+    cpu: int = field(compare=False)
+    ram: int = field(compare=False)
+    ttl: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionQueue:
+
+    """
+    Launches waiting for pool resources. Waiters are ordered by
+    priority, then by arrival. Waiters which gave up (their future
+    is done) are dropped lazily when they reach the head
+    """
+
+    _heap: List[AdmissionWaiter]
+    _seq: int
+
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+
+    def push(
+        self, cpu: int, ram: int, ttl: float, priority: AdmissionPriority
+    ) -> AdmissionWaiter:
+
+        self._seq += 1
+        future = asyncio.get_running_loop().create_future()
+        waiter = AdmissionWaiter(priority, self._seq, cpu, ram, ttl, future)
+        heappush(self._heap, waiter)
+
+        return waiter
+
+    def peek(self) -> Optional[AdmissionWaiter]:
+
+        while self._heap and self._heap[0].future.done():
+            heappop(self._heap)
+
+        return self._heap[0] if self._heap else None
+
+    def pop(self) -> AdmissionWaiter:
+        waiter = self.peek()
+        assert waiter is not None, "Queue is empty"
+        return heappop(self._heap)
+
+    def has_waiters(self, max_priority: AdmissionPriority):
+        """Checks whether there are waiters with the same or higher priority"""
+        waiter = self.peek()
+        return waiter is not None and waiter.priority <= max_priority
+
+    def fail_all(self, error: Exception):
+
+        for waiter in self._heap:
+            if not waiter.future.done():
+                waiter.future.set_exception(error)
+
+        self._heap.clear()
+
+    def __len__(self):
+        return sum(1 for waiter in self._heap if not waiter.future.done())
@@ -14,6 +14,14 @@ class PoolNoResourcesLeftError(ResourcePoolError):
     pass
 
 
+class PoolNoSuitableNodeError(PoolNoResourcesLeftError):
+    pass
+
+
+class PoolAdmissionTimeoutError(PoolNoResourcesLeftError):
+    pass
+
+
 class PoolOverflowError(ResourcePoolError):
     pass
 
@@ -1,6 +1,7 @@
 from starter.app.external_api.external_api import ExternalAPI
 from starter.app.kubernetes.pods.registry import FuzzerPodRegistry
 
+from .errors import PoolNodeNotFoundError
 from .pool_registry import PoolRegistry
 
 
@@ -26,14 +27,25 @@ async def pool_registry_init(
 
     #
     # Running pods consume resources
-    # We must reflect this in pool registry
+    # We must reflect this in pool registry.
+    # Resources are accounted on nodes pods are scheduled on
     #
 
     for pod in pod_registry.list_pods():
-        registry.allocate_resources(
-            pod.pool_id,
-            pod.cpu,
-            pod.ram,
-        )
+        try:
+            registry.allocate_node_resources(
+                pod.pool_id,
+                pod.node_name,
+                pod.cpu,
+                pod.ram,
+            )
+        except PoolNodeNotFoundError:
+            pod.node_name = None
+            registry.allocate_node_resources(
+                pod.pool_id,
+                pod.node_name,
+                pod.cpu,
+                pod.ram,
+            )
 
     return registry
@@ -1,8 +1,9 @@
 from logging import getLogger
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
+from .admission_queue import AdmissionPriority
 from .errors import PoolAlreadyExistsError, PoolNotFoundError
-from .resource_pool import ResourcePool
+from .resource_pool import Reservation, ResourcePool
 
 
 class PoolRegistry:
@@ -38,6 +39,7 @@ class PoolRegistry:
             msg = f"Pool '{pool_id}' not found"
             raise PoolNotFoundError(msg) from e
 
+        pool.cancel_waiters(PoolNotFoundError(f"Pool '{pool_id}' not found"))
         self._logger.debug("Removed pool <id='%s'>", pool.id)
 
     def find_pool(self, pool_id: str):
@@ -59,14 +61,72 @@ class PoolRegistry:
     def remove_pool_node(self, pool_id: str, node_name: str):
         self.find_pool(pool_id).remove_node(node_name)
 
-    def allocate_resources(self, pool_id: str, cpu: int, ram: int):
-        self.find_pool(pool_id).allocate(cpu, ram)
+    def allocate_resources(
+        self,
+        pool_id: str,
+        cpu: int,
+        ram: int,
+        priority: AdmissionPriority,
+        ttl: float,
+    ) -> Reservation:
+        return self.find_pool(pool_id).admit(cpu, ram, priority, ttl)
+
+    async def wait_resources(
+        self,
+        pool_id: str,
+        cpu: int,
+        ram: int,
+        priority: AdmissionPriority,
+        timeout: float,
+        ttl: float,
+    ) -> Reservation:
+        pool = self.find_pool(pool_id)
+        return await pool.wait_admission(cpu, ram, priority, timeout, ttl)
+
+    def allocate_node_resources(
+        self, pool_id: str, node_name: Optional[str], cpu: int, ram: int
+    ):
+        self.find_pool(pool_id).allocate_on_node(node_name, cpu, ram)
+
+    def move_resources(
+        self,
+        pool_id: str,
+        cpu: int,
+        ram: int,
+        src_node: Optional[str],
+        dst_node: str,
+    ):
+        self.find_pool(pool_id).move(cpu, ram, src_node, dst_node)
 
     def resources_left(self, pool_id: str):
         return self.find_pool(pool_id).resources_left()
 
-    def free_resources(self, pool_id: str, cpu: int, ram: int):
-        self.find_pool(pool_id).free(cpu, ram)
+    def nodes_free(self, pool_id: str) -> Dict[str, Tuple[int, int]]:
+        nodes = self.find_pool(pool_id).nodes
+        return {node.name: (node.cpu_free, node.ram_free) for node in nodes}
+
+    def free_resources(
+        self,
+        pool_id: str,
+        cpu: int,
+        ram: int,
+        node_name: Optional[str] = None,
+    ):
+        self.find_pool(pool_id).free(cpu, ram, node_name)
+
+    def renew_reservation(
+        self, pool_id: str, reservation: Reservation, ttl: float
+    ) -> Reservation:
+        return self.find_pool(pool_id).renew(reservation, ttl)
+
+    def commit_reservation(self, pool_id: str, reservation: Reservation):
+        self.find_pool(pool_id).commit(reservation)
+
+    def release_reservation(self, pool_id: str, reservation: Reservation):
+        self.find_pool(pool_id).release(reservation)
+
+    def expire_reservations(self) -> int:
+        return sum(pool.expire_reservations() for pool in self._pools.values())
 
     def has_pool(self, pool_id: str):
         return self._pools.get(pool_id) is not None
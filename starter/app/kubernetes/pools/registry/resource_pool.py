@@ -1,17 +1,33 @@
+import asyncio
 import logging
+import time
 from dataclasses import dataclass
-from typing import Dict
-
+from heapq import heappop, heappush
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+from starter.app.metrics import (
+    pool_admission_waiters,
+    pool_committed_resources,
+    pool_fragmentation,
+    pool_reservations_expired,
+    pool_reserved_resources,
+)
 from starter.app.util.logging import PrefixedLogger
 
+from .admission_queue import AdmissionPriority, AdmissionQueue, AdmissionWaiter
 from .errors import (
+    PoolAdmissionTimeoutError,
     PoolCapacityExceededError,
     PoolLockedError,
     PoolNodeAlreadyExistsError,
     PoolNodeNotFoundError,
     PoolNoResourcesLeftError,
+    PoolNoSuitableNodeError,
     PoolOverflowError,
     PoolUnderflowError,
+    ResourcePoolError,
 )
 
 
@@ -20,21 +36,50 @@ class PoolNode:
     name: str
     cpu: int
     ram: int
+    cpu_used: int = 0
+    ram_used: int = 0
+
+    @property
+    def cpu_free(self):
+        return self.cpu - self.cpu_used
+
+    @property
+    def ram_free(self):
+        return self.ram - self.ram_used
+
+    def fits(self, cpu: int, ram: int):
+        return cpu <= self.cpu_free and ram <= self.ram_free
 
     def dict(self):
         return self.__dict__
 
 
+@dataclass
+class Reservation:
+    id: str
+    cpu: int
+    ram: int
+    node_name: Optional[str]
+    expires_at: float
+
+
 class ResourcePool:
 
     _id: str
     _logger: logging.Logger
 
     _nodes: Dict[str, PoolNode]
+    _admission: AdmissionQueue
+    _reservations: Dict[str, Reservation]
+    _expiry_heap: List[Tuple[float, str]]
+    _cpu_reserved: int
+    _ram_reserved: int
     _cpu_used: int
     _ram_used: int
     _cpu_limit: int
     _ram_limit: int
+    _cpu_fragmentation: float
+    _ram_fragmentation: float
     _locked: bool
 
     def __init__(self, pool_id: str, locked: bool):
@@ -43,8 +88,15 @@ class ResourcePool:
         self._ram_used = 0
         self._cpu_limit = 0
         self._ram_limit = 0
+        self._cpu_fragmentation = 0
+        self._ram_fragmentation = 0
         self._locked = locked
         self._nodes = {}
+        self._admission = AdmissionQueue()
+        self._reservations = {}
+        self._expiry_heap = []
+        self._cpu_reserved = 0
+        self._ram_reserved = 0
         self._setup_logging()
 
     def _setup_logging(self):
@@ -58,6 +110,49 @@ class ResourcePool:
             self._ram_limit - self._ram_used,
         )
 
+    def _best_fit_node(self, cpu: int, ram: int) -> Optional[PoolNode]:
+
+        #
+        # Choose the node, which will have the least resources left
+        # after allocation. Large free blocks are kept for large pods
+        #
+
+        best_node = None
+        best_score = None
+
+        for node in self._nodes.values():
+            if not node.fits(cpu, ram):
+                continue
+
+            score = (
+                (node.cpu_free - cpu) / node.cpu  # fmt: skip
+                + (node.ram_free - ram) / node.ram
+            )
+
+            if best_score is None or score < best_score:
+                best_score = score
+                best_node = node
+
+        return best_node
+
+    def _update_fragmentation(self):
+
+        #
+        # Fragmentation is the share of free resources
+        # which can't be used by a pod placed on a single node
+        #
+
+        cpu_free = sum(max(n.cpu_free, 0) for n in self._nodes.values())
+        ram_free = sum(max(n.ram_free, 0) for n in self._nodes.values())
+        cpu_max = max((n.cpu_free for n in self._nodes.values()), default=0)
+        ram_max = max((n.ram_free for n in self._nodes.values()), default=0)
+
+        self._cpu_fragmentation = 1 - cpu_max / cpu_free if cpu_free > 0 else 0
+        self._ram_fragmentation = 1 - ram_max / ram_free if ram_free > 0 else 0
+
+        pool_fragmentation.labels(self._id, "cpu").set(self._cpu_fragmentation)
+        pool_fragmentation.labels(self._id, "ram").set(self._ram_fragmentation)
+
     def add_node(self, node_name: str, cpu: int, ram: int):
 
         assert cpu > 0, "cpu must be greater than zero"
@@ -70,6 +165,8 @@ class ResourcePool:
         self._cpu_limit += cpu
         self._ram_limit += ram
         self._nodes[node_name] = PoolNode(node_name, cpu, ram)
+        self._update_fragmentation()
+        self._admit_waiters()
 
         msg = "Node added: <name='%s', cpu=%dm, ram=%dMi>"
         self._logger.debug(msg, node_name, cpu, ram)
@@ -91,6 +188,16 @@ class ResourcePool:
         assert self._cpu_limit >= 0
         assert self._ram_limit >= 0
 
+        #
+        # Pods of removed node will be deleted soon.
+        # Their resources are freed only in aggregate
+        #
+
+        self._update_fragmentation()
+
+        # Waiters which no longer fit into pool are failed
+        self._admit_waiters()
+
         msg = "Node removed: <name='%s', cpu=%dm, ram=%dMi>"
         self._logger.debug(msg, node.name, node.cpu, node.ram)
 
@@ -98,7 +205,12 @@ class ResourcePool:
         args = self._cpu_limit, self._ram_limit, self.node_count
         self._logger.debug(msg, *args)
 
-    def allocate(self, cpu: int, ram: int):
+    def allocate(self, cpu: int, ram: int) -> str:
+
+        """
+        Allocates resources on the node, which fits the request best.
+        Returns name of the node resources were allocated on
+        """
 
         if self._locked:
             raise PoolLockedError("Pool locked")
@@ -130,15 +242,87 @@ class ResourcePool:
             self._logger.debug(msg, rs_cpu, rs_ram)
             raise PoolNoResourcesLeftError(msg % (rs_cpu, rs_ram))
 
+        node = self._best_fit_node(cpu, ram)
+
+        if node is None:
+            msg = "No suitable node: <cpu=%dm, ram=%dMi, fragmentation=%.2f/%.2f>"
+            args = cpu, ram, self._cpu_fragmentation, self._ram_fragmentation
+            self._logger.debug(msg, *args)
+            raise PoolNoSuitableNodeError(msg % args)
+
+        self._allocate_on_node(node, cpu, ram)
+        return node.name
+
+    def allocate_on_node(self, node_name: Optional[str], cpu: int, ram: int):
+
+        """
+        Allocates resources on the given node without any checks.
+        Used to account pods, which already exist in k8s.
+        Pods, which are not scheduled yet, are accounted in aggregate only
+        """
+
+        node = None
+
+        if node_name is not None:
+            node = self._nodes.get(node_name)
+            if node is None:
+                msg = f"Node '{node_name}' not found in pool '{self._id}'"
+                raise PoolNodeNotFoundError(msg)
+
+        self._allocate_on_node(node, cpu, ram)
+
+    def _allocate_on_node(self, node: Optional[PoolNode], cpu: int, ram: int):
+
+        if node is not None:
+            node.cpu_used += cpu
+            node.ram_used += ram
+
         self._cpu_used += cpu
         self._ram_used += ram
+        self._update_fragmentation()
 
-        msg = "Resources allocated: cur/max <cpu=%s, ram=%s>"
+        msg = "Resources allocated: node='%s', cur/max <cpu=%s, ram=%s>"
         rs_cpu = f"[{self._cpu_used}m/{self._cpu_limit}m]"
         rs_ram = f"[{self._ram_used}Mi/{self._ram_limit}Mi]"
-        self._logger.debug(msg, rs_cpu, rs_ram)
+        self._logger.debug(msg, node and node.name, rs_cpu, rs_ram)
+
+    def move(self, cpu: int, ram: int, src_node: Optional[str], dst_node: str):
+
+        """
+        Moves allocated resources to another node. Used when
+        k8s has scheduled pod not on the node it was accounted on
+        (pod was not accounted on any node or created by older version).
+        Destination node is never overcommitted
+        """
+
+        dst = self._nodes.get(dst_node)
+
+        if dst is None:
+            msg = f"Node '{dst_node}' not found in pool '{self._id}'"
+            raise PoolNodeNotFoundError(msg)
+
+        if not dst.fits(cpu, ram):
+            msg = "No room on node '%s': req/left <cpu=%s, ram=%s>"
+            rs_cpu = f"[{cpu}m/{dst.cpu_free}m]"
+            rs_ram = f"[{ram}Mi/{dst.ram_free}Mi]"
+            self._logger.warning(msg, dst_node, rs_cpu, rs_ram)
+            raise PoolNoSuitableNodeError(msg % (dst_node, rs_cpu, rs_ram))
+
+        src = self._nodes.get(src_node) if src_node else None
+
+        if src is not None:
+            src.cpu_used -= cpu
+            src.ram_used -= ram
+
+        dst.cpu_used += cpu
+        dst.ram_used += ram
+        self._update_fragmentation()
+        self._admit_waiters()
+
+        msg = "Resources moved: <cpu=%dm, ram=%dMi, src='%s', dst='%s'>"
+        self._logger.debug(msg, cpu, ram, src_node, dst_node)
 
-    def free(self, cpu: int, ram: int):
+    def free(self, cpu: int, ram: int, node_name: Optional[str] = None):
 
         if self._cpu_used - cpu < 0 or self._ram_used - ram < 0:
             msg = "Pool underflow: <cpu=%s, ram=%s>"
@@ -150,16 +334,303 @@ class ResourcePool:
         self._cpu_used -= cpu
         self._ram_used -= ram
 
+        node = self._nodes.get(node_name) if node_name else None
+
+        if node is not None:
+            node.cpu_used = max(node.cpu_used - cpu, 0)
+            node.ram_used = max(node.ram_used - ram, 0)
+
+        self._update_fragmentation()
+
         msg = "Resources freed: cur/max <cpu=%s, ram=%s>"
         rs_cpu = f"[{self._cpu_used}m/{self._cpu_limit}m]"
         rs_ram = f"[{self._ram_used}Mi/{self._ram_limit}Mi]"
         self._logger.debug(msg, rs_cpu, rs_ram)
 
+        self._admit_waiters()
+
+    def _update_admission_metrics(self):
+        pool_admission_waiters.labels(self._id).set(len(self._admission))
+
+    def _admit_waiters(self):
+
+        #
+        # Waiter at the head blocks the rest until it fits.
+        # Otherwise small launches could starve large ones
+        #
+
+        while True:
+
+            waiter = self._admission.peek()
+            if waiter is None:
+                break
+
+            try:
+                node_name = self.allocate(waiter.cpu, waiter.ram)
+            except (PoolNoResourcesLeftError, PoolOverflowError):
+                break
+            except ResourcePoolError as e:
+                self._admission.pop().future.set_exception(e)
+                continue
+
+            # Waiter resumes later, resources are reserved meanwhile
+            reservation = self.reserve(waiter.cpu, waiter.ram, node_name, waiter.ttl)
+            self._admission.pop().future.set_result(reservation)
+
+        self._update_admission_metrics()
+
+    def admit(
+        self, cpu: int, ram: int, priority: AdmissionPriority, ttl: float
+    ) -> Reservation:
+
+        """
+        Allocates and reserves resources for pod unless launches with
+        the same or higher priority are waiting for them in queue
+        """
+
+        if self._admission.has_waiters(priority):
+            msg = "No resources left: launches with higher priority are waiting"
+            raise PoolNoResourcesLeftError(msg)
+
+        node_name = self.allocate(cpu, ram)
+        return self.reserve(cpu, ram, node_name, ttl)
+
+    def _cancel_waiter(self, waiter: AdmissionWaiter):
+
+        future = waiter.future
+
+        # Resources may have been reserved already
+        if future.done() and not future.cancelled() and not future.exception():
+            self.release(future.result())
+        else:
+            future.cancel()
+
+        self._update_admission_metrics()
+
+    async def wait_admission(
+        self,
+        cpu: int,
+        ram: int,
+        priority: AdmissionPriority,
+        timeout: float,
+        ttl: float,
+    ) -> Reservation:
+
+        """
+        Allocates and reserves resources for pod, waiting in admission
+        queue for at most `timeout` seconds if there are not enough of them
+        """
+
+        try:
+            return self.admit(cpu, ram, priority, ttl)
+        except (PoolNoResourcesLeftError, PoolOverflowError):
+            pass
+
+        waiter = self._admission.push(cpu, ram, ttl, priority)
+        self._update_admission_metrics()
+
+        try:
+            await asyncio.wait({waiter.future}, timeout=timeout)
+        except asyncio.CancelledError:
+            self._cancel_waiter(waiter)
+            raise
+
+        if not waiter.future.done():
+            self._cancel_waiter(waiter)
+            msg = "No resources left: admission timeout (%ss) expired"
+            raise PoolAdmissionTimeoutError(msg % timeout)
+
+        return waiter.future.result()
+
+    def _update_reservation_metrics(self):
+
+        cpu_committed = self._cpu_used - self._cpu_reserved
+        ram_committed = self._ram_used - self._ram_reserved
+
+        pool_reserved_resources.labels(self._id, "cpu").set(self._cpu_reserved)
+        pool_reserved_resources.labels(self._id, "ram").set(self._ram_reserved)
+        pool_committed_resources.labels(self._id, "cpu").set(cpu_committed)
+        pool_committed_resources.labels(self._id, "ram").set(ram_committed)
+
+    def reserve(
+        self, cpu: int, ram: int, node_name: Optional[str], ttl: float
+    ) -> Reservation:
+
+        """
+        Marks allocated resources as reserved for pod which is being created.
+        Reservation must be committed when pod is created or released on
+        failure. Otherwise resources are freed when reservation expires
+        """
+
+        reservation = Reservation(
+            id=uuid4().hex,
+            cpu=cpu,
+            ram=ram,
+            node_name=node_name,
+            expires_at=time.monotonic() + ttl,
+        )
+
+        self._reservations[reservation.id] = reservation
+        heappush(self._expiry_heap, (reservation.expires_at, reservation.id))
+        self._cpu_reserved += cpu
+        self._ram_reserved += ram
+        self._update_reservation_metrics()
+
+        return reservation
+
+    def _pop_reservation(self, reservation_id: str) -> Optional[Reservation]:
+
+        reservation = self._reservations.pop(reservation_id, None)
+        if reservation is not None:
+            self._cpu_reserved -= reservation.cpu
+            self._ram_reserved -= reservation.ram
+
+        return reservation
+
+    def renew(self, reservation: Reservation, ttl: float) -> Reservation:
+
+        """
+        Extends reservation of launch which is about to create pod.
+        Launch may have waited for its turn so long, that reservation
+        has expired. Then resources are allocated again with all checks
+        """
+
+        if reservation.id in self._reservations:
+            reservation.expires_at = time.monotonic() + ttl
+            heappush(self._expiry_heap, (reservation.expires_at, reservation.id))
+            return reservation
+
+        msg = "Reservation has expired before pod creation: <cpu=%dm, ram=%dMi>"
+        self._logger.warning(msg, reservation.cpu, reservation.ram)
+
+        node_name = self.allocate(reservation.cpu, reservation.ram)
+        return self.reserve(reservation.cpu, reservation.ram, node_name, ttl)
+
+    def commit(self, reservation: Reservation):
+
+        """
+        Resources of reservation now belong to created pod. Raises
+        PoolNoSuitableNodeError if reservation has expired and its
+        resources have been taken, so pod must not be kept
+        """
+
+        if self._pop_reservation(reservation.id) is not None:
+            self._update_reservation_metrics()
+            return
+
+        #
+        # Reservation has expired and its resources were freed,
+        # but pod has been created on node of reservation.
+        # Account pod resources again only if they still fit
+        #
+
+        cpu, ram = reservation.cpu, reservation.ram
+        msg = "Reservation has expired before commit: <cpu=%dm, ram=%dMi>"
+        self._logger.warning(msg, cpu, ram)
+
+        node = self._nodes.get(reservation.node_name)
+        if (
+            node is None
+            or not node.fits(cpu, ram)
+            or self._cpu_used + cpu > self._cpu_limit
+            or self._ram_used + ram > self._ram_limit
+        ):
+            msg = "No room for pod of expired reservation on node '%s'"
+            raise PoolNoSuitableNodeError(msg % reservation.node_name)
+
+        self._allocate_on_node(node, cpu, ram)
+
+    def release(self, reservation: Reservation):
+
+        """Frees resources of reservation (pod creation failed)"""
+
+        if self._pop_reservation(reservation.id) is None:
+            return
+
+        self.free(reservation.cpu, reservation.ram, reservation.node_name)
+        self._update_reservation_metrics()
+
+    def expire_reservations(self) -> int:
+
+        """Frees resources of reservations which have not been committed in time"""
+
+        count = 0
+        now = time.monotonic()
+
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+
+            _, reservation_id = heappop(self._expiry_heap)
+            reservation = self._reservations.get(reservation_id)
+
+            # Committed, released or renewed already
+            if reservation is None or reservation.expires_at > now:
+                continue
+
+            self._pop_reservation(reservation_id)
+
+            msg = "Reservation expired: <cpu=%dm, ram=%dMi, node='%s'>"
+            args = reservation.cpu, reservation.ram, reservation.node_name
+            self._logger.warning(msg, *args)
+
+            self.free(reservation.cpu, reservation.ram, reservation.node_name)
+            count += 1
+
+        if count > 0:
+            pool_reservations_expired.labels(self._id).inc(count)
+            self._update_reservation_metrics()
+
+        return count
+
+    def reconcile_usage(
+        self, pods: Iterable[Tuple[Optional[str], int, int]]
+    ) -> Tuple[int, int]:
+
+        """
+        Replaces accounted usage with usage of given <node, cpu, ram>
+        of pods plus reserved resources. Launches hold reservation from
+        allocation until pod is created, so none of them is lost here.
+        Returns drift of cpu and ram: accounted usage minus actual one
+        """
+
+        cpu_used, ram_used = 0, 0
+        nodes_used = {name: [0, 0] for name in self._nodes}
+        reserved = [(r.node_name, r.cpu, r.ram) for r in self._reservations.values()]
+
+        for node_name, cpu, ram in chain(pods, reserved):
+            cpu_used += cpu
+            ram_used += ram
+            node_used = nodes_used.get(node_name)
+            if node_used is not None:
+                node_used[0] += cpu
+                node_used[1] += ram
+
+        cpu_drift = self._cpu_used - cpu_used
+        ram_drift = self._ram_used - ram_used
+
+        self._cpu_used = cpu_used
+        self._ram_used = ram_used
+        for node_name, (cpu, ram) in nodes_used.items():
+            node = self._nodes[node_name]
+            node.cpu_used = cpu
+            node.ram_used = ram
+
+        self._update_fragmentation()
+        self._update_reservation_metrics()
+        self._admit_waiters()
+
+        return cpu_drift, ram_drift
+
+    def cancel_waiters(self, error: Exception):
+        self._admission.fail_all(error)
+        self._update_admission_metrics()
+
     def lock(self):
         self._locked = True
+        self.cancel_waiters(PoolLockedError("Pool locked"))
 
     def unlock(self):
         self._locked = False
+        self._admit_waiters()
 
     @property
     def cpu_used(self):
@@ -177,6 +648,10 @@ class ResourcePool:
     def ram_limit(self):
         return self._ram_limit
 
+    @property
+    def fragmentation(self):
+        return self._cpu_fragmentation, self._ram_fragmentation
+
     @property
     def locked(self):
         return self._locked
@@ -185,6 +660,14 @@ class ResourcePool:
     def id(self):
         return self._id
 
+    @property
+    def reserved(self):
+        return self._cpu_reserved, self._ram_reserved
+
+    @property
+    def admission_waiters(self):
+        return len(self._admission)
+
     @property
     def node_count(self):
         return len(self._nodes)
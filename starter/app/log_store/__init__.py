@@ -0,0 +1,5 @@
+from .abstract import ILogStore
+from .errors import LogNotFoundError, LogStoreError
+from .instance import log_store_init
+
+__all__ = ["log_store_init", "ILogStore", "LogStoreError", "LogNotFoundError"]
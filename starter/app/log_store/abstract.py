@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import re
+from abc import ABCMeta, abstractmethod
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator
+
+if TYPE_CHECKING:
+    from starter.app.settings import AppSettings
+
+
+def day_prefix(date: datetime):
+    return date.strftime(r"%Y-%m-%d")
+
+
+def is_day_prefix(name: str):
+    return re.match(r"^\d{4}-\d{2}-\d{2}$", name) is not None
+
+
+class ILogStore(metaclass=ABCMeta):
+
+    """
+    Used for saving pod logs outside of database.
+    Logs are written and read chunk by chunk.
+    Keys are prefixed with save date: 'YYYY-MM-DD/...'
+    """
+
+    @staticmethod
+    @abstractmethod
+    async def create(cls, settings: AppSettings):
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def save(self, key: str, chunks: AsyncIterator[bytes]) -> str:
+        pass
+
+    @abstractmethod
+    def load(self, ref: str) -> AsyncIterator[bytes]:
+        pass
+
+    @abstractmethod
+    async def delete(self, ref: str) -> None:
+        pass
+
+    @abstractmethod
+    async def remove_saved_before(self, day: str) -> None:
+        pass
@@ -0,0 +1,6 @@
+class LogStoreError(Exception):
+    """Base exception for all log store errors"""
+
+
+class LogNotFoundError(LogStoreError):
+    pass
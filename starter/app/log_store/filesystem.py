@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import shutil
+from typing import TYPE_CHECKING, AsyncIterator, BinaryIO
+
+from .abstract import ILogStore, is_day_prefix
+from .errors import LogNotFoundError, LogStoreError
+
+if TYPE_CHECKING:
+    from starter.app.settings import AppSettings
+
+
+class FileSystemLogStore(ILogStore):
+
+    """
+    Stores logs in local directory. File operations
+    are run in thread pool to not block the event loop
+    """
+
+    _logger: logging.Logger
+    _root: str
+    _chunk_size: int
+
+    async def _init(self, settings: AppSettings):
+        self._logger = logging.getLogger("logs.fs")
+        self._root = os.path.abspath(settings.log_store.fs_path)
+        self._chunk_size = 64 * 1024
+        await self._run(os.makedirs, self._root, exist_ok=True)
+
+    @staticmethod
+    async def create(settings: AppSettings):
+        _self = FileSystemLogStore()
+        await _self._init(settings)
+        return _self
+
+    async def close(self):
+        pass
+
+    @staticmethod
+    async def _run(func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+    async def _remove_quietly(self, path: str):
+        try:
+            await self._run(os.remove, path)
+        except OSError:
+            pass
+
+    def _path(self, ref: str):
+
+        path = os.path.abspath(os.path.join(self._root, ref))
+
+        if os.path.commonpath([self._root, path]) != self._root:
+            raise LogStoreError(f"Invalid log reference: '{ref}'")
+
+        return path
+
+    async def save(self, key: str, chunks: AsyncIterator[bytes]) -> str:
+
+        #
+        # Write to temporary file first,
+        # so partially written logs are never visible.
+        # Temporary file is removed if saving failed
+        #
+
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+
+        try:
+            await self._run(os.makedirs, os.path.dirname(path), exist_ok=True)
+            f: BinaryIO = await self._run(open, tmp_path, "wb")
+
+            try:
+                async for chunk in chunks:
+                    await self._run(f.write, chunk)
+            finally:
+                await self._run(f.close)
+
+            await self._run(os.replace, tmp_path, path)
+
+        except OSError as e:
+            await self._remove_quietly(tmp_path)
+            raise LogStoreError(f"Failed to save log '{key}'. Reason - {e}") from e
+
+        except:
+            await self._remove_quietly(tmp_path)
+            raise
+
+        return key
+
+    async def load(self, ref: str) -> AsyncIterator[bytes]:
+
+        path = self._path(ref)
+
+        try:
+            f: BinaryIO = await self._run(open, path, "rb")
+        except FileNotFoundError as e:
+            raise LogNotFoundError(f"Log '{ref}' not found") from e
+        except OSError as e:
+            raise LogStoreError(f"Failed to load log '{ref}'. Reason - {e}") from e
+
+        try:
+            while True:
+                chunk = await self._run(f.read, self._chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await self._run(f.close)
+
+    async def delete(self, ref: str):
+        try:
+            await self._run(os.remove, self._path(ref))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise LogStoreError(f"Failed to delete log '{ref}'. Reason - {e}") from e
+
+    async def remove_saved_before(self, day: str):
+
+        # Logs are grouped in directories by save date
+        for name in await self._run(os.listdir, self._root):
+            if is_day_prefix(name) and name < day:
+                path = os.path.join(self._root, name)
+                await self._run(shutil.rmtree, path, ignore_errors=True)
+                self._logger.debug("Removed logs saved at %s", name)
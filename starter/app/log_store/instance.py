@@ -0,0 +1,24 @@
+import logging
+
+from starter.app.settings import AppSettings
+
+from .abstract import ILogStore
+from .filesystem import FileSystemLogStore
+from .s3 import S3LogStore
+
+
+async def log_store_init(settings: AppSettings) -> ILogStore:
+
+    logger = logging.getLogger("logs")
+    engine = settings.log_store.engine.lower()
+
+    if engine == "fs":
+        logger.info("Using filesystem log store")
+        log_store = await FileSystemLogStore.create(settings)
+    elif engine == "s3":
+        logger.info("Using S3 log store")
+        log_store = await S3LogStore.create(settings)
+    else:
+        raise ValueError(f"Invalid log store engine '{engine}'")
+
+    return log_store
@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import logging
+from contextlib import suppress
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+
+from aiohttp import ClientError, ClientResponse, ClientSession
+from yarl import URL
+
+from starter.app.util.datetime import date_now
+
+from .abstract import ILogStore, is_day_prefix
+from .errors import LogNotFoundError, LogStoreError
+
+if TYPE_CHECKING:
+    from starter.app.settings import AppSettings
+
+# S3 requires all parts except the last one to be at least 5 MiB
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+########################################
+# AWS Signature Version 4
+########################################
+
+
+def _hmac(key: bytes, msg: str):
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+def _uri_encode(value: str, safe: str = "-_.~"):
+    return quote(value, safe=safe)
+
+
+def canonical_query(query: Dict[str, str]):
+    items = sorted((_uri_encode(k), _uri_encode(v)) for k, v in query.items())
+    return "&".join(f"{k}={v}" for k, v in items)
+
+
+def sign_v4(
+    method: str,
+    path: str,
+    query: Dict[str, str],
+    headers: Dict[str, str],
+    payload_hash: str,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    amz_date: str,
+):
+    """
+    Returns value of 'Authorization' header for S3 request.
+    All the `headers` are signed. Path must be already encoded
+    """
+
+    date = amz_date[:8]
+    scope = f"{date}/{region}/s3/aws4_request"
+
+    hdrs = sorted((k.lower(), " ".join(v.split())) for k, v in headers.items())
+    canonical_headers = "".join(f"{k}:{v}\n" for k, v in hdrs)
+    signed_headers = ";".join(k for k, _ in hdrs)
+
+    canonical_request = "\n".join(
+        [
+            method,
+            path,
+            canonical_query(query),
+            canonical_headers,
+            signed_headers,
+            payload_hash,
+        ]
+    )
+
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ]
+    )
+
+    key = _hmac(f"AWS4{secret_key}".encode(), date)
+    key = _hmac(key, region)
+    key = _hmac(key, "s3")
+    key = _hmac(key, "aws4_request")
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    return (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+
+
+def _xml_find_all(root: ElementTree.Element, name: str):
+    # Ignore XML namespace of S3 responses
+    return [el for el in root.iter() if el.tag.split("}")[-1] == name]
+
+
+def _xml_find_text(root: ElementTree.Element, name: str):
+    elements = _xml_find_all(root, name)
+    return elements[0].text if elements else None
+
+
+########################################
+# S3 log store
+########################################
+
+
+class S3LogStore(ILogStore):
+
+    """
+    Stores logs in S3-compatible object storage (path-style URLs).
+    Log is uploaded with one request if it's smaller than part size.
+    Otherwise, multipart upload is used. In both cases
+    not more than one part is held in memory
+    """
+
+    _logger: logging.Logger
+    _session: Optional[ClientSession]
+    _endpoint: str
+    _host: str
+    _bucket: str
+    _region: str
+    _access_key: str
+    _secret_key: str
+    _part_size: int
+    _is_closed: bool
+
+    async def _init(self, settings: AppSettings):
+
+        self._is_closed = True
+        self._logger = logging.getLogger("logs.s3")
+
+        s3 = settings.log_store
+        self._endpoint = s3.s3_url.rstrip("/")
+        self._host = urlsplit(self._endpoint).netloc
+        self._bucket = s3.s3_bucket
+        self._region = s3.s3_region
+        self._access_key = s3.s3_access_key
+        self._secret_key = s3.s3_secret_key
+        self._part_size = max(s3.s3_part_size, S3_MIN_PART_SIZE)
+
+        self._session = ClientSession()
+        self._is_closed = False
+
+    @staticmethod
+    async def create(settings: AppSettings):
+        _self = S3LogStore()
+        await _self._init(settings)
+        return _self
+
+    async def close(self):
+
+        assert not self._is_closed, "Closed twice"
+
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+        self._is_closed = True
+
+    def __del__(self):
+        if not getattr(self, "_is_closed", True):
+            self._logger.error("S3 session has not been closed")
+
+    async def _request(
+        self,
+        method: str,
+        key: str = "",
+        query: Optional[Dict[str, str]] = None,
+        data: bytes = b"",
+        ok_statuses: Tuple[int, ...] = (200,),
+    ) -> ClientResponse:
+
+        query = query or {}
+        path = "/" + _uri_encode(self._bucket)
+        if key:
+            path += "/" + _uri_encode(key, safe="-_.~/")
+
+        amz_date = date_now().strftime(r"%Y%m%dT%H%M%SZ")
+        payload_hash = hashlib.sha256(data).hexdigest() if data else EMPTY_SHA256
+
+        headers = {
+            "host": self._host,
+            "x-amz-date": amz_date,
+            "x-amz-content-sha256": payload_hash,
+        }
+
+        headers["Authorization"] = sign_v4(
+            method=method,
+            path=path,
+            query=query,
+            headers=headers,
+            payload_hash=payload_hash,
+            access_key=self._access_key,
+            secret_key=self._secret_key,
+            region=self._region,
+            amz_date=amz_date,
+        )
+
+        url = self._endpoint + path
+        if query:
+            url += "?" + canonical_query(query)
+
+        try:
+            resp = await self._session.request(
+                method, URL(url, encoded=True), data=data, headers=headers
+            )
+        except ClientError as e:
+            raise LogStoreError(f"S3 request failed. Reason - {e}") from e
+
+        if resp.status not in ok_statuses:
+            body = await resp.text()
+            resp.release()
+
+            if resp.status == 404:
+                raise LogNotFoundError(f"Object '{key}' not found")
+
+            msg = f"S3 request failed: {method} {key} -> {resp.status}. {body}"
+            raise LogStoreError(msg)
+
+        return resp
+
+    async def _put_object(self, key: str, data: bytes):
+        resp = await self._request("PUT", key, data=data)
+        resp.release()
+
+    async def _upload_multipart(self, key: str, first_part: bytes, chunks):
+
+        resp = await self._request("POST", key, {"uploads": ""})
+        root = ElementTree.fromstring(await resp.read())
+        upload_id = _xml_find_text(root, "UploadId")
+
+        if not upload_id:
+            raise LogStoreError("S3 did not return UploadId")
+
+        etags: List[str] = []
+
+        async def upload_part(data: bytes):
+            query = {"partNumber": str(len(etags) + 1), "uploadId": upload_id}
+            resp = await self._request("PUT", key, query, data)
+            etags.append(resp.headers["ETag"])
+            resp.release()
+
+        try:
+            await upload_part(first_part)
+
+            buffer = bytearray()
+            async for chunk in chunks:
+                buffer += chunk
+                if len(buffer) >= self._part_size:
+                    await upload_part(bytes(buffer))
+                    buffer.clear()
+
+            if buffer:
+                await upload_part(bytes(buffer))
+
+            parts = "".join(
+                f"<Part><PartNumber>{i}</PartNumber><ETag>{etag}</ETag></Part>"
+                for i, etag in enumerate(etags, start=1)
+            )
+
+            body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>"
+            resp = await self._request(
+                "POST", key, {"uploadId": upload_id}, body.encode()
+            )
+            resp.release()
+
+        except:
+            with suppress(LogStoreError):
+                query = {"uploadId": upload_id}
+                resp = await self._request("DELETE", key, query, ok_statuses=(204, 404))
+                resp.release()
+            raise
+
+    async def save(self, key: str, chunks: AsyncIterator[bytes]) -> str:
+
+        buffer = bytearray()
+        chunks = chunks.__aiter__()
+
+        async for chunk in chunks:
+            buffer += chunk
+            if len(buffer) >= self._part_size:
+                await self._upload_multipart(key, bytes(buffer), chunks)
+                return key
+
+        await self._put_object(key, bytes(buffer))
+        return key
+
+    async def load(self, ref: str) -> AsyncIterator[bytes]:
+
+        resp = await self._request("GET", ref)
+
+        try:
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                yield chunk
+        except ClientError as e:
+            raise LogStoreError(f"Failed to load log '{ref}'. Reason - {e}") from e
+        finally:
+            resp.release()
+
+    async def delete(self, ref: str):
+        resp = await self._request("DELETE", ref, ok_statuses=(204, 404))
+        resp.release()
+
+    async def _list(self, query: Dict[str, str]):
+
+        #
+        # Lists objects page by page
+        # Yields parsed XML of each page
+        #
+
+        query = {"list-type": "2", **query}
+
+        while True:
+            resp = await self._request("GET", query=query)
+            root = ElementTree.fromstring(await resp.read())
+            yield root
+
+            token = _xml_find_text(root, "NextContinuationToken")
+            if _xml_find_text(root, "IsTruncated") != "true" or not token:
+                break
+
+            query = {**query, "continuation-token": token}
+
+    async def remove_saved_before(self, day: str):
+
+        #
+        # Logs are grouped by save date prefix, so
+        # only expired logs are listed and deleted
+        #
+
+        days = []
+        async for root in self._list({"delimiter": "/"}):
+            for el in _xml_find_all(root, "CommonPrefixes"):
+                prefix = _xml_find_text(el, "Prefix").rstrip("/")
+                if is_day_prefix(prefix) and prefix < day:
+                    days.append(prefix)
+
+        for prefix in days:
+            async for root in self._list({"prefix": prefix + "/"}):
+                for el in _xml_find_all(root, "Contents"):
+                    await self.delete(_xml_find_text(el, "Key"))
+
+            self._logger.debug("Removed logs saved at %s", prefix)
@@ -2,8 +2,7 @@ from __future__ import annotations
 
 import logging
 import sys
-from contextlib import contextmanager
-from typing import TYPE_CHECKING, Iterator
+from typing import TYPE_CHECKING
 
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
@@ -15,10 +14,14 @@ from starter.app.api.error_codes import E_INTERNAL_ERROR
 from starter.app.api.error_model import error_details
 from starter.app.background.manager import BackgroundTaskManager
 from starter.app.background.tasks.launch_exp import FuzzerSavedLaunchCleaner
+from starter.app.background.tasks.reconciliation import RegistryReconciler
+from starter.app.background.tasks.reservations import ExpiredReservationCleaner
 from starter.app.database.errors import DatabaseError
+from starter.app.database.launch_buffer import LaunchSaveBuffer
 from starter.app.external_api.errors import ExternalAPIError
 from starter.app.external_api.external_api import ExternalAPI
 from starter.app.kubernetes.client import KubernetesClient
+from starter.app.kubernetes.coordination import ShardCoordinator
 from starter.app.kubernetes.initializer import KubernetesInitializer
 from starter.app.kubernetes.pods.events.event_handler import PodEventHandler
 from starter.app.kubernetes.pods.events.event_listener import PodEventListener
@@ -26,7 +29,8 @@ from starter.app.kubernetes.pods.registry import FuzzerPodRegistry, pod_registry
 from starter.app.kubernetes.pools.events.event_handler import PoolEventHandler
 from starter.app.kubernetes.pools.events.event_listener import PoolEventListener
 from starter.app.kubernetes.pools.registry import PoolRegistry, pool_registry_init
-from starter.app.message_queue import MQAppState, mq_init
+from starter.app.log_store import ILogStore, log_store_init
+from starter.app.message_queue import MQAppState, MQOutbox, mq_init
 from starter.app.spec.agent import AgentSpecTemplate
 
 from . import api
@@ -35,6 +39,7 @@ from .settings import AppSettings, get_app_settings
 
 # from .utils.json import JSONResponse, json_dumps
 from .util.speedup.json import JSONResponse, dumps
+from .util.startup import StartupGraph
 
 if TYPE_CHECKING:
     from mqtransport import MQApp
@@ -81,6 +86,7 @@ def configure_exception_handlers(app):
 
 class AppState:
     k8s_client: KubernetesClient
+    coordinator: ShardCoordinator
     pod_listener: PodEventListener
     pool_listener: PoolEventListener
     agent_template: AgentSpecTemplate
@@ -89,168 +95,263 @@ class AppState:
     bg_task_mgr: BackgroundTaskManager
     external_api: ExternalAPI
     db: IDatabase
+    launch_buffer: LaunchSaveBuffer
+    log_store: ILogStore
     mq_app: MQApp
 
 
-def configure_startup_events(app: FastAPI, settings: AppSettings):
+def configure_lifecycle_events(app: FastAPI, settings: AppSettings):
 
-    logger = logging.getLogger("main")
+    #
+    # Startup stages are run concurrently according to their
+    # dependencies. Shutdown is done in reverse order
+    #
 
-    @contextmanager
-    def startup_helper(msg: str) -> Iterator[AppState]:
-        logger.info(f"{msg}...")
-        yield app.state
-        logger.info(f"{msg}... OK")
+    graph = StartupGraph()
+    state: AppState = app.state
 
-    @app.on_event("startup")
     async def verify_k8s_permissions():
-        with startup_helper("Verifying kubernetes"):
-            initializer = await KubernetesInitializer.create(settings)
-            await initializer.do_init()
+        initializer = await KubernetesInitializer.create(settings)
+        await initializer.do_init()
 
-    @app.on_event("startup")
     async def init_external_api():
-        with startup_helper("Creating external API sessions") as state:
-            state.external_api = await ExternalAPI.create(settings)
+        state.external_api = await ExternalAPI.create(settings)
+
+    async def exit_external_api():
+        await state.external_api.close()
 
-    @app.on_event("startup")
     async def init_k8s_client():
-        with startup_helper("Creating kubernetes client") as state:
-            state.k8s_client = await KubernetesClient.create(settings)
+        state.k8s_client = await KubernetesClient.create(settings)
+
+    async def exit_k8s_client():
+        await state.k8s_client.close()
+
+    async def init_coordinator():
+        state.coordinator = await ShardCoordinator.create(
+            settings, state.k8s_client  # fmt: skip
+        )
+
+        # Pods of owned shards only are loaded and watched
+        state.k8s_client.pod_informer.set_shards(state.coordinator.shards)
+
+    async def exit_coordinator():
+        await state.coordinator.close()
+
+    async def start_coordinator():
+        state.coordinator.add_reshard_handler(state.pod_listener.reshard)
+        await state.coordinator.start()
+
+    async def stop_coordinator():
+        await state.coordinator.stop()
 
-    @app.on_event("startup")
     async def init_database():
-        with startup_helper("Configuring database") as state:
-            state.db = await db_init(settings)
+        state.db = await db_init(settings)
 
-    @app.on_event("startup")
-    async def init_message_queue():
-        with startup_helper("Configuring message queue") as app_state:
-            mq_app = await mq_init(settings)
-            mq_state: MQAppState = mq_app.state
-            mq_state.settings = settings
-            mq_state.db = app_state.db
-            app_state.mq_app = mq_app
-            mq_state.fastapi = app
+    async def exit_database():
+        await state.db.close()
 
-    @app.on_event("startup")
-    async def init_pod_registry():
-        with startup_helper("Creating pod registry") as state:
-            state.pod_registry = await pod_registry_init(
-                state.k8s_client,  # fmt: skip
-            )
+    async def init_launch_buffer():
+        state.launch_buffer = await LaunchSaveBuffer.create(
+            state.db.launches, settings  # fmt: skip
+        )
 
-    @app.on_event("startup")
-    async def init_pool_registry():
-        with startup_helper("Creating pool registry") as state:
-            state.pool_registry = await pool_registry_init(
-                state.pod_registry, state.external_api  # fmt: skip
-            )
+    async def exit_launch_buffer():
+        await state.launch_buffer.close()
 
-    @app.on_event("startup")
-    async def init_pool_event_listener():
-        with startup_helper("Creating pool event listener") as state:
+    async def init_log_store():
+        state.log_store = await log_store_init(settings)
 
-            pool_event_handler = PoolEventHandler(
-                state.pool_registry,
-                state.k8s_client,
-            )
+    async def exit_log_store():
+        await state.log_store.close()
 
-            state.pool_listener = PoolEventListener(
-                pool_event_handler,
-                state.external_api,
-            )
+    async def init_message_queue():
 
-            await state.pool_listener.start()
+        outbox = await MQOutbox.create(state.db.unsent_mq, settings)
 
-    @app.on_event("startup")
-    async def init_pod_event_listener():
-        with startup_helper("Creating pod event listener") as state:
-
-            def create_pod_event_handler():
-                return PodEventHandler(
-                    state.mq_app,
-                    state.db,
-                    state.pool_registry,
-                    state.pod_registry,
-                    state.k8s_client,
-                    settings,
-                )
-
-            state.pod_listener = await PodEventListener.create(
-                create_pod_event_handler(),
-                settings,
-            )
+        try:
+            mq_app = await mq_init(settings, outbox)
+        except:
+            await outbox.close()
+            raise
 
-            await state.pod_listener.start()
+        mq_state: MQAppState = mq_app.state
+        mq_state.settings = settings
+        mq_state.db = state.db
+        state.mq_app = mq_app
+        mq_state.fastapi = app
 
-    @app.on_event("startup")
-    async def init_background_task_manager():
-        with startup_helper("Starting background tasks") as state:
-            bg_task_mgr = BackgroundTaskManager()
-            bg_task_mgr.add_task(FuzzerSavedLaunchCleaner(settings, state.db))
-            state.bg_task_mgr = bg_task_mgr
-            bg_task_mgr.start_tasks()
+    async def exit_message_queue():
+        mq_state: MQAppState = state.mq_app.state
+        await mq_state.pod_finished.close()
 
-    @app.on_event("startup")
-    async def import_unsent_messages_then_run():
-        with startup_helper("Loading MQ unsent messages") as state:
-            messages = await state.db.unsent_mq.load_unsent_messages()
-            state.mq_app.import_unsent_messages(messages)
-            await state.mq_app.start()
+        timeout = settings.environment.shutdown_timeout
+        await state.mq_app.shutdown(timeout)
 
+        # Save messages which have been accepted, but not sent
+        messages = state.mq_app.export_unsent_messages()
+        await mq_state.outbox.save_unsent_messages(messages)
+        await mq_state.outbox.close()
 
-def configure_shutdown_events(app: FastAPI, settings: AppSettings):
+    async def init_pod_registry():
+        state.pod_registry = await pod_registry_init(
+            state.k8s_client, settings  # fmt: skip
+        )
 
-    logger = logging.getLogger("main")
+    async def init_pool_registry():
+        state.pool_registry = await pool_registry_init(
+            state.pod_registry, state.external_api  # fmt: skip
+        )
 
-    @contextmanager
-    def shutdown_helper(msg: str) -> Iterator[AppState]:
-        logger.info(f"{msg}...")
-        yield app.state
-        logger.info(f"{msg}... OK")
+    async def init_pool_event_listener():
 
-    @app.on_event("shutdown")
-    async def exit_background_task_manager():
-        with shutdown_helper("Stopping background tasks") as state:
-            await state.bg_task_mgr.stop_tasks()
+        pool_event_handler = PoolEventHandler(
+            state.pool_registry,
+            state.k8s_client,
+        )
 
-    @app.on_event("shutdown")
-    async def exit_pod_event_listener():
-        with shutdown_helper("Closing pod event listener") as state:
-            await state.pod_listener.close()
+        state.pool_listener = PoolEventListener(
+            pool_event_handler,
+            state.external_api,
+        )
 
-    @app.on_event("shutdown")
-    async def exit_kubernetes_client():
-        with shutdown_helper("Closing kubernetes client session") as state:
-            await state.k8s_client.close()
+        await state.pool_listener.start()
 
-    @app.on_event("shutdown")
     async def exit_pool_event_listener():
-        with shutdown_helper("Closing pool event listener") as state:
-            await state.pool_listener.close()
+        await state.pool_listener.close()
 
-    @app.on_event("shutdown")
-    async def exit_external_api():
-        with shutdown_helper("Closing external API sessions") as state:
-            await state.external_api.close()
+    async def init_pod_event_listener():
+        def create_pod_event_handler():
+            return PodEventHandler(
+                state.mq_app,
+                state.launch_buffer,
+                state.log_store,
+                state.pool_registry,
+                state.pod_registry,
+                state.k8s_client,
+                settings,
+            )
 
-    @app.on_event("shutdown")
-    async def exit_message_queue():
-        with shutdown_helper("Closing message queue") as state:
-            timeout = settings.environment.shutdown_timeout
-            await state.mq_app.shutdown(timeout)
+        state.pod_listener = await PodEventListener.create(
+            create_pod_event_handler(),
+            state.k8s_client.pod_informer,
+            settings,
+        )
 
-    @app.on_event("shutdown")
-    async def export_unsent_messages():
-        with shutdown_helper("Saving MQ unsent messages") as state:
-            messages = state.mq_app.export_unsent_messages()
-            await state.db.unsent_mq.save_unsent_messages(messages)
+        await state.pod_listener.start()
+
+    async def exit_pod_event_listener():
+        await state.pod_listener.close()
+
+    async def init_background_task_manager():
+        bg_task_mgr = BackgroundTaskManager()
+        bg_task_mgr.add_task(
+            FuzzerSavedLaunchCleaner(
+                settings, state.db, state.log_store, state.coordinator
+            )
+        )
+        bg_task_mgr.add_task(ExpiredReservationCleaner(settings, state.pool_registry))
+        bg_task_mgr.add_task(
+            RegistryReconciler(
+                settings,
+                state.pod_listener,
+                state.pod_registry,
+                state.pool_registry,
+                state.external_api,
+            )
+        )
+        state.bg_task_mgr = bg_task_mgr
+        bg_task_mgr.start_tasks()
+
+    async def exit_background_task_manager():
+        await state.bg_task_mgr.stop_tasks()
+
+    async def run_then_replay_unsent_messages():
+        mq_state: MQAppState = state.mq_app.state
+        await state.mq_app.start()
+        count = await mq_state.outbox.replay()
+        logging.getLogger("mq").info("Resent %d unsent messages", count)
+
+    # fmt: off
+    graph.add_stage(
+        "k8s_verify", [],
+        verify_k8s_permissions, "Verifying kubernetes",
+    )
+    graph.add_stage(
+        "external_api", [],
+        init_external_api, "Creating external API sessions",
+        exit_external_api, "Closing external API sessions",
+    )
+    graph.add_stage(
+        "k8s_client", [],
+        init_k8s_client, "Creating kubernetes client",
+        exit_k8s_client, "Closing kubernetes client session",
+    )
+    graph.add_stage(
+        "coordinator", ["k8s_verify", "k8s_client"],
+        init_coordinator, "Joining replicas of service",
+        exit_coordinator, "Leaving replicas of service",
+    )
+    graph.add_stage(
+        "database", [],
+        init_database, "Configuring database",
+        exit_database, "Closing database",
+    )
+    graph.add_stage(
+        "launch_buffer", ["database"],
+        init_launch_buffer, "Creating launch save buffer",
+        exit_launch_buffer, "Saving buffered launches",
+    )
+    graph.add_stage(
+        "log_store", [],
+        init_log_store, "Configuring log store",
+        exit_log_store, "Closing log store",
+    )
+    graph.add_stage(
+        "message_queue", ["database"],
+        init_message_queue, "Configuring message queue",
+        exit_message_queue, "Closing message queue",
+    )
+    graph.add_stage(
+        "pod_registry", ["k8s_verify", "k8s_client", "coordinator"],
+        init_pod_registry, "Creating pod registry",
+    )
+    graph.add_stage(
+        "pool_registry", ["pod_registry", "external_api"],
+        init_pool_registry, "Creating pool registry",
+    )
+    graph.add_stage(
+        "pool_listener", ["pool_registry", "k8s_client", "external_api"],
+        init_pool_event_listener, "Creating pool event listener",
+        exit_pool_event_listener, "Closing pool event listener",
+    )
+    graph.add_stage(
+        "pod_listener", ["pool_registry", "message_queue", "launch_buffer", "log_store"],
+        init_pod_event_listener, "Creating pod event listener",
+        exit_pod_event_listener, "Closing pod event listener",
+    )
+    graph.add_stage(
+        "coordinator_run", ["coordinator", "pod_listener"],
+        start_coordinator, "Starting lease renewal",
+        stop_coordinator, "Stopping lease renewal",
+    )
+    graph.add_stage(
+        "background_tasks", ["database", "log_store", "pool_listener", "pod_listener"],
+        init_background_task_manager, "Starting background tasks",
+        exit_background_task_manager, "Stopping background tasks",
+    )
+    graph.add_stage(
+        "message_queue_run", ["message_queue", "pod_listener", "pool_listener"],
+        run_then_replay_unsent_messages, "Running MQ app, resending unsent messages",
+    )
+    # fmt: on
+
+    @app.on_event("startup")
+    async def startup():
+        await graph.startup()
 
     @app.on_event("shutdown")
-    async def exit_database():
-        with shutdown_helper("Closing database") as state:
-            await state.db.close()
+    async def shutdown():
+        await graph.shutdown()
 
 
 def configure_routes(app: FastAPI):
@@ -305,7 +406,6 @@ def create_app():
     logging.info("%-16s %s", "GIT_BRANCH", settings.environment.git_branch)
 
     configure_routes(app)
-    configure_startup_events(app, settings)
-    configure_shutdown_events(app, settings)
+    configure_lifecycle_events(app, settings)
     configure_exception_handlers(app)
     return app
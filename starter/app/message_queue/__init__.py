@@ -1,7 +1,9 @@
 from .instance import MQApp, MQAppState, mq_init
+from .outbox import MQOutbox
 
 __all__ = [
     "MQApp",
     "MQAppState",
+    "MQOutbox",
     "mq_init",
 ]
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from mqtransport.participants import Producer
+
+    from starter.app.settings import AppSettings
+
+    from .outbox import MQOutbox
+
+
+class CoalescingProducer:
+
+    """
+    Groups messages produced within a short window and sends them
+    as one batched message with 'items' field. Batches are sent
+    one by one in order of producing, so the order of messages is
+    preserved. Window with one message is sent by original producer,
+    so consumers which don't know batches still receive single ones.
+    Batch size of 1 disables grouping
+    """
+
+    _outbox: MQOutbox
+    _producer: Producer
+    _batch_producer: Producer
+    _logger: logging.Logger
+    _pending: List[Tuple[dict, asyncio.Future]]
+    _wakeup_event: asyncio.Event
+    _full_event: asyncio.Event
+    _flush_task: Optional[asyncio.Task]
+    _batch_size: int
+    _batch_delay: float
+    _is_closed: bool
+
+    def _init(
+        self,
+        outbox: MQOutbox,
+        producer: Producer,
+        batch_producer: Producer,
+        settings: AppSettings,
+    ):
+        self._outbox = outbox
+        self._producer = producer
+        self._batch_producer = batch_producer
+        self._logger = logging.getLogger("mq.coalescing")
+        self._batch_size = settings.message_queue.produce_batch_size
+        self._batch_delay = settings.message_queue.produce_batch_delay_ms / 1000
+
+        assert self._batch_size > 0, "Batch size must be greater than zero"
+
+        self._pending = []
+        self._wakeup_event = asyncio.Event()
+        self._full_event = asyncio.Event()
+
+        loop = asyncio.get_running_loop()
+        self._flush_task = loop.create_task(self._flush_loop())
+        self._is_closed = False
+
+    @staticmethod
+    async def create(
+        outbox: MQOutbox,
+        producer: Producer,
+        batch_producer: Producer,
+        settings: AppSettings,
+    ):
+        _self = CoalescingProducer()
+        _self._init(outbox, producer, batch_producer, settings)
+        return _self
+
+    async def produce(self, **kwargs):
+
+        """Waits until message has been sent as part of batch"""
+
+        assert not self._is_closed, "Producer has been closed"
+
+        if self._batch_size == 1:
+            await self._outbox.produce(self._producer, **kwargs)
+            return
+
+        body = self._producer.Model(**kwargs).dict()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((body, future))
+
+        self._wakeup_event.set()
+        if len(self._pending) >= self._batch_size:
+            self._full_event.set()
+
+        await future
+
+    async def _send_batch(self):
+
+        batch = self._pending[: self._batch_size]
+        del self._pending[: self._batch_size]
+
+        if len(self._pending) < self._batch_size:
+            self._full_event.clear()
+
+        try:
+            if len(batch) == 1:
+                body, _ = batch[0]
+                await self._outbox.produce(self._producer, **body)
+            else:
+                items = [body for body, _ in batch]
+                await self._outbox.produce(self._batch_producer, items=items)
+
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def _flush(self):
+        while self._pending:
+            await self._send_batch()
+
+    async def _flush_loop(self):
+
+        #
+        # Window starts with the first message. Batch is sent
+        # when window is over or when batch becomes full
+        #
+
+        while not self._is_closed:
+
+            await self._wakeup_event.wait()
+
+            try:
+                await asyncio.wait_for(self._full_event.wait(), self._batch_delay)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup_event.clear()
+
+            try:
+                await self._flush()
+            except:
+                self._logger.exception("Unhandled exception")
+
+    async def close(self):
+
+        """Sends remaining messages and stops flushing"""
+
+        assert not self._is_closed, "Closed twice"
+        self._is_closed = True
+
+        self._wakeup_event.set()
+        self._full_event.set()
+        await self._flush_task
+        await self._flush()
+
+    def __del__(self):
+        if not getattr(self, "_is_closed", True):
+            self._logger.error("Coalescing producer has not been closed")
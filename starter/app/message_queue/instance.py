@@ -5,21 +5,26 @@ from typing import TYPE_CHECKING
 from fastapi import FastAPI
 from mqtransport import MQApp, SQSApp
 
-from .scheduler import MP_PodFinished
+from .coalescing import CoalescingProducer
+from .scheduler import MP_PodFinished, MP_PodsFinished
 
 if TYPE_CHECKING:
     from ..database.abstract import IDatabase
     from ..kubernetes.client import KubernetesClient
     from ..settings import AppSettings
+    from .outbox import MQOutbox
 
 
 class Producers:
     sch_pod_finished: MP_PodFinished
+    sch_pods_finished: MP_PodsFinished
 
 
 class MQAppState:
     k8s_client: KubernetesClient
     producers: Producers
+    outbox: MQOutbox
+    pod_finished: CoalescingProducer
     settings: AppSettings
     fastapi: FastAPI
     db: IDatabase
@@ -28,14 +33,16 @@ class MQAppState:
 class MQAppInitializer:
 
     _settings: AppSettings
+    _outbox: MQOutbox
     _app: MQApp
 
     @property
     def app(self):
         return self._app
 
-    def __init__(self, settings: AppSettings):
+    def __init__(self, settings: AppSettings, outbox: MQOutbox):
         self._settings = settings
+        self._outbox = outbox
         self._app = None
 
     async def do_init(self):
@@ -51,6 +58,8 @@ class MQAppInitializer:
             await self._app.shutdown()
             raise
 
+        await self._create_coalescing_producers()
+
     async def _create_mq_app(self):
 
         mq_broker = self._settings.message_queue.broker.lower()
@@ -74,21 +83,39 @@ class MQAppInitializer:
     def _setup_scheduler_communication(self):
 
         state: MQAppState = self.app.state
+        queues = self._settings.message_queue.queues
         och = self._och_scheduler
 
         # Outcoming messages
         producers = Producers()
         producers.sch_pod_finished = MP_PodFinished()
+        producers.sch_pods_finished = MP_PodsFinished()
         och.add_producer(producers.sch_pod_finished)
+        och.add_producer(producers.sch_pods_finished)
+        self._outbox.register(queues.scheduler, producers.sch_pod_finished)
+        self._outbox.register(queues.scheduler, producers.sch_pods_finished)
 
         state.producers = producers
+        state.outbox = self._outbox
+
+    async def _create_coalescing_producers(self):
+
+        state: MQAppState = self.app.state
+        producers = state.producers
+
+        state.pod_finished = await CoalescingProducer.create(
+            self._outbox,
+            producers.sch_pod_finished,
+            producers.sch_pods_finished,
+            self._settings,
+        )
 
     async def _configure_channels(self):
         await self._create_other_channels()
         self._setup_scheduler_communication()
 
 
-async def mq_init(settings: AppSettings):
-    initializer = MQAppInitializer(settings)
+async def mq_init(settings: AppSettings, outbox: MQOutbox):
+    initializer = MQAppInitializer(settings, outbox)
     await initializer.do_init()
     return initializer.app
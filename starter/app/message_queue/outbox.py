@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from starter.app.database.errors import DatabaseError
+
+if TYPE_CHECKING:
+    from mqtransport.participants import Producer
+
+    from starter.app.database.abstract import IUnsentMessages
+    from starter.app.settings import AppSettings
+
+
+class MQOutbox:
+
+    """
+    Write-ahead log of produced MQ messages. Message is appended to
+    database before it's passed to producer and deleted after producer
+    has accepted it. Messages left in outbox after crash are produced
+    again on next start. Appends and deletes are batched: concurrent
+    producers wait for the same database request
+    """
+
+    _unsent_mq: IUnsentMessages
+    _logger: logging.Logger
+    _queues: Dict[str, str]
+    _producers: Dict[str, Producer]
+    _appends: List[Tuple[dict, asyncio.Future]]
+    _deletes: List[str]
+    _wakeup_event: asyncio.Event
+    _flush_task: Optional[asyncio.Task]
+    _flush_interval: int
+    _last_delete_time: float
+    _batch_size: int
+    _last_order: int
+    _is_closed: bool
+
+    def _init(self, unsent_mq: IUnsentMessages, settings: AppSettings):
+
+        self._unsent_mq = unsent_mq
+        self._logger = logging.getLogger("mq.outbox")
+        self._batch_size = settings.message_queue.outbox_batch_size
+        self._flush_interval = settings.message_queue.outbox_flush_interval
+
+        assert self._batch_size > 0, "Batch size must be greater than zero"
+
+        self._queues = {}
+        self._producers = {}
+        self._appends = []
+        self._deletes = []
+        self._last_order = 0
+        self._wakeup_event = asyncio.Event()
+
+        loop = asyncio.get_running_loop()
+        self._last_delete_time = loop.time()
+        self._flush_task = loop.create_task(self._flush_loop())
+        self._is_closed = False
+
+    @staticmethod
+    async def create(unsent_mq: IUnsentMessages, settings: AppSettings):
+        _self = MQOutbox()
+        _self._init(unsent_mq, settings)
+        return _self
+
+    def register(self, queue: str, producer: Producer):
+        """Registers producer whose messages are sent to given queue"""
+        self._queues[producer.name] = queue
+        self._producers[producer.name] = producer
+
+    def _next_order(self):
+        # Keep order increasing even if clock goes backwards
+        self._last_order = max(self._last_order + 1, time.time_ns())
+        return self._last_order
+
+    def _make_message(self, queue: str, name: str, body: dict):
+        return {
+            "queue": queue,
+            "name": name,
+            "body": body,
+            "order": self._next_order(),
+        }
+
+    async def _append(self, message: dict) -> Optional[str]:
+        future = asyncio.get_running_loop().create_future()
+        self._appends.append((message, future))
+        self._wakeup_event.set()
+        return await future
+
+    def _delete(self, id: Optional[str]):
+
+        if id is None:
+            return
+
+        self._deletes.append(id)
+        if len(self._deletes) >= self._batch_size:
+            self._wakeup_event.set()
+
+    async def produce(self, producer: Producer, **kwargs):
+
+        """Saves message to outbox, then passes it to producer"""
+
+        assert not self._is_closed, "Outbox has been closed"
+
+        queue = self._queues[producer.name]
+        body = producer.Model(**kwargs).dict()
+        id = await self._append(self._make_message(queue, producer.name, body))
+
+        # If producer fails, message
+        # is sent again on next start
+        await producer.produce(**kwargs)
+        self._delete(id)
+
+    async def save_unsent_messages(self, messages: Dict[str, list]):
+
+        """Saves messages exported from MQ app, which have not been sent"""
+
+        await asyncio.gather(
+            *[
+                self._append(self._make_message(queue, msg["name"], msg["body"]))
+                for queue, queue_messages in messages.items()
+                for msg in queue_messages
+            ]
+        )
+
+    async def _replay_message(self, message: dict):
+
+        producer = self._producers.get(message["name"])
+        if producer is None:
+            msg = "No producer for unsent message '%s'. It's kept in outbox"
+            self._logger.error(msg, message["name"])
+            return False
+
+        # Like produce: message is deleted only after producer accepts it
+        await producer.produce(**message["body"])
+        self._delete(message["id"])
+        return True
+
+    async def replay(self) -> int:
+
+        """
+        Produces again messages left in outbox by previous run.
+        Must be called when MQ app is running. Messages are streamed
+        from database batch by batch. Returns count of sent messages
+        """
+
+        count = 0
+        batch: List[dict] = []
+        messages = self._unsent_mq.load_unsent_messages(self._batch_size)
+
+        async def replay_batch():
+            nonlocal count
+            results = await asyncio.gather(*map(self._replay_message, batch))
+            count += sum(results)
+            batch.clear()
+
+        async for message in messages:
+            batch.append(message)
+            if len(batch) >= self._batch_size:
+                await replay_batch()
+
+        if batch:
+            await replay_batch()
+
+        return count
+
+    async def _flush_appends(self):
+
+        while self._appends:
+
+            batch = self._appends[: self._batch_size]
+            del self._appends[: self._batch_size]
+
+            #
+            # Producers wait for their messages to be appended.
+            # On any failure messages are still produced,
+            # but may be lost on crash
+            #
+
+            ids: List[Optional[str]] = [None] * len(batch)
+
+            try:
+                appended = await self._unsent_mq.append_messages([m for m, _ in batch])
+                assert len(appended) == len(batch), "Not all messages appended"
+                ids = appended
+
+            except DatabaseError as e:
+                msg = "Failed to append %d messages to outbox. Reason - %s"
+                self._logger.error(msg, len(batch), e)
+
+            except Exception:
+                msg = "Failed to append %d messages to outbox"
+                self._logger.exception(msg, len(batch))
+
+            finally:
+                for (_, future), id in zip(batch, ids):
+                    if future.cancelled():
+                        self._delete(id)
+                    elif not future.done():
+                        future.set_result(id)
+
+    async def _flush_deletes(self, full_only: bool = False):
+
+        min_size = self._batch_size if full_only else 1
+
+        while len(self._deletes) >= min_size:
+
+            batch = self._deletes[: self._batch_size]
+
+            try:
+                await self._unsent_mq.delete_messages(batch)
+
+            except DatabaseError as e:
+                msg = "Failed to delete %d messages from outbox. Reason - %s"
+                self._logger.error(msg, len(batch), e)
+                return False
+
+            del self._deletes[: len(batch)]
+
+        return True
+
+    async def _flush_loop(self):
+
+        #
+        # Appends are written as soon as possible, because
+        # producers are waiting for them. Deletes are not urgent,
+        # so they are written in full batches or by interval
+        #
+
+        loop = asyncio.get_running_loop()
+
+        while not self._is_closed:
+
+            try:
+                await asyncio.wait_for(
+                    self._wakeup_event.wait(),
+                    self._flush_interval,
+                )
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup_event.clear()
+
+            try:
+                await self._flush_appends()
+
+                now = loop.time()
+                interval_passed = now - self._last_delete_time >= self._flush_interval
+                await self._flush_deletes(full_only=not interval_passed)
+
+                if interval_passed:
+                    self._last_delete_time = now
+
+            except:
+                self._logger.exception("Unhandled exception")
+
+    async def close(self):
+
+        """Stops periodic flushing and writes remaining changes"""
+
+        assert not self._is_closed, "Closed twice"
+        self._is_closed = True
+
+        self._wakeup_event.set()
+        await self._flush_task
+
+        await self._flush_appends()
+        if not await self._flush_deletes():
+            msg = "Failed to delete %d sent messages from outbox. They will be resent"
+            self._logger.error(msg, len(self._deletes))
+
+    def __del__(self):
+        if not getattr(self, "_is_closed", True):
+            self._logger.error("MQ outbox has not been closed")
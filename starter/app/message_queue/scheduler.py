@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+from typing import List
+
 from mqtransport.participants import Producer
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 ########################################
 # Producers
@@ -30,3 +32,13 @@ class MP_PodFinished(Producer):
         # Other
         success: bool
         """ Whether launch was successful or not"""
+
+
+class MP_PodsFinished(Producer):
+
+    """Batch of pod finish notifications in order of finishing"""
+
+    name = "starter.pods.finished.batch"
+
+    class Model(BaseModel):
+        items: List[MP_PodFinished.Model] = Field(min_items=1)
@@ -1,34 +1,126 @@
-from prometheus_client.metrics import Counter, Gauge
+from prometheus_client.metrics import Counter, Gauge, Histogram
 
 failed_pods_evicted_desc = "Count of pods which exhausted all available disk space"
-failed_pods_evicted = Counter("failed_pods_evicted", failed_pods_evicted_desc)
+failed_pods_evicted = Counter(
+    "failed_pods_evicted", failed_pods_evicted_desc, ["pool_id"]
+)
 
 failed_pods_oom_killed_desc = "Count of pods which exhausted all available RAM"
-failed_pods_oom_killed = Counter("failed_pods_oom_killed", failed_pods_oom_killed_desc)
+failed_pods_oom_killed = Counter(
+    "failed_pods_oom_killed", failed_pods_oom_killed_desc, ["pool_id"]
+)
 
 failed_pods_timeout_desc = "Count of pods which exceeded their run time"
-failed_pods_timeout = Counter("failed_pods_deadline_exceeded", failed_pods_timeout_desc)
+failed_pods_timeout = Counter(
+    "failed_pods_deadline_exceeded", failed_pods_timeout_desc, ["pool_id"]
+)
 
 failed_pods_other_desc = "Count of pods which failed with unknown reasons"
-failed_pods_other = Counter("failed_pods_other", failed_pods_other_desc)
+failed_pods_other = Counter("failed_pods_other", failed_pods_other_desc, ["pool_id"])
 
 pending_pods_desc = "Count of pods which are in pending state now"
-pending_pods = Gauge("pending_pods", pending_pods_desc)
+pending_pods = Gauge("pending_pods", pending_pods_desc, ["pool_id"])
 
 running_pods_desc = "Count of pods which are in running state now. Must be > 0"
-running_pods = Gauge("running_pods", running_pods_desc)
+running_pods = Gauge("running_pods", running_pods_desc, ["pool_id"])
 
 succeeded_pods_desc = "Count of pods which are in completed state now. Must be 0"
-succeeded_pods = Gauge("succeeded_pods", succeeded_pods_desc)
+succeeded_pods = Gauge("succeeded_pods", succeeded_pods_desc, ["pool_id"])
 
 failed_pods_desc = "Count of pods which are in failed state now. Must be 0"
-failed_pods = Gauge("failed_pods", failed_pods_desc)
+failed_pods = Gauge("failed_pods", failed_pods_desc, ["pool_id"])
 
 unknown_pods_desc = "Count of pods which are in unknown state now. Must be 0"
-unknown_pods = Gauge("unknown_pods", unknown_pods_desc)
+unknown_pods = Gauge("unknown_pods", unknown_pods_desc, ["pool_id"])
+
+pod_launch_to_running_desc = "Time from pod creation to running phase in seconds"
+pod_launch_to_running = Histogram(
+    "pod_launch_to_running_seconds",
+    pod_launch_to_running_desc,
+    ["pool_id"],
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600),
+)
+
+pod_terminate_to_notified_desc = (
+    "Time from agent exit to scheduler notification in seconds"
+)
+pod_terminate_to_notified = Histogram(
+    "pod_terminate_to_notified_seconds",
+    pod_terminate_to_notified_desc,
+    ["pool_id"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300),
+)
+
+pool_fragmentation_desc = "Share of free pool resources which can't be used by one pod"
+pool_fragmentation = Gauge(
+    "pool_fragmentation", pool_fragmentation_desc, ["pool_id", "resource"]
+)
+
+pool_admission_waiters_desc = "Count of launches waiting for pool resources"
+pool_admission_waiters = Gauge(
+    "pool_admission_waiters", pool_admission_waiters_desc, ["pool_id"]
+)
+
+pool_reserved_resources_desc = "Pool resources reserved for pods being created"
+pool_reserved_resources = Gauge(
+    "pool_reserved_resources", pool_reserved_resources_desc, ["pool_id", "resource"]
+)
+
+pool_committed_resources_desc = "Pool resources used by created pods"
+pool_committed_resources = Gauge(
+    "pool_committed_resources", pool_committed_resources_desc, ["pool_id", "resource"]
+)
+
+pool_reservations_expired_desc = "Count of reservations which expired before commit"
+pool_reservations_expired = Counter(
+    "pool_reservations_expired", pool_reservations_expired_desc, ["pool_id"]
+)
+
+registry_drift_corrections_desc = "Count of registry corrections made by reconciliation"
+registry_drift_corrections = Counter(
+    "registry_drift_corrections", registry_drift_corrections_desc, ["kind"]
+)
+
+registry_resource_drift_desc = (
+    "Accounted minus actual pool usage found by reconciliation"
+)
+registry_resource_drift = Gauge(
+    "registry_resource_drift", registry_resource_drift_desc, ["pool_id", "resource"]
+)
+
+replica_is_leader_desc = "Whether replica holds leader lease"
+replica_is_leader = Gauge("replica_is_leader", replica_is_leader_desc)
+
+replica_members_desc = "Count of live replicas sharing pools"
+replica_members = Gauge("replica_members", replica_members_desc)
+
+replica_owned_shards_desc = "Count of pool shards owned by replica"
+replica_owned_shards = Gauge("replica_owned_shards", replica_owned_shards_desc)
+
+shard_rebalances_desc = "Count of changes of pool shards owned by replica"
+shard_rebalances = Counter("shard_rebalances", shard_rebalances_desc)
+
+lease_errors_desc = "Count of errors of lease renewal and membership checks"
+lease_errors = Counter("lease_errors", lease_errors_desc)
+
+pods_pending_deletion_desc = "Count of displaced pods waiting for delayed deletion"
+pods_pending_deletion = Gauge("pods_pending_deletion", pods_pending_deletion_desc)
+
+pods_deleted_by_timer_desc = "Count of displaced pods deleted after delay"
+pods_deleted_by_timer = Counter("pods_deleted_by_timer", pods_deleted_by_timer_desc)
 
 k8s_listener_errors_desc = "Count of errors occurred during k8s events monitoring"
 k8s_listener_errors = Counter("k8s_listener_unhandled_errors", k8s_listener_errors_desc)
 
 pod_event_errors_desc = "Count of errors occurred during fuzzer pods events monitoring"
 pod_event_errors = Counter("pod_event_loop_unhandled_errors", pod_event_errors_desc)
+
+startup_stage_duration_desc = "Duration of application startup stage in seconds"
+startup_stage_duration = Gauge(
+    "startup_stage_duration_seconds", startup_stage_duration_desc, ["stage"]
+)
+
+shutdown_stage_duration_desc = "Duration of application shutdown stage in seconds"
+shutdown_stage_duration = Gauge(
+    "shutdown_stage_duration_seconds", shutdown_stage_duration_desc, ["stage"]
+)
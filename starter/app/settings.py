@@ -1,10 +1,11 @@
+import socket
 from contextlib import suppress
 from typing import Any, Dict, Optional
 
 from prometheus_client import Enum
 from pydantic import AnyHttpUrl, AnyUrl, BaseModel
 from pydantic import BaseSettings as _BaseSettings
-from pydantic import Field, root_validator, validator
+from pydantic import Field, PositiveFloat, root_validator, validator
 
 from starter.app.util.datetime import duration_in_seconds
 from starter.app.util.resources import CpuResources, RamResources
@@ -90,6 +91,24 @@ class PodOutputSaveMode(str, Enum):
     """ Store output of each pod """
 
 
+class PodInitCheckMode(str, Enum):
+
+    fast = "Fast"
+    """ Check pod permissions with access reviews (no pods created) """
+
+    full = "Full"
+    """ Run test pod and check each operation end-to-end """
+
+
+class PodWatchParseMode(str, Enum):
+
+    slim = "Slim"
+    """ Decode only fields needed to track pod state """
+
+    full = "Full"
+    """ Deserialize events into complete V1Pod models """
+
+
 class FuzzerPodSettings(BaseSettings):
 
     min_work_time: int
@@ -116,6 +135,54 @@ class FuzzerPodSettings(BaseSettings):
     launch_info_cleanup_interval: int
     """ How often to do fuzzer saved launch info cleanup """
 
+    launch_info_cleanup_batch_size: int = 1000
+    """ Max count of saved launches removed with one query """
+
+    launch_concurrency: int = 16
+    """ Max count of pods created concurrently in batch launch """
+
+    admission_max_wait: int = 60
+    """ Max time launch can wait for pool resources in admission queue """
+
+    reservation_ttl: int = 120
+    """ Time to create pod, after which its reserved resources are freed """
+
+    reservation_cleanup_interval: int = 10
+    """ How often to free resources of expired reservations """
+
+    reconcile_interval: int = 300
+    """ How often to reconcile registries with kubernetes and pool manager """
+
+    tenant_weights: Dict[str, PositiveFloat] = {}
+    """ Fair-share weights of projects or users (by id). Default is 1 """
+
+    event_concurrency: int = 32
+    """ Max count of pods whose events are handled concurrently """
+
+    bulk_concurrency: int = 16
+    """ Max count of concurrent k8s API calls in bulk pod operations """
+
+    init_check_mode: PodInitCheckMode = PodInitCheckMode.fast
+    """ How to verify kubernetes permissions at startup """
+
+    watch_parse_mode: PodWatchParseMode = PodWatchParseMode.slim
+    """ How to parse pod events received from kubernetes watch """
+
+    log_tail_lines: Optional[int] = 10000
+    """ Max count of last log lines saved for each container """
+
+    log_limit_bytes: Optional[int] = 1024 * 1024
+    """ Max size of log saved for each container (bytes) """
+
+    launch_save_batch_size: int = 100
+    """ Max count of launches saved to database with one request """
+
+    launch_save_interval: int = 1
+    """ How often to save buffered launches to database """
+
+    launch_save_max_pending: int = 10000
+    """ Max count of buffered launches. Saving waits if buffer is full """
+
     class Config:
         env_prefix = "POD_"
 
@@ -123,6 +190,11 @@ class FuzzerPodSettings(BaseSettings):
         "min_work_time",
         "launch_info_retention_period",
         "launch_info_cleanup_interval",
+        "launch_save_interval",
+        "admission_max_wait",
+        "reservation_ttl",
+        "reservation_cleanup_interval",
+        "reconcile_interval",
         pre=True,
     )
     def validate_duration(value: Optional[str]):
@@ -137,6 +209,54 @@ class FuzzerPodSettings(BaseSettings):
         return RamResources.from_string(value or "")
 
 
+class ShardingSettings(BaseSettings):
+
+    enabled: bool = False
+    """ Run several replicas, each owning a consistent-hash shard of pools """
+
+    replica_id: str = Field(default_factory=socket.gethostname)
+    """ Unique name of replica. Pod name (hostname) by default """
+
+    replica_url: Optional[AnyHttpUrl]
+    """ Base URL of replica, where launches for its pools are redirected """
+
+    lease_prefix: str = "starter"
+    """ Prefix of kubernetes leases used for membership and leader election """
+
+    lease_duration: int = 15
+    """ Time after which lease of replica which stopped renewing it expires """
+
+    renew_interval: int = 5
+    """ How often to renew leases and check membership of replicas """
+
+    shard_count: int = Field(256, ge=1)
+    """ Count of shards pools are hashed to. Must be the same for all replicas """
+
+    virtual_nodes: int = Field(64, ge=1)
+    """ Count of points of each replica on consistent-hash ring """
+
+    class Config:
+        env_prefix = "SHARDING_"
+
+    @validator("lease_duration", "renew_interval", pre=True)
+    def validate_duration(value: Optional[str]):
+        return duration_in_seconds(value or "")
+
+    @root_validator(skip_on_failure=True)
+    def check_sharding_settings(cls, data: Dict[str, Any]):
+
+        if not data["enabled"]:
+            return data
+
+        if data.get("replica_url") is None:
+            raise ValueError("Variable 'replica_url' must be set if sharding enabled")
+
+        if data["renew_interval"] >= data["lease_duration"]:
+            raise ValueError("Lease must be renewed more often than it expires")
+
+        return data
+
+
 class ContainerRegistrySettings(BaseSettings):
 
     url: str
@@ -163,9 +283,63 @@ class MessageQueueSettings(BaseSettings):
     queues: MessageQueues
     broker: str = Field(regex=r"^sqs$")
 
+    outbox_batch_size: int = 100
+    """ Max count of outbox messages written or deleted with one request """
+
+    outbox_flush_interval: int = 1
+    """ How often to delete messages accepted by broker from outbox """
+
+    produce_batch_size: int = Field(1, ge=1, le=10)
+    """ Max count of notifications sent in one message (1 disables batching) """
+
+    produce_batch_delay_ms: int = 50
+    """ How long to wait for other notifications to send them in one batch """
+
     class Config:
         env_prefix = "MQ_"
 
+    @validator("outbox_flush_interval", pre=True)
+    def validate_duration(value: Optional[str]):
+        return duration_in_seconds(value or "")
+
+
+class LogStoreSettings(BaseSettings):
+
+    engine: str = Field("fs", regex=r"^(fs|s3)$")
+    """ Where to store pod logs: local filesystem or S3-compatible storage """
+
+    fs_path: Optional[str] = "/tmp/starter-logs"
+    """ Directory for pod logs (engine 'fs') """
+
+    s3_url: Optional[AnyHttpUrl]
+    """ S3 endpoint. Path-style requests are used (engine 's3') """
+
+    s3_bucket: Optional[str]
+    s3_region: str = "us-east-1"
+    s3_access_key: Optional[str]
+    s3_secret_key: Optional[str]
+
+    s3_part_size: int = 8 * 1024 * 1024
+    """ Size of multipart upload part (bytes). Not less than 5 MiB """
+
+    class Config:
+        env_prefix = "LOG_STORE_"
+
+    @root_validator(skip_on_failure=True)
+    def check_engine_settings(cls, data: Dict[str, Any]):
+
+        if data["engine"] == "fs":
+            required = ["fs_path"]
+        else:
+            required = ["s3_url", "s3_bucket", "s3_access_key", "s3_secret_key"]
+
+        missing = [name for name in required if data.get(name) is None]
+        if missing:
+            engine = data["engine"]
+            raise ValueError(f"Variables must be set for engine '{engine}': {missing}")
+
+        return data
+
 
 class APIEndpoints(BaseSettings):
     pool_manager: AnyHttpUrl
@@ -182,6 +356,8 @@ class AppSettings(BaseModel):
     environment: EnvironmentSettings
     message_queue: MessageQueueSettings
     api_endpoints: APIEndpoints
+    log_store: LogStoreSettings
+    sharding: ShardingSettings
 
 
 _app_settings = None
@@ -200,6 +376,8 @@ def get_app_settings() -> AppSettings:
             fuzzer_pod=FuzzerPodSettings(),
             environment=EnvironmentSettings(),
             api_endpoints=APIEndpoints(),
+            log_store=LogStoreSettings(),
+            sharding=ShardingSettings(),
         )
 
     return _app_settings
@@ -1,9 +1,12 @@
 from . import errors
+from .compiled import CompiledAgentSpec, CompiledAgentSpecTemplate
 from .spec import AgentSpec
 from .template import AgentSpecTemplate
 
 __all__ = [
     "AgentSpec",
     "AgentSpecTemplate",
+    "CompiledAgentSpec",
+    "CompiledAgentSpecTemplate",
     "errors",
 ]
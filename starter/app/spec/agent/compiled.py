@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+from typing import Dict, List, Tuple
+
+from ..base.errors import SpecValidationError
+from ..base.spec import spec_validate
+from .errors import AgentSpecValidationError
+from .spec import AgentSpec
+
+
+class _ContainerSlots:
+
+    """Positions of runtime fields in container"""
+
+    index: int
+    env_index: Dict[str, int]
+    env_runtime: Tuple[int, ...]
+    env_count: int
+
+    def __init__(self, index: int, container: dict):
+
+        env_list: List[dict] = container["env"]
+        self.env_index = {env["name"]: i for i, env in enumerate(env_list)}
+        self.env_count = len(env_list)
+        self.index = index
+
+        def is_runtime(env: dict):
+            return "valueFrom" not in env and env.get("value") is None
+
+        self.env_runtime = tuple(
+            i for i, env in enumerate(env_list) if is_runtime(env)  # fmt: skip
+        )
+
+
+class CompiledAgentSpec(AgentSpec):
+
+    """
+    Agent specification produced by compiled template.
+    Static parts of specification are shared with template
+    and must never be modified. Only runtime fields are cloned
+    """
+
+    _slots: Dict[str, _ContainerSlots]
+    _tolerations_kv: Dict[str, int]
+    _env_appended: Dict[str, Dict[str, int]]
+
+    def __init__(self, template: CompiledAgentSpecTemplate):
+
+        root = template.root
+        spec: dict = root["spec"]
+        metadata: dict = root["metadata"]
+
+        #
+        # Clone path from root to each runtime field.
+        # Siblings of these paths are shared with template
+        #
+
+        self._labels = dict(metadata["labels"])
+        self._metadata = {**metadata, "labels": self._labels}
+        self._tolerations = list(spec["tolerations"])
+        self._tolerations_kv = dict(template.tolerations_kv)
+        self._vol_list = list(spec["volumes"])
+        self._slots = template.slots
+        self._env_appended = {name: {} for name in self._slots}
+
+        tmpfs_index = template.tmpfs_index
+        tmpfs_vol: dict = self._vol_list[tmpfs_index]
+        self._tmpfs_vol = {**tmpfs_vol, "emptyDir": dict(tmpfs_vol["emptyDir"])}
+        self._vol_list[tmpfs_index] = self._tmpfs_vol
+
+        containers = list(spec["containers"])
+        self._agent_container = self._clone_container(containers, "agent")
+        self._sandbox_container = self._clone_container(containers, "sandbox")
+
+        self._root = {
+            **root,
+            "metadata": self._metadata,
+            "spec": {
+                **spec,
+                "nodeSelector": dict(spec["nodeSelector"]),
+                "tolerations": self._tolerations,
+                "volumes": self._vol_list,
+                "containers": containers,
+            },
+        }
+
+    def _clone_container(self, containers: List[dict], name: str):
+
+        index = self._slots[name].index
+        container: dict = containers[index]
+        resources: dict = container["resources"]
+
+        cloned = {
+            **container,
+            "env": list(container["env"]),
+            "resources": {
+                **resources,
+                "requests": dict(resources["requests"]),
+                "limits": dict(resources["limits"]),
+            },
+        }
+
+        containers[index] = cloned
+        return cloned
+
+    def _validate_runtime_fields(self):
+
+        spec = self._root["spec"]
+        spec_validate(self._labels, "$root.metadata.labels")
+        spec_validate(spec["nodeSelector"], "$root.spec.nodeSelector")
+        spec_validate(self._tolerations, "$root.spec.tolerations")
+        spec_validate(self._tmpfs_vol, "$root.spec.volumes[tmpfs]")
+        spec_validate(spec.get("affinity", {}), "$root.spec.affinity")
+
+        for name, slots in self._slots.items():
+
+            container = spec["containers"][slots.index]
+            key = f"$root.spec.containers[{name}]"
+
+            spec_validate(container.get("image"), f"{key}.image")
+            spec_validate(container["resources"], f"{key}.resources")
+
+            env_list: list = container["env"]
+            for i in slots.env_runtime:
+                spec_validate(env_list[i], f"{key}.env[{i}]")
+
+            for i in range(slots.env_count, len(env_list)):
+                spec_validate(env_list[i], f"{key}.env[{i}]")
+
+    def validate(self):
+        try:
+            self._validate_runtime_fields()
+        except SpecValidationError as e:
+            raise AgentSpecValidationError(str(e)) from e
+
+    def set_name(self, name: str):
+        self._metadata.pop("generateName", None)
+        self._metadata["name"] = name
+
+    def set_tmpfs_size(self, size: str):
+        self._tmpfs_vol["emptyDir"]["sizeLimit"] = size
+
+    def _set_env(self, name: str, value: str, container: dict):
+
+        env = {
+            "name": name,
+            "value": value,
+        }
+
+        env_list: list = container["env"]
+        env_index = self._slots[container["name"]].env_index
+        env_appended = self._env_appended[container["name"]]
+
+        #
+        # Env entries are shared with template.
+        # So replace entry instead of updating it.
+        # Entries missing in template are indexed per spec
+        #
+
+        index = env_index.get(name, env_appended.get(name))
+        if index is not None:
+            env_list[index] = env
+        else:
+            env_appended[name] = len(env_list)
+            env_list.append(env)
+
+    def set_toleration(
+        self,
+        key: str,
+        value: str,
+        operator: str,
+        effect: str,
+    ):
+        tlr = {
+            "key": key,
+            "value": value,
+            "operator": operator,
+            "effect": effect,
+        }
+
+        try:
+            self._tolerations[self._tolerations_kv[key]] = tlr
+        except KeyError:
+            self._tolerations_kv[key] = len(self._tolerations)
+            self._tolerations.append(tlr)
+
+
+class CompiledAgentSpecTemplate:
+
+    """
+    Agent specification template, which is prepared once.
+    Producing a specification costs O(runtime fields), not O(template size)
+    """
+
+    _root: dict
+    _slots: Dict[str, _ContainerSlots]
+    _tolerations_kv: Dict[str, int]
+    _tmpfs_index: int
+
+    def __init__(self, root: dict):
+
+        self._root = root
+        spec: dict = root["spec"]
+
+        self._slots = {}
+        for i, container in enumerate(spec["containers"]):
+            if container["name"] in ("agent", "sandbox"):
+                self._slots[container["name"]] = _ContainerSlots(i, container)
+
+        self._tolerations_kv = {}
+        for i, tlr in enumerate(spec["tolerations"]):
+            self._tolerations_kv[tlr["key"]] = i
+
+        volumes: List[dict] = spec["volumes"]
+        names = [vol["name"] for vol in volumes]
+        self._tmpfs_index = names.index("tmpfs")
+
+        self._validate_static_fields()
+
+    def _validate_static_fields(self):
+
+        #
+        # Fill runtime fields with placeholders and validate the
+        # rest of template. Static fields will never be checked again
+        #
+
+        spec = CompiledAgentSpec(self)
+        placeholder = "<runtime>"
+
+        # Checked on each produced specification
+        spec._labels.clear()
+        spec._tolerations.clear()
+        spec._root["spec"]["nodeSelector"].clear()
+
+        for container, slots in [
+            (spec._agent_container, self._slots["agent"]),
+            (spec._sandbox_container, self._slots["sandbox"]),
+        ]:
+            container["image"] = placeholder
+            container["resources"]["requests"] = {"cpu": placeholder}
+            container["resources"]["limits"] = {"cpu": placeholder}
+            for i in slots.env_runtime:
+                name = container["env"][i]["name"]
+                spec._set_env(name, placeholder, container)
+
+        spec.set_tmpfs_size(placeholder)
+
+        try:
+            spec_validate(spec._root, "$root")
+        except SpecValidationError as e:
+            raise AgentSpecValidationError(str(e)) from e
+
+    def copy(self) -> CompiledAgentSpec:
+        return CompiledAgentSpec(self)
+
+    @property
+    def root(self):
+        return self._root
+
+    @property
+    def slots(self):
+        return self._slots
+
+    @property
+    def tolerations_kv(self):
+        return self._tolerations_kv
+
+    @property
+    def tmpfs_index(self):
+        return self._tmpfs_index
+
+    @property
+    def name_prefix(self) -> str:
+        return self._root["metadata"].get("generateName", "fuzzer-")
@@ -57,6 +57,11 @@ class AgentSpec:
         except StopIteration:
             env_list.append(env)
 
+    def set_name(self, name: str):
+        metadata: dict = self._root["metadata"]
+        metadata.pop("generateName", None)
+        metadata["name"] = name
+
     def set_label(self, name: str, value: str):
         self._labels[name] = value
 
@@ -69,6 +74,29 @@ class AgentSpec:
     def set_node_selector(self, key: str, value: str):
         self._root["spec"]["nodeSelector"][key] = value
 
+    def set_node_affinity(self, node_name: str):
+
+        # Pod is scheduled only on the node with given name
+        term = {
+            "matchFields": [
+                {
+                    "key": "metadata.name",
+                    "operator": "In",
+                    "values": [node_name],
+                }
+            ]
+        }
+
+        spec: dict = self._root["spec"]
+        spec["affinity"] = {
+            **(spec.get("affinity") or {}),
+            "nodeAffinity": {
+                "requiredDuringSchedulingIgnoredDuringExecution": {
+                    "nodeSelectorTerms": [term],
+                }
+            },
+        }
+
     def set_toleration(
         self,
         key: str,
@@ -3,6 +3,7 @@ from typing import Any, Optional
 
 from ..base.errors import SpecLoadError, SpecParseError
 from ..base.spec import spec_get_item, spec_load, spec_set_item
+from .compiled import CompiledAgentSpecTemplate
 from .errors import AgentSpecLoadError, AgentSpecParseError
 from .spec import AgentSpec
 
@@ -162,3 +163,6 @@ class AgentSpecTemplate:
 
     def copy(self) -> AgentSpec:
         return AgentSpec(deepcopy(self._root))
+
+    def compile(self) -> CompiledAgentSpecTemplate:
+        return CompiledAgentSpecTemplate(deepcopy(self._root))
@@ -0,0 +1,50 @@
+import zlib
+from typing import AsyncIterator, Optional
+
+# Compressed log stored as separate blob
+LOGS_ENCODING_GZIP = "gzip"
+
+# wbits for zlib to produce gzip-compatible stream
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+async def compress_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+
+    """
+    Compresses logs chunk by chunk, so the whole
+    uncompressed log is never held in memory
+    """
+
+    compressor = zlib.compressobj(wbits=_GZIP_WBITS)
+
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
+async def decompress_stream(
+    chunks: AsyncIterator[bytes],
+    encoding: Optional[str],
+) -> AsyncIterator[bytes]:
+
+    """Decodes log blob saved with given encoding"""
+
+    if encoding is None:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    if encoding != LOGS_ENCODING_GZIP:
+        raise ValueError(f"Unknown logs encoding: '{encoding}'")
+
+    decompressor = zlib.decompressobj(wbits=_GZIP_WBITS)
+
+    async for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+
+    yield decompressor.flush()
@@ -23,6 +23,10 @@ def rfc3339(date: datetime):
     return date.strftime(r"%Y-%m-%dT%H:%M:%SZ")
 
 
+def rfc3339_micro(date: datetime):
+    return to_utc(date).strftime(r"%Y-%m-%dT%H:%M:%S.%fZ")
+
+
 def duration_in_seconds(value: str):
 
     match: Match = regex_match(r"^(\d+)([s,m,h,d])$", value)
@@ -41,3 +45,7 @@ def duration_in_seconds(value: str):
     unit = match.group(2)
 
     return ival * units_dict[unit]
+
+
+def from_rfc3339(value: str):
+    return datetime.strptime(value, r"%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
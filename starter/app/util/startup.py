@@ -0,0 +1,182 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from prometheus_client.metrics import Gauge
+
+from starter.app.metrics import shutdown_stage_duration, startup_stage_duration
+
+StageCallback = Callable[[], Awaitable[None]]
+
+
+class StartupGraphError(Exception):
+    pass
+
+
+@dataclass
+class _Stage:
+    name: str
+    depends_on: Sequence[str]
+    startup: StageCallback
+    startup_msg: str
+    shutdown: Optional[StageCallback]
+    shutdown_msg: Optional[str]
+    dependents: List[str] = field(default_factory=list)
+    started: bool = False
+
+
+class StartupGraph:
+
+    """
+    Runs application startup stages according to their dependencies.
+    Stages which do not depend on each other are run concurrently.
+    Shutdown is done in reverse order: stage is stopped only
+    after all stages depending on it have been stopped
+    """
+
+    _stages: Dict[str, _Stage]
+    _logger: logging.Logger
+
+    def __init__(self):
+        self._logger = logging.getLogger("main")
+        self._stages = {}
+
+    def add_stage(
+        self,
+        name: str,
+        depends_on: Sequence[str],
+        startup: StageCallback,
+        startup_msg: str,
+        shutdown: Optional[StageCallback] = None,
+        shutdown_msg: Optional[str] = None,
+    ):
+        if name in self._stages:
+            raise StartupGraphError(f"Stage '{name}' already exists")
+
+        self._stages[name] = _Stage(
+            name=name,
+            depends_on=depends_on,
+            startup=startup,
+            startup_msg=startup_msg,
+            shutdown=shutdown,
+            shutdown_msg=shutdown_msg or f"Stopping '{name}'",
+        )
+
+    def _topological_order(self) -> List[_Stage]:
+
+        order: List[_Stage] = []
+        visiting = set()
+        visited = set()
+
+        def visit(stage: _Stage):
+
+            if stage.name in visited:
+                return
+
+            if stage.name in visiting:
+                raise StartupGraphError(f"Dependency cycle at stage '{stage.name}'")
+
+            visiting.add(stage.name)
+            for dep_name in stage.depends_on:
+                dep = self._stages.get(dep_name)
+                if dep is None:
+                    msg = f"Stage '{stage.name}' depends on unknown stage '{dep_name}'"
+                    raise StartupGraphError(msg)
+                visit(dep)
+
+            visiting.remove(stage.name)
+            visited.add(stage.name)
+            order.append(stage)
+
+        for stage in self._stages.values():
+            visit(stage)
+
+        return order
+
+    async def _run_stage(
+        self,
+        stage: _Stage,
+        callback: StageCallback,
+        msg: str,
+        duration: Gauge,
+    ):
+        self._logger.info("%s...", msg)
+        start = monotonic()
+        await callback()
+        elapsed = monotonic() - start
+        self._logger.info("%s... OK (%.3fs)", msg, elapsed)
+        duration.labels(stage.name).set(elapsed)
+
+    async def startup(self):
+
+        order = self._topological_order()
+        tasks: Dict[str, asyncio.Task] = {}
+        loop = asyncio.get_running_loop()
+
+        for stage in self._stages.values():
+            stage.dependents.clear()
+
+        for stage in order:
+            for dep_name in stage.depends_on:
+                self._stages[dep_name].dependents.append(stage.name)
+
+        async def run(stage: _Stage):
+            await asyncio.gather(*[tasks[name] for name in stage.depends_on])
+            msg, duration = stage.startup_msg, startup_stage_duration
+            await self._run_stage(stage, stage.startup, msg, duration)
+            stage.started = True
+
+        for stage in order:
+            tasks[stage.name] = loop.create_task(run(stage))
+
+        start = monotonic()
+
+        try:
+            await asyncio.gather(*tasks.values())
+
+        except:
+            for task in tasks.values():
+                task.cancel()
+
+            # Release resources of stages which have been started
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            await self.shutdown()
+            raise
+
+        msg = "Startup completed in %.3fs"
+        self._logger.info(msg, monotonic() - start)
+
+    async def shutdown(self):
+
+        #
+        # Stage can be stopped when all its dependents are stopped.
+        # Errors are logged and do not prevent other stages from stopping
+        #
+
+        order = self._topological_order()
+        tasks: Dict[str, asyncio.Task] = {}
+        loop = asyncio.get_running_loop()
+
+        async def run(stage: _Stage):
+
+            wait_for = [tasks[name] for name in stage.dependents]
+            await asyncio.gather(*wait_for)
+
+            if not stage.started or stage.shutdown is None:
+                return
+
+            msg, duration = stage.shutdown_msg, shutdown_stage_duration
+
+            try:
+                await self._run_stage(stage, stage.shutdown, msg, duration)
+            except Exception as e:
+                self._logger.exception("%s... Failed. Reason - %s", msg, e)
+
+            stage.started = False
+
+        for stage in reversed(order):
+            tasks[stage.name] = loop.create_task(run(stage))
+
+        await asyncio.gather(*tasks.values())
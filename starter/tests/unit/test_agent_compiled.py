@@ -0,0 +1,163 @@
+from timeit import timeit
+
+import pytest
+import yaml
+
+from starter.app.spec.agent import AgentSpec, AgentSpecTemplate
+from starter.app.spec.agent.errors import AgentSpecValidationError
+
+
+@pytest.fixture(scope="session")
+def template():
+    return AgentSpecTemplate("agent.yaml")
+
+
+@pytest.fixture(scope="session")
+def large_template(tmp_path_factory):
+
+    with open("agent.yaml") as f:
+        root = yaml.safe_load(f)
+
+    # Grow static part of template only
+    for container in root["spec"]["containers"]:
+        if container["name"] == "agent":
+            for i in range(2000):
+                env = {"name": f"STATIC_ENV_{i}", "value": str(i)}
+                container["env"].append(env)
+
+    path = tmp_path_factory.mktemp("spec") / "agent.yaml"
+    path.write_text(yaml.safe_dump(root))
+    return AgentSpecTemplate(str(path))
+
+
+def fill_spec(spec: AgentSpec, fuzzer_id: str = "1111"):
+
+    spec.set_label("bondifuzz/fuzzer-id", fuzzer_id)
+    spec.set_label("bondifuzz/pool-id", "pool")
+    spec.set_tmpfs_size("64Mi")
+    spec.set_node_selector("bondifuzz/pool-id", "pool")
+    spec.set_toleration("bondifuzz/pool-id", "pool", "Equal", "NoSchedule")
+    spec.set_node_affinity("node-" + fuzzer_id)
+
+    spec.set_agent_image_name("agent")
+    spec.set_agent_rs_requests("100m", "100Mi")
+    spec.set_agent_rs_limits("100m", "100Mi")
+
+    for name in [
+        "AGENT_MODE",
+        "FUZZER_SESSION_ID",
+        "FUZZER_USER_ID",
+        "FUZZER_PROJECT_ID",
+        "FUZZER_POOL_ID",
+        "FUZZER_REV",
+        "FUZZER_LANG",
+        "FUZZER_ENGINE",
+        "FUZZER_RAM_LIMIT",
+    ]:
+        spec.set_agent_env(name, "value")
+
+    spec.set_agent_env("FUZZER_ID", fuzzer_id)
+    spec.set_sandbox_image_name("sandbox")
+    spec.set_sandbox_rs_requests("200m", "200Mi")
+    spec.set_sandbox_rs_limits("200m", "200Mi")
+    return spec
+
+
+def test_compiled_equals_copied(template: AgentSpecTemplate):
+    compiled = template.compile()
+    expected = fill_spec(template.copy()).as_dict()
+    assert fill_spec(compiled.copy()).as_dict() == expected
+
+
+def test_compiled_does_not_modify_template(template: AgentSpecTemplate):
+
+    compiled = template.compile()
+    body_1 = fill_spec(compiled.copy(), "1111").as_dict()
+    body_2 = fill_spec(compiled.copy(), "2222").as_dict()
+
+    assert body_1["metadata"]["labels"]["bondifuzz/fuzzer-id"] == "1111"
+    assert body_2["metadata"]["labels"]["bondifuzz/fuzzer-id"] == "2222"
+    assert compiled.root["metadata"]["labels"] == {}
+    assert compiled.root["spec"]["tolerations"] == []
+    assert "affinity" not in compiled.root["spec"]
+
+    # Pods are pinned to their own nodes
+    def pinned_node(body: dict):
+        affinity = body["spec"]["affinity"]["nodeAffinity"]
+        terms = affinity["requiredDuringSchedulingIgnoredDuringExecution"]
+        return terms["nodeSelectorTerms"][0]["matchFields"][0]["values"]
+
+    assert pinned_node(body_1) == ["node-1111"]
+    assert pinned_node(body_2) == ["node-2222"]
+
+    with pytest.raises(AgentSpecValidationError):
+        compiled.copy().as_dict()
+
+
+def test_compiled_env_not_in_template(template: AgentSpecTemplate):
+
+    compiled = template.compile()
+    spec = fill_spec(compiled.copy())
+    spec.set_agent_env("EXTRA_ENV", "1")
+    spec.set_agent_env("EXTRA_ENV", "2")
+
+    # Env missing in template is appended once and then replaced
+    expected = fill_spec(template.copy())
+    expected.set_agent_env("EXTRA_ENV", "1")
+    expected.set_agent_env("EXTRA_ENV", "2")
+    assert spec.as_dict() == expected.as_dict()
+
+    body = fill_spec(compiled.copy()).as_dict()
+    containers = body["spec"]["containers"]
+    assert all("EXTRA_ENV" not in str(c["env"]) for c in containers)
+
+
+def test_compiled_validate_fail(template: AgentSpecTemplate):
+
+    spec = fill_spec(template.compile().copy())
+    spec.set_agent_env("FUZZER_ID", None)
+
+    with pytest.raises(AgentSpecValidationError):
+        spec.as_dict()
+
+
+def test_compiled_static_validate_fail(tmp_path):
+
+    with open("agent.yaml") as f:
+        root = yaml.safe_load(f)
+
+    root["spec"]["restartPolicy"] = None
+    path = tmp_path / "agent.yaml"
+    path.write_text(yaml.safe_dump(root))
+    template = AgentSpecTemplate(str(path))
+
+    with pytest.raises(AgentSpecValidationError):
+        template.compile()
+
+
+def test_compiled_benchmark(
+    template: AgentSpecTemplate,
+    large_template: AgentSpecTemplate,
+):
+    number = 200
+    compiled = template.compile()
+    large_compiled = large_template.compile()
+
+    def run_copied():
+        fill_spec(large_template.copy()).as_dict()
+
+    def run_compiled():
+        fill_spec(compiled.copy()).as_dict()
+
+    def run_large_compiled():
+        fill_spec(large_compiled.copy()).as_dict()
+
+    t_copied = timeit(run_copied, number=number)
+    t_compiled = timeit(run_compiled, number=number)
+    t_large_compiled = timeit(run_large_compiled, number=number)
+
+    # Much faster than deepcopy
+    assert t_large_compiled * 10 < t_copied
+
+    # Does not depend much on template size
+    assert t_large_compiled < t_compiled * 3
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+
+# Package 'message_queue' is initialized with MQ transport
+pytest.importorskip("mqtransport")
+
+from starter.app.message_queue.coalescing import CoalescingProducer  # noqa: E402
+
+
+class FakeProducer:
+    def __init__(self, name: str):
+        self.name = name
+
+    class Model(BaseModel):
+        fuzzer_id: str
+        seq: int
+
+
+class FakeOutbox:
+    def __init__(self, fail_times: int = 0):
+        self.produced = []
+        self.fail_times = fail_times
+
+    async def produce(self, producer, **kwargs):
+
+        await asyncio.sleep(0.001)
+
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise RuntimeError("Broker is unavailable")
+
+        self.produced.append((producer.name, kwargs))
+
+
+def make_settings(batch_size: int, delay_ms: int = 10):
+    return SimpleNamespace(
+        message_queue=SimpleNamespace(
+            produce_batch_size=batch_size,
+            produce_batch_delay_ms=delay_ms,
+        )
+    )
+
+
+async def create(outbox: FakeOutbox, batch_size: int):
+    return await CoalescingProducer.create(
+        outbox,
+        FakeProducer("single"),
+        FakeProducer("batch"),
+        make_settings(batch_size),
+    )
+
+
+@pytest.mark.asyncio
+async def test_batches_preserve_order():
+
+    outbox = FakeOutbox()
+    producer = await create(outbox, batch_size=10)
+
+    await asyncio.gather(
+        *[producer.produce(fuzzer_id=str(i % 3), seq=i) for i in range(25)]
+    )
+
+    sizes = [len(kwargs["items"]) for _, kwargs in outbox.produced]
+    assert sizes == [10, 10, 5]
+
+    items: List[dict] = [i for _, kw in outbox.produced for i in kw["items"]]
+    for fuzzer_id in "012":
+        seqs = [item["seq"] for item in items if item["fuzzer_id"] == fuzzer_id]
+        assert seqs == sorted(seqs)
+
+    await producer.close()
+
+
+@pytest.mark.asyncio
+async def test_errors_and_disabled_batching():
+
+    outbox = FakeOutbox(fail_times=1)
+    producer = await create(outbox, batch_size=10)
+
+    with pytest.raises(RuntimeError):
+        await producer.produce(fuzzer_id="1", seq=1)
+
+    # Window with one message is sent as a single message
+    await producer.produce(fuzzer_id="1", seq=2)
+    await producer.close()
+    assert outbox.produced == [("single", {"fuzzer_id": "1", "seq": 2})]
+
+    outbox = FakeOutbox()
+    producer = await create(outbox, batch_size=1)
+    await producer.produce(fuzzer_id="1", seq=1)
+    await producer.close()
+    assert outbox.produced == [("single", {"fuzzer_id": "1", "seq": 1})]
@@ -0,0 +1,29 @@
+import pytest
+
+from starter.app.util.compression import (
+    LOGS_ENCODING_GZIP,
+    compress_stream,
+    decompress_stream,
+)
+
+from .test_log_store import collect, iterate
+
+
+@pytest.mark.asyncio
+async def test_compress_stream():
+
+    lines = [f"#{i} NEW cov: {i} ft: {i * 2} corp: 1/1b\n" for i in range(10000)]
+    logs = "".join(lines).encode()
+
+    compressed = await collect(compress_stream(iterate(l.encode() for l in lines)))
+    assert len(compressed) * 3 < len(logs)
+
+    chunks = [compressed[i : i + 100] for i in range(0, len(compressed), 100)]
+    decompressed = decompress_stream(iterate(chunks), LOGS_ENCODING_GZIP)
+    assert await collect(decompressed) == logs
+
+    # Blobs saved without encoding are returned as is
+    assert await collect(decompress_stream(iterate([logs]), None)) == logs
+
+    with pytest.raises(ValueError):
+        await collect(decompress_stream(iterate([logs]), "unknown"))
@@ -0,0 +1,76 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from starter.app.kubernetes.pods.events.deletion_scheduler import (
+    DelayedDeletionScheduler,
+)
+
+
+class FakeDeleter:
+    def __init__(self):
+        self.batches: List[List[str]] = []
+        self.times: List[float] = []
+
+    async def delete_pods(self, pod_names: List[str]):
+        self.batches.append(sorted(pod_names))
+        self.times.append(asyncio.get_running_loop().time())
+
+
+@pytest.mark.asyncio
+async def test_due_deletions_are_batched():
+
+    tick = 0.1
+    loop = asyncio.get_running_loop()
+    deleter = FakeDeleter()
+    scheduler = DelayedDeletionScheduler(deleter.delete_pods, tick=tick)
+
+    # Start right after tick, so the first deadlines share the next one
+    await asyncio.sleep(tick - loop.time() % tick + 0.001)
+    start = loop.time()
+
+    assert scheduler.schedule("pod-1", 0.05)
+    assert scheduler.schedule("pod-2", 0.07)
+    assert scheduler.schedule("pod-3", 0.3)
+    assert scheduler.pending_count == 3
+
+    await asyncio.sleep(0.15)
+    assert deleter.batches == [["pod-1", "pod-2"]]
+    assert scheduler.pending_count == 1
+
+    await asyncio.sleep(0.35)
+    assert deleter.batches == [["pod-1", "pod-2"], ["pod-3"]]
+    await scheduler.close()
+
+    # Pods are never deleted before their deadline
+    assert deleter.times[0] >= start + 0.07
+    assert deleter.times[1] >= start + 0.3
+
+
+@pytest.mark.asyncio
+async def test_deduplicate_and_cancel():
+
+    deleter = FakeDeleter()
+    scheduler = DelayedDeletionScheduler(deleter.delete_pods, tick=0.01)
+
+    # Repeated event keeps the earliest deadline
+    assert scheduler.schedule("pod-1", 0.05)
+    assert not scheduler.schedule("pod-1", 0.1)
+    assert scheduler.schedule("pod-2", 0.1)
+    assert scheduler.schedule("pod-2", 0.05)
+
+    # Pod has gone away
+    assert scheduler.schedule("pod-3", 0.05)
+    assert scheduler.cancel("pod-3")
+    assert not scheduler.cancel("pod-3")
+
+    await asyncio.sleep(0.2)
+    assert deleter.batches == [["pod-1", "pod-2"]]
+
+    # Pending deletions are dropped on close
+    scheduler.schedule("pod-4", 0.05)
+    await scheduler.close()
+    await asyncio.sleep(0.1)
+    assert deleter.batches == [["pod-1", "pod-2"]]
+    assert scheduler.pending_count == 0
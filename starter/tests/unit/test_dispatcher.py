@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from starter.app.kubernetes.pods.events.dispatcher import KeyedEventDispatcher
+
+
+@pytest.mark.asyncio
+async def test_same_key_ordered():
+
+    handled = []
+
+    async def handler(event):
+        key, i = event
+        await asyncio.sleep(0.01 if i % 2 else 0)
+        handled.append(event)
+
+    dispatcher = KeyedEventDispatcher(handler, max_concurrency=8, max_pending=100)
+    for i in range(10):
+        await dispatcher.dispatch("pod-a", ("pod-a", i))
+        await dispatcher.dispatch("pod-b", ("pod-b", i))
+
+    await dispatcher.join()
+
+    for key in ["pod-a", "pod-b"]:
+        events = [i for k, i in handled if k == key]
+        assert events == list(range(10))
+
+
+@pytest.mark.asyncio
+async def test_different_keys_concurrent():
+
+    running = 0
+    max_running = 0
+
+    async def handler(event):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    dispatcher = KeyedEventDispatcher(handler, max_concurrency=4, max_pending=100)
+    for i in range(20):
+        await dispatcher.dispatch(f"pod-{i}", i)
+
+    await dispatcher.join()
+    assert max_running == 4
+
+
+@pytest.mark.asyncio
+async def test_join_waits_for_handlers():
+
+    handled = []
+
+    async def handler(event):
+        await asyncio.sleep(0.01)
+        handled.append(event)
+
+    dispatcher = KeyedEventDispatcher(handler, max_concurrency=2, max_pending=2)
+    for i in range(6):
+        await dispatcher.dispatch(f"pod-{i}", i)
+
+    await dispatcher.join()
+    assert sorted(handled) == list(range(6))
+    assert dispatcher.pending_count == 0
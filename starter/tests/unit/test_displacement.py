@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+from datetime import timedelta
+from typing import List
+
+import pytest
+from aiohttp import ClientConnectionError
+from kubernetes_asyncio.client import ApiException, V1Status
+
+from starter.app.kubernetes.client import KubernetesClient
+from starter.app.kubernetes.informer import PodInformer
+from starter.app.kubernetes.pods.displacement import try_displace_pods
+from starter.app.kubernetes.pods.registry import FuzzerPodRegistry
+from starter.app.util.datetime import date_now
+
+from .test_pod_registry import make_pod
+
+
+class FakeCoreV1Api:
+
+    """Pods 'old-*' were created without pod name label"""
+
+    def __init__(self, pods: List[str]):
+        self.pods = set(pods)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.fail_collection = False
+        self.collection_error = None
+
+    async def _call(self, name: str):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.001)
+        self.active -= 1
+
+        if name not in self.pods:
+            raise ApiException(status=404)
+
+    async def patch_namespaced_pod(self, name, namespace, body):
+        self.calls.append(("patch", name))
+        await self._call(name)
+
+    async def delete_namespaced_pod(self, name, namespace):
+        self.calls.append(("delete", name))
+        await self._call(name)
+        self.pods.remove(name)
+
+    async def delete_collection_namespaced_pod(
+        self, namespace, label_selector, _preload_content=True
+    ):
+        self.calls.append(("delete_collection", label_selector))
+        if self.collection_error is not None:
+            raise self.collection_error
+
+        if self.fail_collection:
+            return FakeRawResponse(500, {"kind": "Status", "code": 500})
+
+        names = label_selector.split(" in ")[1].strip("()").split(",")
+        deleted = [n for n in names if n in self.pods and not n.startswith("old")]
+        self.pods.difference_update(deleted)
+
+        # Client deserializes response as status, dropping deleted pods
+        if _preload_content:
+            return V1Status(kind="Status", status="Success")
+
+        items = [{"metadata": {"name": n}} for n in deleted]
+        return FakeRawResponse(200, {"kind": "PodList", "items": items})
+
+
+class FakeRawResponse:
+
+    """Response returned by client when content is not preloaded"""
+
+    def __init__(self, status: int, body: dict):
+        self.status = status
+        self._body = json.dumps(body).encode()
+
+    async def read(self):
+        return self._body
+
+    def release(self):
+        pass
+
+
+def make_client(v1: FakeCoreV1Api):
+    client = KubernetesClient()
+    client._logger = logging.getLogger("k8s.client")
+    client._namespace = "default"
+    client._bulk_concurrency = 4
+    client._is_closed = True
+    client._pod_informer = PodInformer(v1, "default")
+    client._v1 = v1
+    return client
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_and_displace():
+
+    names = [f"fuzzer-{i}" for i in range(150)] + ["old-1"]
+    v1 = FakeCoreV1Api(names)
+    client = make_client(v1)
+
+    # Missing pods are not treated as failed
+    failed = await client.delete_fuzzer_pods_by_name(names + ["missing"])
+    assert failed == []
+    assert v1.pods == set()
+
+    kinds = [kind for kind, _ in v1.calls]
+    assert kinds == ["delete_collection"] * 2 + ["delete"] * 2
+
+    # Pods of failed chunks are deleted one by one
+    for error in [None, ApiException(status=429), ClientConnectionError()]:
+        v1 = FakeCoreV1Api(names)
+        v1.fail_collection = True
+        v1.collection_error = error
+        client = make_client(v1)
+        assert await client.delete_fuzzer_pods_by_name(names) == []
+        assert v1.pods == set()
+
+        kinds = [kind for kind, _ in v1.calls]
+        assert kinds == ["delete_collection"] * 2 + ["delete"] * len(names)
+
+    v1 = FakeCoreV1Api(names)
+    client = make_client(v1)
+    assert await client.displace_fuzzer_pods(names) == []
+    assert len(v1.calls) == len(names)
+    assert v1.max_active == 4
+
+
+@pytest.mark.asyncio
+async def test_displace_by_work_time():
+
+    now = date_now()
+    registry = FuzzerPodRegistry()
+
+    for name, worked in [("fuzzer-old", 3600), ("fuzzer-new", 10)]:
+        pod = make_pod(name)
+        pod.start_time = now - timedelta(seconds=worked)
+        registry.add_pod(pod)
+
+    v1 = FakeCoreV1Api(["fuzzer-old", "fuzzer-new"])
+    client = make_client(v1)
+
+    await try_displace_pods("pool-1", registry, client, 200, 200, 60)
+
+    assert ("patch", "fuzzer-new") in v1.calls
+    assert v1.calls[0][0] == "delete_collection"
+    assert v1.pods == {"fuzzer-new"}
+    assert all(pod.displaced for pod in registry.list_pods())
@@ -0,0 +1,215 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from aiohttp import web
+from kubernetes_asyncio.client import ApiClient
+from kubernetes_asyncio.client.api.core_v1_api import CoreV1Api
+
+from starter.app.kubernetes.informer import PodInformer
+from starter.app.kubernetes.pods.events.event_listener import PodEventListener
+from starter.app.settings import PodWatchParseMode
+from starter.app.util.labels import bondifuzz_key
+
+from .test_sharding import fake_api_server
+
+PODS_PATH = "/api/v1/namespaces/{namespace}/pods"
+PARSE_MODES = [PodWatchParseMode.slim, PodWatchParseMode.full]
+
+
+def raw_pod(name: str, resource_version: str, phase: str = "Running"):
+    return {
+        "metadata": {
+            "name": name,
+            "resourceVersion": resource_version,
+            "labels": {bondifuzz_key("pool_id"): "pool-1"},
+        },
+        "status": {"phase": phase},
+    }
+
+
+class FakePodServer:
+
+    """
+    Minimal kubernetes API server for pods. Each watch request
+    streams next scripted list of events, then the connection
+    is kept open until server is stopped
+    """
+
+    def __init__(self, pods: List[dict], resource_version: str):
+        self.pods = pods
+        self.resource_version = resource_version
+        self.scripts: List[List[dict]] = []
+        self.lists = 0
+        self.watches: List[dict] = []
+        self.stopped = asyncio.Event()
+        self.app = web.Application()
+        self.app.router.add_get(PODS_PATH, self.pods_handler)
+
+    async def pods_handler(self, request: web.Request):
+
+        if request.query.get("watch", "").lower() == "true":
+            return await self.watch_pods(request)
+
+        self.lists += 1
+        meta = {"resourceVersion": self.resource_version}
+        body = {"kind": "PodList", "metadata": meta, "items": self.pods}
+        return web.json_response(body)
+
+    async def watch_pods(self, request: web.Request):
+
+        self.watches.append(dict(request.query))
+        response = web.StreamResponse()
+        await response.prepare(request)
+
+        if not self.scripts:
+            await self.stopped.wait()
+            return response
+
+        for event in self.scripts.pop(0):
+            await response.write(json.dumps(event).encode() + b"\n")
+
+        await response.write_eof()
+        return response
+
+
+class FakeEventHandler:
+    def __init__(self, known_pods: List[str]):
+        self._known_pods = set(known_pods)
+        self.relists = []
+        self.events = []
+
+    def known_pods(self):
+        return set(self._known_pods)
+
+    async def handle_relist(self, known_pods, v1_pods):
+        names = sorted(pod.metadata.name for pod in v1_pods)
+        self.relists.append((known_pods, names))
+
+    async def handle(self, event_type, v1_pod):
+        self.events.append((event_type, v1_pod.metadata.name))
+
+    async def close(self):
+        pass
+
+
+def make_settings(parse_mode: PodWatchParseMode):
+    return SimpleNamespace(
+        fuzzer_pod=SimpleNamespace(
+            namespace="default",
+            watch_parse_mode=parse_mode,
+            event_concurrency=4,
+        ),
+        environment=SimpleNamespace(shutdown_timeout=1),
+    )
+
+
+async def wait_for(condition, timeout: float = 5):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+@asynccontextmanager
+async def running_listener(
+    monkeypatch,
+    server: FakePodServer,
+    handler: FakeEventHandler,
+    parse_mode: PodWatchParseMode = PodWatchParseMode.slim,
+):
+    async with fake_api_server(monkeypatch, server):
+        async with ApiClient() as client:
+
+            # Registry is loaded from the first listing
+            informer = PodInformer(CoreV1Api(client), "default")
+            await informer.sync()
+
+            settings = make_settings(parse_mode)
+            listener = await PodEventListener.create(handler, informer, settings)
+            await listener.start()
+
+            try:
+                yield informer
+            finally:
+                server.stopped.set()
+                await listener.close()
+
+
+@pytest.mark.asyncio
+async def test_startup_handles_snapshot(monkeypatch):
+
+    pods = [raw_pod("fuzzer-1", "5", "Succeeded"), raw_pod("fuzzer-2", "6")]
+    server = FakePodServer(pods, resource_version="10")
+    handler = FakeEventHandler(["fuzzer-1", "fuzzer-2", "fuzzer-3"])
+
+    async with running_listener(monkeypatch, server, handler):
+        await wait_for(lambda: server.watches)
+
+    # Pods finished before start are handled without listing again
+    known_pods = {"fuzzer-1", "fuzzer-2", "fuzzer-3"}
+    assert handler.relists == [(known_pods, ["fuzzer-1", "fuzzer-2"])]
+    assert server.lists == 1
+    assert server.watches[0]["resourceVersion"] == "10"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("parse_mode", PARSE_MODES)
+async def test_watch_resumes_from_last_event(monkeypatch, parse_mode):
+
+    server = FakePodServer([raw_pod("fuzzer-1", "5")], resource_version="10")
+    server.scripts.append(
+        [{"type": "MODIFIED", "object": raw_pod("fuzzer-1", "11", "Succeeded")}]
+    )
+
+    handler = FakeEventHandler(["fuzzer-1"])
+    async with running_listener(monkeypatch, server, handler, parse_mode):
+        await wait_for(lambda: len(server.watches) == 2)
+
+    # Stream has ended, watch is resumed without listing pods
+    assert handler.events == [("MODIFIED", "fuzzer-1")]
+    assert server.watches[1]["resourceVersion"] == "11"
+    assert server.lists == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("parse_mode", PARSE_MODES)
+async def test_bookmark_updates_resource_version(monkeypatch, parse_mode):
+
+    bookmark = {"kind": "Pod", "metadata": {"resourceVersion": "20"}}
+    server = FakePodServer([raw_pod("fuzzer-1", "5")], resource_version="10")
+    server.scripts.append([{"type": "BOOKMARK", "object": bookmark}])
+
+    handler = FakeEventHandler(["fuzzer-1"])
+    async with running_listener(monkeypatch, server, handler, parse_mode) as informer:
+        await wait_for(lambda: len(server.watches) == 2)
+        assert informer.resource_version == "20"
+
+    # Bookmarks are not handled as pod events
+    assert handler.events == []
+    assert server.watches[1]["resourceVersion"] == "20"
+    assert server.lists == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("parse_mode", PARSE_MODES)
+async def test_expired_watch_relists(monkeypatch, parse_mode):
+
+    status = {"kind": "Status", "code": 410, "message": "too old resource version"}
+    server = FakePodServer([raw_pod("fuzzer-1", "5")], resource_version="10")
+    server.scripts.append([{"type": "ERROR", "object": status}])
+
+    handler = FakeEventHandler(["fuzzer-1", "fuzzer-2"])
+    async with running_listener(monkeypatch, server, handler, parse_mode):
+        server.resource_version = "30"
+        await wait_for(lambda: len(server.watches) == 2)
+
+    # Pods are listed again and watch resumes from the new listing
+    known_pods = {"fuzzer-1", "fuzzer-2"}
+    assert handler.relists == [(known_pods, ["fuzzer-1"])] * 2
+    assert server.watches[1]["resourceVersion"] == "30"
+    assert server.lists == 2
@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+
+import pytest
+
+from starter.app.kubernetes.coordination import ShardSet, pool_shard
+from starter.app.kubernetes.informer import PodInformer
+from starter.app.util.labels import bondifuzz_key
+
+
+def make_pod(name: str, pool_id: str, fuzzer_id: str, version: str = "1"):
+    labels = {
+        bondifuzz_key("pool_id"): pool_id,
+        bondifuzz_key("fuzzer_id"): fuzzer_id,
+    }
+    meta = SimpleNamespace(name=name, labels=labels, resource_version=version)
+    return SimpleNamespace(metadata=meta)
+
+
+class FakeCoreV1Api:
+    def __init__(self, pods, page_size: int):
+        self.pods = pods
+        self.page_size = page_size
+        self.calls = 0
+        self.label_selector = None
+
+    async def list_namespaced_pod(self, namespace, limit, label_selector, _continue):
+
+        self.calls += 1
+        self.label_selector = label_selector
+        start = int(_continue or 0)
+        end = start + self.page_size
+        token = str(end) if end < len(self.pods) else None
+
+        # Every page reports its own version, snapshot is the first one
+        meta = SimpleNamespace(resource_version=str(self.calls), _continue=token)
+        return SimpleNamespace(metadata=meta, items=self.pods[start:end])
+
+
+@pytest.mark.asyncio
+async def test_sync_and_lookup():
+
+    pods = [make_pod(f"pod-{i}", f"pool-{i % 2}", str(i % 3)) for i in range(5)]
+    v1 = FakeCoreV1Api(pods, page_size=2)
+    informer = PodInformer(v1, "default")
+    assert not informer.has_synced
+
+    await informer.sync()
+    assert v1.calls == 3
+    assert informer.resource_version == "1"
+    assert len(informer.list_pods()) == 5
+
+    assert informer.find_by_labels(pool_id="pool-0") == {"pod-0", "pod-2", "pod-4"}
+    assert informer.find_by_labels(pool_id="pool-0", fuzzer_id="1") == {"pod-4"}
+    assert informer.find_by_labels(pool_id="pool-2") == set()
+
+
+@pytest.mark.asyncio
+async def test_apply_events():
+
+    informer = PodInformer(FakeCoreV1Api([], page_size=10), "default")
+    await informer.sync()
+
+    informer.apply("ADDED", make_pod("pod-1", "pool-1", "1", version="10"))
+    informer.apply("MODIFIED", make_pod("pod-1", "pool-2", "1", version="11"))
+    assert informer.resource_version == "11"
+    assert informer.find_by_labels(pool_id="pool-1") == set()
+    assert informer.find_by_labels(pool_id="pool-2") == {"pod-1"}
+
+    # Created pod is visible before its watch event
+    informer.remember(make_pod("pod-2", "pool-2", "2"))
+    assert informer.existing(["pod-1", "pod-2", "pod-3"]) == ["pod-1", "pod-2"]
+
+    informer.apply("DELETED", make_pod("pod-1", "pool-2", "1", version="12"))
+    assert informer.get("pod-1") is None
+    assert informer.find_by_labels(fuzzer_id="1") == set()
+
+    # Pods of other services are not cached
+    other = make_pod("other", "pool-1", "1", version="13")
+    other.metadata.labels = {}
+    informer.apply("ADDED", other)
+    assert informer.get("other") is None
+    assert informer.resource_version == "13"
+
+    informer.invalidate()
+    assert not informer.has_synced
+
+
+@pytest.mark.asyncio
+async def test_shards():
+
+    v1 = FakeCoreV1Api([], page_size=10)
+    informer = PodInformer(v1, "default")
+    await informer.sync()
+    assert v1.label_selector == bondifuzz_key("pool_id")
+    assert informer.covers(None)
+
+    shard = pool_shard("pool-1", 4)
+    informer.set_shards(ShardSet(4, frozenset([shard])))
+    assert not informer.has_synced
+
+    await informer.sync()
+    assert v1.label_selector.endswith(f"{bondifuzz_key('shard')} in ({shard})")
+    assert informer.covers("pool-1")
+    assert not informer.covers(None)
+
+    # Pods of other shards created here are not cached
+    other = next(
+        f"pool-{i}" for i in range(2, 100) if pool_shard(f"pool-{i}", 4) != shard
+    )
+    assert not informer.covers(other)
+    informer.remember(make_pod("pod-1", other, "1"))
+    assert informer.get("pod-1") is None
+
+    informer.set_shards(ShardSet(4, frozenset()))
+    assert informer.label_selector.endswith(f"{bondifuzz_key('shard')}=none")
@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+from typing import List, Set
+
+import pytest
+from aiohttp import web
+
+from starter.app.kubernetes import initializer as initializer_module
+from starter.app.kubernetes.errors import KubernetesInitError
+from starter.app.kubernetes.initializer import KubernetesInitializer
+from starter.app.settings import PodInitCheckMode
+
+from .test_sharding import fake_api_server
+
+SSAR_PATH = "/apis/authorization.k8s.io/v1/selfsubjectaccessreviews"
+
+
+class FakeAccessReviewServer:
+
+    """
+    Minimal kubernetes API server, which answers access reviews.
+    Operations given as (verb, resource) are denied, others allowed
+    """
+
+    def __init__(self, denied: Set[tuple]):
+        self.denied = denied
+        self.reviews: List[dict] = []
+        self.app = web.Application()
+        self.app.router.add_post(SSAR_PATH, self.create_review)
+
+    async def create_review(self, request: web.Request):
+
+        review = await request.json()
+        attrs = review["spec"]["resourceAttributes"]
+        self.reviews.append(attrs)
+
+        key = attrs["verb"], attrs["resource"]
+        review["status"] = {"allowed": key not in self.denied}
+        return web.json_response(review, status=201)
+
+
+def make_settings(sharding_enabled: bool):
+    return SimpleNamespace(
+        fuzzer_pod=SimpleNamespace(
+            namespace="default",
+            init_check_mode=PodInitCheckMode.fast,
+            test_run_image="test-run",
+        ),
+        registry=SimpleNamespace(url="registry"),
+        sharding=SimpleNamespace(enabled=sharding_enabled),
+    )
+
+
+@pytest.fixture
+def in_cluster(monkeypatch):
+
+    # Service account config is not needed for fake API server
+    monkeypatch.setenv("KUBERNETES_PORT", "tcp://127.0.0.1:443")
+    monkeypatch.setattr(
+        initializer_module.config, "load_incluster_config", lambda: None
+    )
+
+
+@pytest.mark.asyncio
+async def test_denied_review_fails_init(monkeypatch, in_cluster):
+
+    denied = {("deletecollection", "pods"), ("update", "leases")}
+    server = FakeAccessReviewServer(denied)
+
+    async with fake_api_server(monkeypatch, server):
+        initializer = await KubernetesInitializer.create(make_settings(True))
+
+        with pytest.raises(KubernetesInitError) as exc_info:
+            await initializer.do_init()
+
+    # Lease review fails first, pod checks are not started
+    assert "update leases" in str(exc_info.value)
+    assert {attrs["resource"] for attrs in server.reviews} == {"leases"}
+    assert initializer._is_closed
+
+
+@pytest.mark.asyncio
+async def test_pod_reviews(monkeypatch, in_cluster):
+
+    server = FakeAccessReviewServer(set())
+
+    async with fake_api_server(monkeypatch, server):
+        initializer = await KubernetesInitializer.create(make_settings(False))
+        await initializer.do_init()
+
+    # No test pod is created in fast mode
+    resources = [(attrs["verb"], attrs["resource"]) for attrs in server.reviews]
+    assert sorted(resources) == sorted(
+        (verb, "pods") for verb, _ in initializer_module.POD_PERMISSIONS
+    )
+
+    server = FakeAccessReviewServer({("deletecollection", "pods")})
+    async with fake_api_server(monkeypatch, server):
+        initializer = await KubernetesInitializer.create(make_settings(False))
+
+        with pytest.raises(KubernetesInitError) as exc_info:
+            await initializer.do_init()
+
+    assert "deletecollection pods" in str(exc_info.value)
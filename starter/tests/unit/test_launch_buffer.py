@@ -0,0 +1,116 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from starter.app.database.errors import DatabaseError
+from starter.app.database.launch_buffer import LaunchSaveBuffer
+from starter.app.database.orm import ORMLaunch
+
+
+class FakeLaunches:
+    def __init__(self, fail_times: int = 0, delay: float = 0):
+        self.batches: List[List[ORMLaunch]] = []
+        self.fail_times = fail_times
+        self.delay = delay
+        self.attempts = 0
+
+    async def save_many(self, launches: List[ORMLaunch]):
+
+        self.attempts += 1
+        await asyncio.sleep(self.delay)
+
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise DatabaseError("Database is unavailable")
+
+        self.batches.append(launches)
+        return len(launches)
+
+
+def make_settings(batch_size: int, interval: int = 60, max_pending: int = 100):
+    return SimpleNamespace(
+        fuzzer_pod=SimpleNamespace(
+            launch_save_batch_size=batch_size,
+            launch_save_interval=interval,
+            launch_save_max_pending=max_pending,
+        )
+    )
+
+
+def make_launch(i: int):
+    return ORMLaunch(
+        id=None,
+        exp_date="2022-01-01T00:00:00Z",
+        expire_at=1640995200,
+        fuzzer_id=str(i),
+        fuzzer_rev="1",
+        fuzzer_engine="libfuzzer",
+        agent_mode="fuzzing",
+        fuzzer_lang="Cpp",
+        session_id="session",
+        project_id="project",
+        user_id="user",
+        start_time="2022-01-01T00:00:00Z",
+        finish_time="2022-01-01T00:00:00Z",
+        exit_reason="Completed",
+        agent_logs_ref=None,
+        sandbox_logs_ref=None,
+    )
+
+
+@pytest.mark.asyncio
+async def test_flush_on_batch_size():
+
+    launches = FakeLaunches()
+    buffer = await LaunchSaveBuffer.create(launches, make_settings(batch_size=3))
+
+    for i in range(7):
+        await buffer.save(make_launch(i))
+
+    await asyncio.sleep(0.01)
+    assert [len(batch) for batch in launches.batches] == [3, 3]
+
+    # Remaining launches are saved on close
+    await buffer.close()
+    assert [len(batch) for batch in launches.batches] == [3, 3, 1]
+    assert buffer.pending_count == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_and_backpressure():
+
+    launches = FakeLaunches(fail_times=1, delay=0.01)
+    settings = make_settings(batch_size=2, interval=1, max_pending=4)
+    buffer = await LaunchSaveBuffer.create(launches, settings)
+
+    for i in range(4):
+        await buffer.save(make_launch(i))
+
+    # Buffer is full until failed batch is retried
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(buffer.save(make_launch(4)), 0.1)
+
+    await buffer.close()
+    saved = [launch.fuzzer_id for batch in launches.batches for launch in batch]
+    assert saved == ["0", "1", "2", "3"]
+
+
+@pytest.mark.asyncio
+async def test_no_retry_before_interval():
+
+    launches = FakeLaunches(fail_times=100, delay=0.01)
+    settings = make_settings(batch_size=2, interval=60, max_pending=10)
+    buffer = await LaunchSaveBuffer.create(launches, settings)
+
+    for i in range(8):
+        await buffer.save(make_launch(i))
+        await asyncio.sleep(0.01)
+
+    # Full batches don't retry failed database one by one
+    assert launches.attempts == 1
+
+    launches.fail_times = 0
+    await buffer.close()
+    assert sum(len(batch) for batch in launches.batches) == 8
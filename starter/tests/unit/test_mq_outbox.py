@@ -0,0 +1,157 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+from pydantic import BaseModel
+
+from starter.app.database.errors import DatabaseError
+
+# Package 'message_queue' is initialized with MQ transport
+pytest.importorskip("mqtransport")
+
+from starter.app.message_queue.outbox import MQOutbox  # noqa: E402
+
+
+class FakeUnsentMessages:
+    def __init__(self):
+        self.messages: Dict[str, dict] = {}
+        self.requests: List[str] = []
+        self.fail_deletes = 0
+        self.append_error = None
+
+    async def append_messages(self, messages: List[dict]):
+        self.requests.append("append")
+        if self.append_error is not None:
+            raise self.append_error
+        ids = []
+        for message in messages:
+            id = str(len(self.requests)) + "-" + str(len(ids))
+            self.messages[id] = message
+            ids.append(id)
+        return ids
+
+    async def delete_messages(self, ids: List[str]):
+        self.requests.append("delete")
+        if self.fail_deletes > 0:
+            self.fail_deletes -= 1
+            raise DatabaseError("Database is unavailable")
+        for id in ids:
+            self.messages.pop(id, None)
+
+    async def load_unsent_messages(self, batch_size: int):
+        items = sorted(self.messages.items(), key=lambda item: item[1]["order"])
+        for id, message in items:
+            yield {"id": id, **message}
+
+
+class FakeProducer:
+
+    name = "starter.pods.finished"
+
+    class Model(BaseModel):
+        fuzzer_id: str
+
+    def __init__(self):
+        self.produced = []
+        self.fail = False
+
+    async def produce(self, **kwargs):
+        if self.fail:
+            raise RuntimeError("Broker is unavailable")
+        self.produced.append(kwargs)
+
+
+def make_settings(batch_size: int, interval: int = 60):
+    return SimpleNamespace(
+        message_queue=SimpleNamespace(
+            outbox_batch_size=batch_size,
+            outbox_flush_interval=interval,
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_append_then_delete():
+
+    unsent_mq = FakeUnsentMessages()
+    outbox = await MQOutbox.create(unsent_mq, make_settings(batch_size=10))
+    producer = FakeProducer()
+    outbox.register("mq-scheduler", producer)
+
+    await asyncio.gather(
+        *[outbox.produce(producer, fuzzer_id=str(i)) for i in range(5)]
+    )
+
+    # Concurrent messages are appended with one request
+    assert unsent_mq.requests == ["append"]
+    assert len(producer.produced) == 5
+    assert len(unsent_mq.messages) == 5
+
+    # Sent messages are deleted with one request on close
+    await outbox.close()
+    assert unsent_mq.requests == ["append", "delete"]
+    assert unsent_mq.messages == {}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "error", [DatabaseError("Database is unavailable"), TypeError("Not serializable")]
+)
+async def test_append_failure_does_not_block(error):
+
+    unsent_mq = FakeUnsentMessages()
+    unsent_mq.append_error = error
+    outbox = await MQOutbox.create(unsent_mq, make_settings(batch_size=10))
+    producer = FakeProducer()
+    outbox.register("mq-scheduler", producer)
+
+    # Messages are produced even if they are not saved to outbox
+    produce = outbox.produce(producer, fuzzer_id="1")
+    await asyncio.wait_for(produce, timeout=1)
+    assert producer.produced == [{"fuzzer_id": "1"}]
+
+    await outbox.close()
+    assert unsent_mq.messages == {}
+
+
+@pytest.mark.asyncio
+async def test_replay_and_save_unsent():
+
+    unsent_mq = FakeUnsentMessages()
+    unsent_mq.fail_deletes = 100
+    outbox = await MQOutbox.create(unsent_mq, make_settings(batch_size=2))
+    producer = FakeProducer()
+    outbox.register("mq-scheduler", producer)
+
+    for i in range(2):
+        await outbox.produce(producer, fuzzer_id=str(i))
+
+    # Deletion fails: messages are left in outbox as if service crashed
+    exported = {"mq-scheduler": [{"name": producer.name, "body": {"fuzzer_id": "2"}}]}
+    await outbox.save_unsent_messages(exported)
+    await outbox.close()
+    assert len(unsent_mq.messages) == 3
+
+    unsent_mq.fail_deletes = 0
+    outbox = await MQOutbox.create(unsent_mq, make_settings(batch_size=2))
+    producer = FakeProducer()
+    producer.fail = True
+    outbox.register("mq-scheduler", producer)
+
+    # Messages which were not accepted by producer stay in outbox
+    with pytest.raises(RuntimeError):
+        await outbox.replay()
+
+    await outbox.close()
+    assert len(unsent_mq.messages) == 3
+
+    outbox = await MQOutbox.create(unsent_mq, make_settings(batch_size=2))
+    producer = FakeProducer()
+    outbox.register("mq-scheduler", producer)
+    assert await outbox.replay() == 3
+    await outbox.close()
+
+    bodies = [body["fuzzer_id"] for body in producer.produced]
+    assert bodies == ["0", "1", "2"]
+    assert unsent_mq.messages == {}
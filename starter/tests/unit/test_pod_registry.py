@@ -0,0 +1,206 @@
+from datetime import datetime, timedelta
+
+import pytest
+from prometheus_client import REGISTRY
+
+from starter.app.kubernetes.pods.displacement import select_pods_for_displacement
+from starter.app.kubernetes.pods.registry import FuzzerPod, FuzzerPodRegistry
+from starter.app.kubernetes.pods.registry.errors import (
+    PodAlreadyExistsError,
+    PodNotFoundError,
+)
+from starter.app.util.datetime import date_now
+
+START_TIME = datetime(2022, 1, 1)
+
+
+def make_pod(
+    name: str,
+    pool_id: str = "pool-1",
+    fuzzer_id: str = "1",
+    fuzzer_rev: str = "1",
+    agent_mode: str = "fuzzing",
+    phase: str = "Running",
+    started_after: int = 0,
+    project_id: str = "project",
+):
+    return FuzzerPod(
+        # V1Pod
+        name=name,
+        phase=phase,
+        start_time=START_TIME + timedelta(seconds=started_after),
+        create_time=None,
+        displaced=False,
+        deleting=False,
+        cpu=100,
+        ram=100,
+        node_name=None,
+        # Suitcase
+        user_id="user",
+        project_id=project_id,
+        pool_id=pool_id,
+        fuzzer_id=fuzzer_id,
+        fuzzer_rev=fuzzer_rev,
+        agent_mode=agent_mode,
+        fuzzer_lang="Cpp",
+        fuzzer_engine="libfuzzer",
+        session_id="session",
+        # Pre-saved logs
+        agent_logs_ref=None,
+        sandbox_logs_ref=None,
+        logs_saved=False,
+    )
+
+
+def test_add_remove():
+
+    registry = FuzzerPodRegistry()
+    registry.add_pod(make_pod("pod-1"))
+    registry.add_pod(make_pod("pod-2", pool_id="pool-2"))
+
+    with pytest.raises(PodAlreadyExistsError):
+        registry.add_pod(make_pod("pod-1"))
+
+    assert registry.pod_count == 2
+    assert [p.name for p in registry.list_pool_pods("pool-1")] == ["pod-1"]
+    assert [p.name for p in registry.list_pool_pods("pool-2")] == ["pod-2"]
+
+    registry.remove_pod("pod-1")
+    assert registry.list_pool_pods("pool-1") == []
+    assert len(registry.find_group("pool-1", "fuzzing", "Running")) == 0
+
+    with pytest.raises(PodNotFoundError):
+        registry.remove_pod("pod-1")
+
+
+def test_phase_change_updates_groups():
+
+    registry = FuzzerPodRegistry()
+    registry.add_pod(make_pod("pod-1", phase="Pending"))
+    registry.add_pod(make_pod("pod-2", phase="Pending"))
+
+    running = registry.find_group("pool-1", "fuzzing", "Running")
+    assert len(running) == 0
+
+    registry.update_pod_phase("pod-1", "Running")
+    running = registry.find_group("pool-1", "fuzzing", "Running")
+    pending = registry.find_group("pool-1", "fuzzing", "Pending")
+
+    assert [p.name for p in running.pods] == ["pod-1"]
+    assert [p.name for p in pending.pods] == ["pod-2"]
+    assert running.count_instances("1", "1") == 1
+    assert pending.count_instances("1", "1") == 1
+
+
+def test_phase_metrics():
+    def sample(name: str):
+        return REGISTRY.get_sample_value(name, {"pool_id": "pool-metrics"})
+
+    registry = FuzzerPodRegistry()
+    pod = make_pod("pod-1", pool_id="pool-metrics", phase="Pending")
+    pod.create_time = date_now() - timedelta(seconds=3)
+
+    registry.add_pod(pod)
+    registry.add_pod(make_pod("pod-2", pool_id="pool-metrics", phase="Pending"))
+    assert sample("pending_pods") == 2
+
+    registry.update_pod_phase("pod-1", "Running")
+    assert sample("pending_pods") == 1
+    assert sample("running_pods") == 1
+    assert sample("pod_launch_to_running_seconds_count") == 1
+    assert sample("pod_launch_to_running_seconds_sum") >= 3
+
+    registry.remove_pod("pod-1")
+    registry.remove_pod("pod-2")
+    assert sample("pending_pods") == 0
+    assert sample("running_pods") == 0
+
+
+def test_select_pods_for_displacement():
+
+    registry = FuzzerPodRegistry()
+
+    # Fuzzer with many instances goes last
+    registry.add_pod(make_pod("a-1", fuzzer_id="a", started_after=0))
+    registry.add_pod(make_pod("a-2", fuzzer_id="a", started_after=1))
+    registry.add_pod(make_pod("b-1", fuzzer_id="b", started_after=5))
+    registry.add_pod(make_pod("c-1", fuzzer_id="c", started_after=2))
+
+    # Not suitable for displacement
+    registry.add_pod(make_pod("d-1", fuzzer_id="d", agent_mode="firstrun"))
+    registry.add_pod(make_pod("e-1", fuzzer_id="e", phase="Pending"))
+    registry.add_pod(make_pod("f-1", fuzzer_id="f", pool_id="pool-2"))
+
+    pods = select_pods_for_displacement(registry, "pool-1")
+    assert [pod.name for pod in pods] == ["c-1", "b-1", "a-1", "a-2"]
+
+
+def test_displacement_queue_updates():
+
+    registry = FuzzerPodRegistry()
+    registry.add_pod(make_pod("a-1", fuzzer_id="a", started_after=0))
+    registry.add_pod(make_pod("a-2", fuzzer_id="a", started_after=1))
+    registry.add_pod(make_pod("b-1", fuzzer_id="b", started_after=3))
+    registry.add_pod(make_pod("b-2", fuzzer_id="b", phase="Pending"))
+
+    def candidates():
+        pods = select_pods_for_displacement(registry, "pool-1")
+        return [pod.name for pod in pods]
+
+    assert candidates() == ["b-1", "a-1", "a-2"]
+
+    # Fuzzer 'b' has more instances now
+    start_time = START_TIME + timedelta(seconds=2)
+    registry.update_pod_start_time("b-2", start_time)
+    registry.update_pod_phase("b-2", "Running")
+    assert candidates() == ["a-1", "a-2", "b-2", "b-1"]
+
+    # Displaced pods are not candidates anymore
+    registry.displace_pod("a-1")
+    assert candidates() == ["a-2", "b-2", "b-1"]
+    assert registry.displacement_in_progress("pool-1")
+
+    registry.remove_pod("b-1")
+    registry.remove_pod("a-1")
+    assert candidates() == ["a-2", "b-2"]
+    assert not registry.displacement_in_progress("pool-1")
+
+    # Pool without candidates
+    pods = select_pods_for_displacement(registry, "pool-2")
+    assert next(iter(pods), None) is None
+
+
+def test_fair_share():
+
+    registry = FuzzerPodRegistry({"big": 3})
+
+    # Project 'small' takes 4 of 10 units, 'big' - 2 of 10
+    for i in range(4):
+        registry.add_pod(make_pod(f"s-{i}", fuzzer_id="s", project_id="small"))
+    for i in range(2):
+        registry.add_pod(make_pod(f"b-{i}", fuzzer_id="b", project_id="big"))
+
+    # Entitled to 1/4 and 3/4 of pool
+    share = registry.tenant_share("pool-1", ("user", "small"), 1000, 1000)
+    assert share == pytest.approx(0.4 / 0.25)
+    share = registry.tenant_share("pool-1", ("user", "big"), 1000, 1000, 100, 100)
+    assert share == pytest.approx(0.3 / 0.75)
+
+    # New tenant reduces entitlement of the others
+    share = registry.tenant_share("pool-1", ("user", "new"), 1000, 1000, 100, 100)
+    assert share == pytest.approx(0.1 / 0.2)
+
+    over_quota = registry.over_quota_tenants("pool-1", 1000, 1000)
+    assert over_quota == [("user", "small")]
+
+    # Over quota tenants are displaced first
+    pods = select_pods_for_displacement(registry, "pool-1", over_quota)
+    names = [pod.name for pod in pods]
+    assert names == ["s-0", "s-1", "s-2", "s-3", "b-0", "b-1"]
+
+    for i in range(4):
+        registry.remove_pod(f"s-{i}")
+
+    assert registry.over_quota_tenants("pool-1", 1000, 1000) == []
+    share = registry.tenant_share("pool-1", ("user", "small"), 1000, 1000)
+    assert share == 0
@@ -0,0 +1,274 @@
+import asyncio
+
+import pytest
+
+from starter.app.kubernetes.pools.registry.admission_queue import admission_priority
+from starter.app.kubernetes.pools.registry.errors import (
+    PoolAdmissionTimeoutError,
+    PoolLockedError,
+    PoolNoResourcesLeftError,
+    PoolNoSuitableNodeError,
+)
+from starter.app.kubernetes.pools.registry.resource_pool import ResourcePool
+
+
+def make_pool():
+    pool = ResourcePool("pool-1", locked=False)
+    pool.add_node("node-1", 1000, 1000)
+    pool.add_node("node-2", 2000, 2000)
+    return pool
+
+
+def test_allocate_best_fit():
+
+    pool = make_pool()
+
+    # Smallest node which fits is chosen
+    assert pool.allocate(500, 500) == "node-1"
+    assert pool.allocate(1500, 1500) == "node-2"
+    assert pool.allocate(500, 500) == "node-1"
+
+    with pytest.raises(PoolNoResourcesLeftError):
+        pool.allocate(600, 600)
+
+    # 1000m is free in total, but only 500m on each node
+    pool.free(500, 500, "node-1")
+    with pytest.raises(PoolNoSuitableNodeError):
+        pool.allocate(1000, 1000)
+
+
+def test_allocate_fragmented():
+
+    pool = make_pool()
+    pool.allocate(800, 800)
+    pool.allocate(800, 800)
+
+    # 1400m is free in total, but not on one node
+    assert pool.resources_left() == (1400, 1400)
+    with pytest.raises(PoolNoSuitableNodeError):
+        pool.allocate(1300, 100)
+
+    cpu_frag, ram_frag = pool.fragmentation
+    assert cpu_frag == pytest.approx(1 - 1200 / 1400)
+    assert ram_frag == pytest.approx(1 - 1200 / 1400)
+
+
+def test_move_and_free():
+
+    pool = make_pool()
+    node_name = pool.allocate(500, 500)
+    assert node_name == "node-1"
+
+    # k8s scheduled pod on another node
+    pool.move(500, 500, node_name, "node-2")
+    nodes = {node.name: node for node in pool.nodes}
+    assert nodes["node-1"].cpu_used == 0
+    assert nodes["node-2"].cpu_used == 500
+
+    # Not scheduled pods are accounted in aggregate only
+    pool.allocate_on_node(None, 200, 200)
+    assert pool.cpu_used == 700
+    assert nodes["node-2"].cpu_used == 500
+
+    pool.free(500, 500, "node-2")
+    pool.free(200, 200)
+    assert pool.cpu_used == 0
+    assert all(node.cpu_used == 0 for node in pool.nodes)
+    assert pool.fragmentation == pytest.approx((1 - 2000 / 3000,) * 2)
+
+
+def test_move_to_full_node():
+
+    pool = make_pool()
+    pool.allocate(1500, 1500)
+    pool.allocate_on_node(None, 800, 800)
+
+    # Pod accounted in aggregate was scheduled on node without room
+    with pytest.raises(PoolNoSuitableNodeError):
+        pool.move(800, 800, None, "node-2")
+
+    nodes = {node.name: node for node in pool.nodes}
+    assert nodes["node-2"].cpu_used == 1500
+    assert pool.cpu_used == 2300
+
+    pool.move(800, 800, None, "node-1")
+    assert nodes["node-1"].cpu_used == 800
+
+
+@pytest.mark.asyncio
+async def test_admission_order():
+
+    pool = make_pool()
+    pool.allocate(1000, 1000)
+    pool.allocate(2000, 2000)
+
+    admitted = []
+
+    async def wait(name: str, agent_mode: str, cpu: int):
+        priority = admission_priority(agent_mode)
+        reservation = await pool.wait_admission(cpu, cpu, priority, timeout=1, ttl=60)
+        admitted.append((name, reservation.node_name))
+
+    tasks = [
+        asyncio.create_task(wait("fuzzing", "fuzzing", 500)),
+        asyncio.create_task(wait("merge", "merge", 500)),
+        asyncio.create_task(wait("firstrun", "firstrun", 1000)),
+    ]
+
+    await asyncio.sleep(0)
+    assert pool.admission_waiters == 3
+
+    # Launches which do not wait can't take resources of waiters
+    with pytest.raises(PoolNoResourcesLeftError):
+        pool.admit(100, 100, admission_priority("merge"), ttl=60)
+
+    # Head of queue (firstrun) does not fit yet, so others wait too
+    pool.free(1000, 1000, "node-1")
+    await asyncio.sleep(0.01)
+    assert admitted == [("firstrun", "node-1")]
+
+    pool.free(1000, 1000, "node-2")
+    await asyncio.gather(*tasks)
+    assert admitted[1:] == [("merge", "node-2"), ("fuzzing", "node-2")]
+    assert pool.admission_waiters == 0
+
+
+@pytest.mark.asyncio
+async def test_admission_timeout_and_lock():
+
+    pool = make_pool()
+    pool.allocate(1000, 1000)
+    pool.allocate(2000, 2000)
+
+    priority = admission_priority("firstrun")
+    with pytest.raises(PoolAdmissionTimeoutError):
+        await pool.wait_admission(500, 500, priority, timeout=0.01, ttl=60)
+
+    assert pool.admission_waiters == 0
+    assert pool.cpu_used == 3000
+
+    wait = pool.wait_admission(500, 500, priority, timeout=1, ttl=60)
+    task = asyncio.create_task(wait)
+    await asyncio.sleep(0)
+
+    pool.lock()
+    with pytest.raises(PoolLockedError):
+        await task
+
+
+def test_reservations():
+
+    pool = make_pool()
+
+    # Committed reservation keeps resources
+    node_name = pool.allocate(500, 500)
+    reservation = pool.reserve(500, 500, node_name, ttl=60)
+    assert pool.reserved == (500, 500)
+    pool.commit(reservation)
+    assert pool.reserved == (0, 0)
+    assert pool.cpu_used == 500
+
+    # Released reservation frees resources
+    node_name = pool.allocate(200, 200)
+    reservation = pool.reserve(200, 200, node_name, ttl=60)
+    pool.release(reservation)
+    assert pool.cpu_used == 500
+
+    # Expired reservation frees resources once
+    node_name = pool.allocate(300, 300)
+    reservation = pool.reserve(300, 300, node_name, ttl=0)
+    assert pool.expire_reservations() == 1
+    assert pool.expire_reservations() == 0
+    assert pool.cpu_used == 500
+    pool.release(reservation)
+    assert pool.cpu_used == 500
+
+    # Pod created after expiry is accounted again
+    pool.commit(reservation)
+    assert pool.cpu_used == 800
+    assert pool.reserved == (0, 0)
+
+
+def test_reconcile_usage():
+
+    pool = make_pool()
+    pool.allocate(500, 500)
+    pool.allocate(300, 300)
+    node_name = pool.allocate(100, 100)
+    pool.reserve(100, 100, node_name, ttl=60)
+
+    # Pods of 500 and 200 exist, usage of reservation is kept
+    drift = pool.reconcile_usage([("node-1", 500, 500), (None, 200, 200)])
+    assert drift == (100, 100)
+    assert pool.cpu_used == 800
+    assert sum(node.cpu_used for node in pool.nodes) == 600
+
+    # Nothing to correct
+    drift = pool.reconcile_usage([("node-1", 500, 500), (None, 200, 200)])
+    assert drift == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_reconcile_keeps_admitted_launches():
+
+    pool = make_pool()
+    priority = admission_priority("fuzzing")
+
+    # Launches are admitted, but their pods are not created yet
+    reservation = pool.admit(1000, 1000, priority, ttl=60)
+    other = pool.admit(2000, 2000, priority, ttl=60)
+
+    wait = pool.wait_admission(1500, 1500, priority, timeout=1, ttl=60)
+    task = asyncio.create_task(wait)
+    await asyncio.sleep(0)
+
+    # Waiter is admitted, but has not resumed yet
+    pool.release(other)
+    assert pool.admission_waiters == 0
+
+    drift = pool.reconcile_usage([])
+    assert drift == (0, 0)
+    assert pool.cpu_used == 2500
+
+    admitted = await task
+    assert admitted.node_name == "node-2"
+
+    # Usage of created pod is not counted twice
+    pool.commit(reservation)
+    drift = pool.reconcile_usage([("node-1", 1000, 1000)])
+    assert drift == (0, 0)
+    assert pool.reserved == (1500, 1500)
+
+
+def test_renew_and_commit_after_expiry():
+
+    pool = make_pool()
+
+    # Renewed reservation outlives its first deadline
+    node_name = pool.allocate(500, 500)
+    reservation = pool.reserve(500, 500, node_name, ttl=0)
+    assert pool.renew(reservation, ttl=60) is reservation
+    assert pool.expire_reservations() == 0
+    pool.release(reservation)
+
+    # Expired reservation is allocated again with checks
+    pool.allocate(2000, 2000)
+    node_name = pool.allocate(1000, 1000)
+    reservation = pool.reserve(1000, 1000, node_name, ttl=0)
+    assert pool.expire_reservations() == 1
+    assert pool.allocate(1000, 1000) == "node-1"
+
+    with pytest.raises(PoolNoResourcesLeftError):
+        pool.renew(reservation, ttl=60)
+
+    # Pod created after expiry does not overcommit its node
+    with pytest.raises(PoolNoSuitableNodeError):
+        pool.commit(reservation)
+
+    assert pool.cpu_used == 3000
+    assert pool.reserved == (0, 0)
+
+    pool.free(1000, 1000, "node-1")
+    renewed = pool.renew(reservation, ttl=60)
+    assert renewed.id != reservation.id
+    assert pool.reserved == (1000, 1000)
@@ -0,0 +1,245 @@
+import asyncio
+import inspect
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from pydantic import ValidationError, parse_obj_as
+
+from starter.app.api.error_codes import (
+    E_INTERNAL_ERROR,
+    E_POOL_NO_RESOURCES,
+    E_POOL_NOT_FOUND,
+)
+from starter.app.api.handlers.fuzzers import C_MAX_BATCH_SIZE, run_fuzzer_batch
+from starter.app.kubernetes.pods.registry import FuzzerPodRegistry
+from starter.app.kubernetes.pools.registry import PoolRegistry
+from starter.app.kubernetes.pools.registry.admission_queue import admission_priority
+from starter.app.util.datetime import date_now
+
+from .test_sharding import make_request
+
+
+class FakeKubernetesClient:
+
+    """
+    Creates pods in memory. Creation fails for fuzzer 'bad',
+    pool is removed while pod of fuzzer 'last' is created.
+    Pod of fuzzer 'slow' is created after reservations expire,
+    meanwhile other launch takes resources given in `steal`
+    """
+
+    def __init__(self, pool_registry: PoolRegistry, steal: int):
+        self.pool_registry = pool_registry
+        self.steal = steal
+        self.created: List[str] = []
+        self.deleted: List[str] = []
+
+    async def create_fuzzer_pod(self, pool_id: str, fuzzer_id: str, **kwargs):
+
+        await asyncio.sleep(0.001)
+
+        if fuzzer_id == "bad":
+            raise RuntimeError("Failed to create pod")
+
+        if fuzzer_id == "slow":
+            await asyncio.sleep(0.05)
+            assert self.pool_registry.expire_reservations() > 0
+            priority = admission_priority("fuzzing")
+            self.pool_registry.allocate_resources(
+                pool_id, self.steal, self.steal, priority, ttl=60
+            )
+
+        if fuzzer_id == "last":
+            self.pool_registry.remove_pool(pool_id)
+
+        self.created.append(fuzzer_id)
+        return SimpleNamespace(
+            metadata=SimpleNamespace(
+                name=f"fuzzer-{fuzzer_id}",
+                creation_timestamp=date_now(),
+            ),
+            status=SimpleNamespace(phase="Pending"),
+        )
+
+    async def delete_fuzzer_pod(self, name: str):
+        self.deleted.append(name)
+
+
+class FakeCoordinator:
+    def owns_pool(self, pool_id):
+        return True
+
+
+def make_settings(reservation_ttl: float):
+    return SimpleNamespace(
+        fuzzer_pod=SimpleNamespace(
+            agent_cpu=100,
+            agent_ram=100,
+            reservation_ttl=reservation_ttl,
+            admission_max_wait=5,
+            launch_concurrency=1,
+            min_work_time=60,
+        ),
+        registry=SimpleNamespace(url="registry"),
+    )
+
+
+def make_launch(fuzzer_id: str, admission_timeout: int = 0):
+    return {
+        "user_id": "user",
+        "project_id": "project",
+        "session_id": "session",
+        "fuzzer_id": fuzzer_id,
+        "fuzzer_rev": "1",
+        "fuzzer_engine": "afl",
+        "fuzzer_lang": "cpp",
+        "agent_mode": "fuzzing",
+        "image_id": "image",
+        "cpu_usage": 400,
+        "ram_usage": 300,
+        "tmpfs_size": 100,
+        "admission_timeout": admission_timeout,
+    }
+
+
+async def run_batch(
+    pool_registry: PoolRegistry,
+    launches: List[dict],
+    reservation_ttl: float = 60,
+    steal: int = 0,
+):
+
+    # Launches are validated like in request body
+    launches_type = inspect.signature(run_fuzzer_batch).parameters["launches"]
+    launches = parse_obj_as(launches_type.annotation, launches)
+
+    pod_registry = FuzzerPodRegistry()
+    k8s_client = FakeKubernetesClient(pool_registry, steal)
+    response = SimpleNamespace(status_code=200)
+
+    res = await run_fuzzer_batch(
+        request=make_request("/api/v1/pools/pool-1/fuzzers/batch"),
+        response=response,
+        launches=launches,
+        pool_id="pool-1",
+        operation="Run fuzzer batch",
+        pool_registry=pool_registry,
+        pod_registry=pod_registry,
+        k8s_client=k8s_client,
+        coordinator=FakeCoordinator(),
+        settings=make_settings(reservation_ttl),
+    )
+
+    return res, pod_registry, k8s_client
+
+
+def make_pool_registry():
+    pool_registry = PoolRegistry()
+    pool_registry.create_pool("pool-1", locked=False)
+    pool_registry.add_pool_node("pool-1", "node-1", 1000, 1000)
+    return pool_registry
+
+
+def error_codes(res):
+    return [r.error.code if r.error else None for r in res.result]
+
+
+def test_batch_size_limit():
+
+    launches_type = inspect.signature(run_fuzzer_batch).parameters["launches"]
+    launches = [make_launch(str(i)) for i in range(C_MAX_BATCH_SIZE + 1)]
+
+    assert len(parse_obj_as(launches_type.annotation, launches[:-1])) == 500
+    with pytest.raises(ValidationError):
+        parse_obj_as(launches_type.annotation, launches)
+
+    with pytest.raises(ValidationError):
+        parse_obj_as(launches_type.annotation, [])
+
+
+@pytest.mark.asyncio
+async def test_allocated_and_waiting_launches():
+
+    # Node fits two launches of 500 mcpu
+    pool_registry = make_pool_registry()
+    res, pod_registry, k8s_client = await run_batch(
+        pool_registry,
+        [
+            make_launch("1"),
+            make_launch("bad"),
+            make_launch("2", admission_timeout=1),
+            make_launch("3"),
+        ],
+    )
+
+    # Waiting launch takes resources released by failed one
+    assert [r.status for r in res.result] == ["OK", "FAILED", "OK", "FAILED"]
+    assert error_codes(res) == [None, E_INTERNAL_ERROR, None, E_POOL_NO_RESOURCES]
+    assert k8s_client.created == ["1", "2"]
+
+    pool = pool_registry.find_pool("pool-1")
+    assert pool.cpu_used == 1000
+    assert pool.reserved == (0, 0)
+    assert pod_registry.has_pod("fuzzer-2")
+
+
+@pytest.mark.asyncio
+async def test_pool_removed_during_batch():
+
+    pool_registry = make_pool_registry()
+    res, pod_registry, k8s_client = await run_batch(
+        pool_registry,
+        [
+            make_launch("last"),
+            make_launch("1"),
+            make_launch("2", admission_timeout=1),
+        ],
+    )
+
+    # Pod created before removal of pool is reported as launched
+    assert [r.status for r in res.result] == ["OK", "FAILED", "FAILED"]
+    assert error_codes(res) == [None, E_POOL_NOT_FOUND, E_POOL_NOT_FOUND]
+    assert k8s_client.created == ["last"]
+    assert pod_registry.has_pod("fuzzer-last")
+
+
+@pytest.mark.asyncio
+async def test_reservation_expired_in_queue():
+
+    # Launch '1' waits for 'slow' one, while its reservation expires
+    pool_registry = make_pool_registry()
+    res, pod_registry, k8s_client = await run_batch(
+        pool_registry,
+        [make_launch("slow"), make_launch("1")],
+        reservation_ttl=0.01,
+        steal=500,
+    )
+
+    # Resources of expired reservation are not used twice
+    assert error_codes(res) == [None, E_POOL_NO_RESOURCES]
+    assert k8s_client.created == ["slow"]
+
+    pool = pool_registry.find_pool("pool-1")
+    assert pool.cpu_used == 1000
+    assert pod_registry.has_pod("fuzzer-slow")
+
+
+@pytest.mark.asyncio
+async def test_reservation_expired_during_creation():
+
+    pool_registry = make_pool_registry()
+    res, pod_registry, k8s_client = await run_batch(
+        pool_registry,
+        [make_launch("slow")],
+        reservation_ttl=0.01,
+        steal=1000,
+    )
+
+    # Pod which does not fit anymore is deleted instead of overcommitting
+    assert error_codes(res) == [E_POOL_NO_RESOURCES]
+    assert k8s_client.deleted == ["fuzzer-slow"]
+    assert not pod_registry.has_pod("fuzzer-slow")
+
+    pool = pool_registry.find_pool("pool-1")
+    assert pool.cpu_used == 1000
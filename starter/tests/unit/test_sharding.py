@@ -0,0 +1,307 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+from kubernetes_asyncio.client import ApiClient, Configuration, CoordinationV1Api
+from starlette.requests import Request
+from starlette.responses import RedirectResponse
+
+from starter.app.api.handlers.fuzzers import redirect_to_pool_owner
+from starter.app.kubernetes.coordination import (
+    HashRing,
+    LeaseLock,
+    ShardCoordinator,
+    pool_shard,
+)
+from starter.app.settings import ShardingSettings
+from starter.app.util.datetime import date_now, rfc3339_micro
+
+LEASES_PATH = "/apis/coordination.k8s.io/v1/namespaces/{namespace}/leases"
+
+
+class FakeLeaseServer:
+
+    """
+    Minimal kubernetes API server, which stores leases in memory.
+    Updates with stale resource version are rejected like in k8s
+    """
+
+    def __init__(self):
+        self.leases = {}
+        self.version = 0
+        self.app = web.Application()
+        self.app.router.add_get(LEASES_PATH, self.list_leases)
+        self.app.router.add_post(LEASES_PATH, self.create_lease)
+        self.app.router.add_get(LEASES_PATH + "/{name}", self.read_lease)
+        self.app.router.add_put(LEASES_PATH + "/{name}", self.replace_lease)
+        self.app.router.add_delete(LEASES_PATH + "/{name}", self.delete_lease)
+
+    @staticmethod
+    def status(code: int):
+        body = {"kind": "Status", "apiVersion": "v1", "code": code}
+        return web.json_response(body, status=code)
+
+    def store(self, lease: dict):
+        self.version += 1
+        lease["metadata"]["resourceVersion"] = str(self.version)
+        self.leases[lease["metadata"]["name"]] = lease
+        return web.json_response(lease)
+
+    async def list_leases(self, request: web.Request):
+
+        items = list(self.leases.values())
+        selector = request.query.get("labelSelector")
+        if selector:
+            key, value = selector.split("=")
+            items = [l for l in items if l["metadata"]["labels"].get(key) == value]
+
+        meta = {"resourceVersion": str(self.version)}
+        return web.json_response(
+            {"kind": "LeaseList", "metadata": meta, "items": items}
+        )
+
+    async def create_lease(self, request: web.Request):
+        lease = await request.json()
+        if lease["metadata"]["name"] in self.leases:
+            return self.status(409)
+        return self.store(lease)
+
+    async def read_lease(self, request: web.Request):
+        lease = self.leases.get(request.match_info["name"])
+        return web.json_response(lease) if lease else self.status(404)
+
+    async def replace_lease(self, request: web.Request):
+
+        lease = await request.json()
+        stored = self.leases.get(request.match_info["name"])
+        if stored is None:
+            return self.status(404)
+
+        version = stored["metadata"]["resourceVersion"]
+        if lease["metadata"].get("resourceVersion") != version:
+            return self.status(409)
+
+        return self.store(lease)
+
+    async def delete_lease(self, request: web.Request):
+        lease = self.leases.pop(request.match_info["name"], None)
+        return self.status(200) if lease else self.status(404)
+
+    def expire(self, name: str):
+        renew_time = date_now() - timedelta(minutes=10)
+        self.leases[name]["spec"]["renewTime"] = rfc3339_micro(renew_time)
+
+
+@asynccontextmanager
+async def fake_api_server(monkeypatch, server):
+
+    """Serves fake API app of given server on local port"""
+
+    runner = web.AppRunner(server.app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+
+    # API clients created without configuration use the fake server
+    port = site._server.sockets[0].getsockname()[1]
+    configuration = Configuration(host=f"http://127.0.0.1:{port}")
+    monkeypatch.setattr(Configuration, "_default", configuration)
+
+    try:
+        yield server
+    finally:
+        await runner.cleanup()
+
+
+class FakeKubernetesClient:
+    def __init__(self):
+        self.labeled = 0
+
+    async def label_unsharded_pods(self):
+        self.labeled += 1
+        return 0
+
+
+def make_settings(replica_id: str):
+    return SimpleNamespace(
+        fuzzer_pod=SimpleNamespace(namespace="default"),
+        sharding=ShardingSettings(
+            enabled=True,
+            replica_id=replica_id,
+            replica_url=f"http://{replica_id}:8080",
+            lease_duration="15s",
+            renew_interval="5s",
+            shard_count=64,
+            virtual_nodes=16,
+        ),
+    )
+
+
+def test_hash_ring():
+
+    assert pool_shard("pool-1", 64) == pool_shard("pool-1", 64)
+    assert all(0 <= pool_shard(f"pool-{i}", 64) < 64 for i in range(100))
+
+    ring = HashRing(["a", "b", "c"], virtual_nodes=16)
+    shards = {m: ring.shards_of(m, 64) for m in "abc"}
+    assert sum(len(s) for s in shards.values()) == 64
+    assert frozenset().union(*shards.values()) == frozenset(range(64))
+
+    # Only shards taken by new replica move
+    ring = HashRing(["a", "b", "c", "d"], virtual_nodes=16)
+    assert ring.shards_of("d", 64)
+    for m in "abc":
+        assert ring.shards_of(m, 64) <= shards[m]
+
+    assert HashRing([], virtual_nodes=16).owner("1") is None
+
+
+@pytest.mark.asyncio
+async def test_lease_lock(monkeypatch):
+
+    async with fake_api_server(monkeypatch, FakeLeaseServer()) as server:
+        async with ApiClient() as client:
+
+            api = CoordinationV1Api(client)
+            a = LeaseLock(api, "default", "leader", "a", duration=15)
+            b = LeaseLock(api, "default", "leader", "b", duration=15)
+
+            # Only one of replicas creates lease
+            results = await asyncio.gather(a.try_acquire(), b.try_acquire())
+            assert sorted(results) == [False, True]
+
+            holder, other = (a, b) if results[0] else (b, a)
+            assert await holder.try_acquire()
+            assert not await other.try_acquire()
+            assert server.leases["leader"]["spec"]["leaseTransitions"] == 0
+
+            # Expired lease is taken over
+            server.expire("leader")
+            assert await other.try_acquire()
+            assert not await holder.try_acquire()
+            assert server.leases["leader"]["spec"]["leaseTransitions"] == 1
+
+            # Released lease is free at once
+            await other.release()
+            assert await holder.try_acquire()
+            assert server.leases["leader"]["spec"]["leaseTransitions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_coordinators_share_pools(monkeypatch):
+
+    async with fake_api_server(monkeypatch, FakeLeaseServer()):
+
+        k8s_a = FakeKubernetesClient()
+        k8s_b = FakeKubernetesClient()
+        a = await ShardCoordinator.create(make_settings("a"), k8s_a)
+        b = await ShardCoordinator.create(make_settings("b"), k8s_b)
+        await a._renew()
+
+        # Shards are split, the first replica leads
+        assert a.is_leader and not b.is_leader
+        assert k8s_a.labeled == 1 and k8s_b.labeled == 0
+        assert not a.shards.owned & b.shards.owned
+        assert a.shards.owned | b.shards.owned == frozenset(range(64))
+
+        pools = [f"pool-{i}" for i in range(20)]
+        for pool_id in pools:
+            assert a.owns_pool(pool_id) != b.owns_pool(pool_id)
+            owner = a if a.owns_pool(pool_id) else b
+            assert b.pool_owner_url(pool_id) == f"http://{owner._replica_id}:8080"
+
+        reshards = []
+
+        async def on_reshard(shards):
+            reshards.append(shards)
+
+        # Replica which leaves hands over its pools and leadership
+        b.add_reshard_handler(on_reshard)
+        await a.close()
+        await b._renew()
+
+        assert b.is_leader
+        assert b.shards.owned == frozenset(range(64))
+        assert reshards == [b.shards]
+        assert all(b.owns_pool(pool_id) for pool_id in pools)
+
+        await b.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_reshard_is_retried(monkeypatch):
+
+    async with fake_api_server(monkeypatch, FakeLeaseServer()):
+
+        a = await ShardCoordinator.create(make_settings("a"), FakeKubernetesClient())
+        reshards = []
+
+        async def on_reshard(shards):
+            reshards.append(shards)
+            if len(reshards) == 1:
+                raise RuntimeError("Failed to list pods")
+
+        a.add_reshard_handler(on_reshard)
+        b = await ShardCoordinator.create(make_settings("b"), FakeKubernetesClient())
+
+        # Pools are kept until handlers take over new shards
+        with pytest.raises(RuntimeError):
+            await a._renew()
+
+        assert a.shards.owned == frozenset(range(64))
+        assert all(a.owns_pool(f"pool-{i}") for i in range(20))
+
+        await a._renew()
+        assert len(reshards) == 2
+        assert a.shards == reshards[1]
+        assert not a.shards.owned & b.shards.owned
+
+        await a.close()
+        await b.close()
+
+
+def make_request(path: str):
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "scheme": "http",
+        "server": ("b", 8080),
+        "path": path,
+        "query_string": b"",
+        "headers": [],
+    }
+    return Request(scope)
+
+
+def test_redirect_to_pool_owner():
+    class FakeCoordinator:
+        def __init__(self, owner_url):
+            self.owner_url = owner_url
+
+        def owns_pool(self, pool_id):
+            return pool_id == "own"
+
+        def pool_owner_url(self, pool_id):
+            return self.owner_url
+
+    path = "/api/v1/pools/other/fuzzers"
+    coordinator = FakeCoordinator("http://a:8080/")
+    response = SimpleNamespace(status_code=201)
+
+    args = make_request(path), response, "own", "Run fuzzer", coordinator
+    assert redirect_to_pool_owner(*args) is None
+
+    args = make_request(path), response, "other", "Run fuzzer", coordinator
+    redirect = redirect_to_pool_owner(*args)
+    assert isinstance(redirect, RedirectResponse)
+    assert redirect.status_code == 307
+    assert redirect.headers["location"] == "http://a:8080" + path
+
+    # Owner is unknown while replicas are rebalanced
+    coordinator.owner_url = None
+    rfail = redirect_to_pool_owner(*args)
+    assert rfail.status == "FAILED"
+    assert response.status_code == 503
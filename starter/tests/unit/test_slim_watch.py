@@ -0,0 +1,120 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from starter.app.kubernetes.pods.events.event_handler import (
+    FuzzerPodStateChecker,
+    pod_failure_reason,
+)
+from starter.app.kubernetes.pods.events.slim_watch import SlimPodWatch
+
+
+def make_event(event_type: str, obj: dict):
+    return json.dumps({"type": event_type, "object": obj})
+
+
+def make_raw_pod():
+    return {
+        "kind": "Pod",
+        "metadata": {
+            "name": "fuzzer-abc",
+            "resourceVersion": "42",
+            "deletionTimestamp": "2022-01-01T00:05:00Z",
+            "labels": {"bondifuzz/pool-id": "pool"},
+            "managedFields": [{"manager": "kubelet"}],
+        },
+        "spec": {
+            "nodeName": "node-1",
+            "containers": [{"name": "agent", "image": "agent"}],
+        },
+        "status": {
+            "phase": "Running",
+            "startTime": "2022-01-01T00:00:00Z",
+            "containerStatuses": [
+                {
+                    "name": "agent",
+                    "state": {
+                        "terminated": {
+                            "exitCode": 0,
+                            "reason": "Completed",
+                            "startedAt": "2022-01-01T00:00:01Z",
+                            "finishedAt": "2022-01-01T00:04:00Z",
+                        }
+                    },
+                },
+                {
+                    "name": "sandbox",
+                    "state": {"running": {"startedAt": "2022-01-01T00:00:01Z"}},
+                },
+            ],
+        },
+    }
+
+
+def test_slim_pod_fields():
+
+    w = SlimPodWatch()
+    event = w.unmarshal_event(make_event("MODIFIED", make_raw_pod()), None)
+    pod = event["object"]
+
+    assert event["type"] == "MODIFIED"
+    assert event["raw_object"]["kind"] == "Pod"
+    assert w.resource_version == "42"
+
+    assert pod.metadata.name == "fuzzer-abc"
+    assert pod.metadata.labels == {"bondifuzz/pool-id": "pool"}
+    assert pod.metadata.deletion_timestamp == datetime(
+        2022, 1, 1, 0, 5, tzinfo=timezone.utc
+    )
+    assert pod.spec.node_name == "node-1"
+    assert pod.status.phase == "Running"
+    assert pod.status.start_time == datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+    # Slim pod can be checked like V1Pod
+    checker = FuzzerPodStateChecker(pod)
+    assert checker.is_agent_terminated()
+    info = checker.agent_termination_info()
+    assert info.exit_code == 0
+    assert info.reason == "Completed"
+    assert info.finish_time == datetime(2022, 1, 1, 0, 4, tzinfo=timezone.utc)
+
+
+def test_slim_pod_pending():
+
+    raw_pod = {"metadata": {"name": "fuzzer-abc"}, "status": {"phase": "Pending"}}
+    event = SlimPodWatch().unmarshal_event(make_event("ADDED", raw_pod), None)
+    pod = event["object"]
+
+    assert pod.metadata.deletion_timestamp is None
+    assert pod.metadata.labels == {}
+    assert pod.spec.node_name is None
+    assert pod.status.start_time is None
+    assert pod.status.container_statuses == []
+
+
+def test_pod_failure_reason():
+
+    raw_pod = make_raw_pod()
+    event = SlimPodWatch().unmarshal_event(make_event("DELETED", raw_pod), None)
+    assert pod_failure_reason(event["object"]) is None
+
+    raw_pod["status"]["reason"] = "Evicted"
+    event = SlimPodWatch().unmarshal_event(make_event("DELETED", raw_pod), None)
+    assert pod_failure_reason(event["object"]) == "Evicted"
+
+    del raw_pod["status"]["reason"]
+    terminated = raw_pod["status"]["containerStatuses"][0]["state"]["terminated"]
+    terminated["reason"] = "OOMKilled"
+    event = SlimPodWatch().unmarshal_event(make_event("DELETED", raw_pod), None)
+    assert pod_failure_reason(event["object"]) == "OOMKilled"
+
+
+@pytest.mark.parametrize("event_type", ["ERROR", "BOOKMARK"])
+def test_slim_watch_passes_service_events(event_type: str):
+
+    raw_object = {"code": 410, "metadata": {"resourceVersion": "7"}}
+    event = SlimPodWatch().unmarshal_event(make_event(event_type, raw_object), None)
+
+    assert event["object"] == raw_object
+    assert event["raw_object"] == raw_object
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from starter.app.util.startup import StartupGraph, StartupGraphError
+
+
+def make_graph(events: list, fail_stage: str = None):
+
+    graph = StartupGraph()
+
+    def add_stage(name: str, depends_on: list):
+        async def startup():
+            events.append(("start", name))
+            await asyncio.sleep(0.05)
+            if name == fail_stage:
+                raise RuntimeError("Stage failed")
+            events.append(("started", name))
+
+        async def shutdown():
+            events.append(("stop", name))
+
+        graph.add_stage(name, depends_on, startup, name, shutdown, name)
+
+    add_stage("db", [])
+    add_stage("k8s", [])
+    add_stage("api", [])
+    add_stage("mq", ["db"])
+    add_stage("listener", ["mq", "k8s"])
+    return graph
+
+
+@pytest.mark.asyncio
+async def test_startup_concurrent():
+
+    events = []
+    graph = make_graph(events)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await graph.startup()
+    elapsed = loop.time() - start
+
+    # Three levels of dependencies, not five stages
+    assert elapsed < 0.05 * 4
+
+    started = [name for event, name in events if event == "started"]
+    assert started.index("db") < started.index("mq")
+    assert started.index("mq") < started.index("listener")
+    assert started.index("k8s") < started.index("listener")
+
+
+@pytest.mark.asyncio
+async def test_shutdown_reverse_order():
+
+    events = []
+    graph = make_graph(events)
+    await graph.startup()
+
+    events.clear()
+    await graph.shutdown()
+
+    stopped = [name for event, name in events if event == "stop"]
+    assert sorted(stopped) == ["api", "db", "k8s", "listener", "mq"]
+    assert stopped.index("listener") < stopped.index("mq")
+    assert stopped.index("mq") < stopped.index("db")
+    assert stopped.index("listener") < stopped.index("k8s")
+
+
+@pytest.mark.asyncio
+async def test_startup_failure_stops_started_stages():
+
+    events = []
+    graph = make_graph(events, fail_stage="mq")
+
+    with pytest.raises(RuntimeError):
+        await graph.startup()
+
+    stopped = {name for event, name in events if event == "stop"}
+    assert stopped == {"db", "k8s", "api"}
+    assert ("start", "listener") not in events
+
+
+def test_invalid_graph():
+    async def noop():
+        pass
+
+    graph = StartupGraph()
+    graph.add_stage("a", ["b"], noop, "a")
+    graph.add_stage("b", ["a"], noop, "b")
+
+    with pytest.raises(StartupGraphError):
+        asyncio.run(graph.startup())
+
+    graph = StartupGraph()
+    graph.add_stage("a", ["unknown"], noop, "a")
+
+    with pytest.raises(StartupGraphError):
+        asyncio.run(graph.startup())
+
+    with pytest.raises(StartupGraphError):
+        graph.add_stage("a", [], noop, "a")